@@ -1,7 +1,9 @@
+from .cached_types import NegativeCachingPolicy
 from .invalidation import (
     APIResponsesCacheInvalidationStrategy,
     CacheInvalidationByTimerStrategy,
     CacheInvalidationStrategy,
     UnrealizedCacheInvalidationStrategy,
 )
-from .storage import InMemoryCacheStorage
+from .stats import CacheCounters, CacheMetricsSink, CacheStats, CacheStatsSnapshot
+from .storage import InMemoryCacheStorage, SQLiteCacheStorage
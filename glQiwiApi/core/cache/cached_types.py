@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import copy
 import http
-from dataclasses import dataclass
-from typing import Any, Dict, Optional, Tuple, Union
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Optional, Tuple, Type, Union
 
 
 class Payload:
@@ -29,3 +31,39 @@ class CachedAPIRequest:
     payload: Payload
     response: Any
     method: Union[str, http.HTTPStatus]
+
+
+@dataclass(frozen=True)
+class CachedAPIError:
+    exception: BaseException
+    expire_at: float
+
+    @property
+    def is_expired(self) -> bool:
+        return time.time() >= self.expire_at
+
+    def to_exception(self) -> BaseException:
+        """Copy of cached exception, so that traceback of the original one isn't mutated"""
+        return copy.copy(self.exception)
+
+
+@dataclass(frozen=True)
+class NegativeCachingPolicy:
+    """
+    Describes which errors are permanent enough to be cached and for how long.
+    Error is cached if it's instance of one of `exception_types` or if it carries
+    `http_response` with one of `status_codes`.
+    """
+
+    ttl: float = 30
+    status_codes: FrozenSet[int] = frozenset({http.HTTPStatus.NOT_FOUND})
+    exception_types: Tuple[Type[BaseException], ...] = field(default_factory=tuple)
+
+    def should_cache(self, exception: BaseException) -> bool:
+        if isinstance(exception, self.exception_types):
+            return True
+        http_response = getattr(exception, 'http_response', None)
+        return getattr(http_response, 'status_code', None) in self.status_codes
+
+    def wrap(self, exception: BaseException) -> CachedAPIError:
+        return CachedAPIError(exception=exception, expire_at=time.time() + self.ttl)
@@ -1,3 +1,5 @@
 ADD_TIME_PLACEHOLDER = 'add_time'
 VALUE_PLACEHOLDER = 'value'
 UNCACHED = ('https://api.qiwi.com/partner/bill', '/sinap/api/v2/terms/')
+NEGATIVE_CACHE_KEY_PREFIX = 'negative:'
+CACHED_METHOD_KEY_PREFIX = 'method:'
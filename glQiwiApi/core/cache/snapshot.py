@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import logging
+import os
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+from glQiwiApi.core.cache.cached_types import CachedAPIRequest, Payload
+from glQiwiApi.core.session.holder import HTTPResponse
+from glQiwiApi.utils.compat import json
+
+if TYPE_CHECKING:
+    from glQiwiApi.core.cache.storage import CacheStorage  # pragma: no cover
+
+logger = logging.getLogger('glQiwiApi.cache')
+
+SNAPSHOT_VERSION = 1
+# snapshot contains responses of API, so it's readable by owner only
+SNAPSHOT_FILE_MODE = 0o600
+
+_HTTP_RESPONSE_KIND = 'http_response'
+_API_REQUEST_KIND = 'api_request'
+_PLAIN_KIND = 'plain'
+
+# (key, value, age of entry in seconds)
+SnapshotEntry = Tuple[str, Any, float]
+
+
+def encode_snapshot(entries: List[SnapshotEntry]) -> bytes:
+    """
+    Values that can't be represented in json (e.g. cached exceptions) are skipped,
+    because they are short-lived anyway
+    """
+    encoded_entries: List[Dict[str, Any]] = []
+    for key, value, age in entries:
+        encoded_value = _encode_value(value)
+        if encoded_value is None:
+            logger.debug('Value for key %s cannot be put into snapshot', key)
+            continue
+        encoded_entries.append({'key': key, 'age': age, **encoded_value})
+
+    data = json.dumps(
+        {'version': SNAPSHOT_VERSION, 'created_at': time.time(), 'entries': encoded_entries}
+    )
+    if isinstance(data, str):
+        return data.encode('utf-8')
+    return data
+
+
+def decode_snapshot(
+    raw: bytes, request_headers: Optional[Dict[str, Any]] = None
+) -> List[SnapshotEntry]:
+    """
+    Returns entries with ages adjusted for the time passed since snapshot was made
+
+    :param raw: content of snapshot
+    :param request_headers: headers of client, that are put back into cached requests,
+     because they aren't saved to snapshot
+    """
+    data = json.loads(raw)
+    if data.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported cache snapshot version {data.get('version')!r}")
+
+    elapsed_time = max(time.time() - data['created_at'], 0)
+    return [
+        (entry['key'], _decode_value(entry, request_headers), entry['age'] + elapsed_time)
+        for entry in data['entries']
+    ]
+
+
+def write_snapshot_file(path: Union[str, 'os.PathLike[str]'], raw: bytes) -> None:
+    tmp_path = f'{os.fspath(path)}.tmp'
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, SNAPSHOT_FILE_MODE)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(raw)
+    # replace is atomic, so other processes never see half-written snapshot
+    os.replace(tmp_path, path)
+
+
+def read_snapshot_file(path: Union[str, 'os.PathLike[str]']) -> Optional[bytes]:
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+async def run_periodic_snapshots(
+    storage: CacheStorage,
+    path: Union[str, 'os.PathLike[str]'],
+    interval_in_seconds: float,
+) -> None:
+    """
+    Dump snapshot of storage every `interval_in_seconds` and once more on cancellation,
+    so the latest state is saved on shutdown.
+
+    >>> task = asyncio.create_task(run_periodic_snapshots(storage, 'cache.json', 60))
+    """
+    try:
+        while True:
+            await asyncio.sleep(interval_in_seconds)
+            try:
+                await storage.dump_snapshot(path)
+            except Exception as ex:
+                logger.error('Failed to dump cache snapshot: %r', ex)
+    finally:
+        await asyncio.shield(storage.dump_snapshot(path))
+
+
+def _encode_value(value: Any) -> Optional[Dict[str, Any]]:
+    if isinstance(value, HTTPResponse):
+        return {
+            'kind': _HTTP_RESPONSE_KIND,
+            'status_code': value.status_code,
+            'body': base64.b64encode(value.body).decode('ascii'),
+            'headers': dict(value.headers),
+            'content_type': value.content_type,
+        }
+    if isinstance(value, CachedAPIRequest):
+        # headers carry credentials (e.g. Authorization), so they never reach the disk
+        return {
+            'kind': _API_REQUEST_KIND,
+            'method': str(value.method),
+            'response': value.response,
+            'payload': {**vars(value.payload), 'headers': None},
+        }
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        return None
+    return {'kind': _PLAIN_KIND, 'value': value}
+
+
+def _decode_value(entry: Dict[str, Any], request_headers: Optional[Dict[str, Any]]) -> Any:
+    kind = entry['kind']
+    if kind == _HTTP_RESPONSE_KIND:
+        return HTTPResponse(
+            status_code=entry['status_code'],
+            body=base64.b64decode(entry['body']),
+            headers=entry['headers'],
+            content_type=entry['content_type'],
+        )
+    if kind == _API_REQUEST_KIND:
+        return CachedAPIRequest(
+            payload=Payload(**{**entry['payload'], 'headers': request_headers}),
+            response=entry['response'],
+            method=entry['method'],
+        )
+    return entry['value']
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, DefaultDict, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from glQiwiApi.core.cache.constants import CACHED_METHOD_KEY_PREFIX, NEGATIVE_CACHE_KEY_PREFIX
+from glQiwiApi.utils.compat import Protocol
+
+HITS = 'hits'
+MISSES = 'misses'
+EVICTIONS = 'evictions'
+EXPIRATIONS = 'expirations'
+ENTRIES = 'entries'
+SIZE_IN_BYTES = 'size_in_bytes'
+
+ID_PLACEHOLDER = '{id}'
+# path segments with digits are ids, phone numbers etc., but not versions of API like v2
+_ID_SEGMENT_PATTERN = re.compile(r'^(?!v\d+$).*\d')
+
+
+class CacheMetricsSink(Protocol):
+    """
+    Receives cache metrics as soon as they are recorded,
+    so they can be exported to prometheus, statsd or whatever you use
+    """
+
+    def increment(self, metric: str, label: str, value: int = 1) -> None:
+        ...
+
+    def gauge(self, metric: str, value: float) -> None:
+        ...
+
+
+def default_key_label(key: str) -> str:
+    """
+    Group cached API method responses and errors by API method name rather than
+    by request fingerprint, endpoints are grouped by route, so the number of labels
+    doesn't grow with ids and query strings
+    """
+    if key.startswith((NEGATIVE_CACHE_KEY_PREFIX, CACHED_METHOD_KEY_PREFIX)):
+        return key.rsplit(':', maxsplit=1)[0]
+    if '/' in key:
+        return normalize_route(key)
+    return key
+
+
+def normalize_route(url: str) -> str:
+    """
+    >>> normalize_route('https://edge.qiwi.com/payment-history/v2/persons/79999/payments?rows=50')
+    'https://edge.qiwi.com/payment-history/v2/persons/{id}/payments'
+    """
+    parts = urlsplit(url)
+    path = '/'.join(
+        ID_PLACEHOLDER if _ID_SEGMENT_PATTERN.match(segment) else segment
+        for segment in parts.path.split('/')
+    )
+    return urlunsplit((parts.scheme, parts.netloc, path, '', ''))
+
+
+@dataclass
+class CacheCounters:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        if lookups == 0:
+            return 0.0
+        return self.hits / lookups
+
+    def __add__(self, other: CacheCounters) -> CacheCounters:
+        return CacheCounters(
+            hits=self.hits + other.hits,
+            misses=self.misses + other.misses,
+            evictions=self.evictions + other.evictions,
+            expirations=self.expirations + other.expirations,
+        )
+
+
+@dataclass(frozen=True)
+class CacheStatsSnapshot:
+    counters: Dict[str, CacheCounters] = field(default_factory=dict)
+    entries: int = 0
+    size_in_bytes: int = 0
+
+    @property
+    def total(self) -> CacheCounters:
+        return sum(self.counters.values(), CacheCounters())
+
+
+class CacheStats:
+    """Collects per-label counters of cache storage, label is API method or endpoint"""
+
+    def __init__(
+        self,
+        sink: Optional[CacheMetricsSink] = None,
+        key_label: Callable[[str], str] = default_key_label,
+    ) -> None:
+        self._sink = sink
+        self._key_label = key_label
+        self._counters: DefaultDict[str, CacheCounters] = defaultdict(CacheCounters)
+
+    def record_hit(self, key: str) -> None:
+        self._record(HITS, key)
+
+    def record_miss(self, key: str) -> None:
+        self._record(MISSES, key)
+
+    def record_eviction(self, key: str) -> None:
+        self._record(EVICTIONS, key)
+
+    def record_expiration(self, key: str) -> None:
+        self._record(EXPIRATIONS, key)
+
+    def snapshot(self, entries: int = 0, size_in_bytes: int = 0) -> CacheStatsSnapshot:
+        if self._sink is not None:
+            self._sink.gauge(ENTRIES, entries)
+            self._sink.gauge(SIZE_IN_BYTES, size_in_bytes)
+        return CacheStatsSnapshot(
+            counters={label: CacheCounters(**vars(c)) for label, c in self._counters.items()},
+            entries=entries,
+            size_in_bytes=size_in_bytes,
+        )
+
+    def reset(self) -> None:
+        self._counters.clear()
+
+    def _record(self, metric: str, key: str) -> None:
+        label = self._key_label(key)
+        counters = self._counters[label]
+        setattr(counters, metric, getattr(counters, metric) + 1)
+        if self._sink is not None:
+            self._sink.increment(metric, label)
@@ -1,20 +1,48 @@
 import abc
-from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar, Union, cast
 
-from glQiwiApi.core.cache.constants import VALUE_PLACEHOLDER
+from glQiwiApi.core.cache.cached_types import CachedAPIError
+from glQiwiApi.core.cache.constants import ADD_TIME_PLACEHOLDER, VALUE_PLACEHOLDER
 from glQiwiApi.core.cache.exceptions import CacheExpiredError, CacheValidationError
 from glQiwiApi.core.cache.invalidation import (
     CacheInvalidationStrategy,
     UnrealizedCacheInvalidationStrategy,
 )
+from glQiwiApi.core.cache.snapshot import (
+    SnapshotEntry,
+    decode_snapshot,
+    encode_snapshot,
+    read_snapshot_file,
+    write_snapshot_file,
+)
+from glQiwiApi.core.cache.stats import CacheStats, CacheStatsSnapshot
 from glQiwiApi.core.cache.utils import embed_cache_time
 
+_R = TypeVar('_R')
+
+logger = logging.getLogger('glQiwiApi.cache')
+
+DEFAULT_SQLITE_BUSY_TIMEOUT = 5.0
+
 
 class CacheStorage(abc.ABC):
-    def __init__(self, invalidate_strategy: Optional[CacheInvalidationStrategy] = None):
+    def __init__(
+        self,
+        invalidate_strategy: Optional[CacheInvalidationStrategy] = None,
+        stats: Optional[CacheStats] = None,
+    ):
         if invalidate_strategy is None:
             invalidate_strategy = UnrealizedCacheInvalidationStrategy()
         self._invalidate_strategy: CacheInvalidationStrategy = invalidate_strategy
+        self.stats = stats or CacheStats()
 
     @abc.abstractmethod
     async def clear(self) -> None:
@@ -40,6 +68,58 @@ class CacheStorage(abc.ABC):
     async def contains_similar(self, item: Any) -> bool:
         ...
 
+    async def get_stats(self) -> CacheStatsSnapshot:
+        return self.stats.snapshot()
+
+    async def dump_snapshot(self, path: Union[str, 'os.PathLike[str]']) -> None:
+        """Save entries to a compact json file, so they can be restored after restart"""
+        entries = await self._export_entries()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _encode_and_write_snapshot, path, entries)
+
+    async def restore_snapshot(
+        self,
+        path: Union[str, 'os.PathLike[str]'],
+        request_headers: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """
+        Load entries from snapshot, their age is increased by the time passed since
+        snapshot was made, so entries that have already expired are skipped.
+
+        :param path: path to the snapshot file
+        :param request_headers: headers of client (e.g. with authorization token),
+         snapshot doesn't contain headers of cached requests, so they are taken from here
+        :return: number of restored entries
+        """
+        loop = asyncio.get_running_loop()
+        decoded_entries = await loop.run_in_executor(
+            None, _read_and_decode_snapshot, path, request_headers
+        )
+        entries: List[SnapshotEntry] = []
+        for key, value, age in decoded_entries:
+            obj = {VALUE_PLACEHOLDER: value, ADD_TIME_PLACEHOLDER: time.monotonic() - age}
+            if await self._is_expired(obj):
+                continue
+            entries.append((key, value, age))
+        await self._import_entries(entries)
+        return len(entries)
+
+    @abc.abstractmethod
+    async def _export_entries(self) -> List[SnapshotEntry]:
+        """Entries of storage with their age in seconds, expired ones may be included"""
+
+    @abc.abstractmethod
+    async def _import_entries(self, entries: List[SnapshotEntry]) -> None:
+        """Put entries into storage, so that they have the given age"""
+
+    async def _is_expired(self, obj: Dict[str, Any]) -> bool:
+        try:
+            await self._invalidate_strategy.process_retrieve(obj=obj)
+        except CacheExpiredError:
+            return True
+        value = obj[VALUE_PLACEHOLDER]
+        return isinstance(value, CachedAPIError) and value.is_expired
+
     def __getitem__(self, item: Any) -> Any:
         return self.retrieve(item)
 
@@ -50,8 +130,12 @@ class CacheStorage(abc.ABC):
 class InMemoryCacheStorage(CacheStorage):
     __slots__ = ('_data', '_invalidate_strategy')
 
-    def __init__(self, invalidate_strategy: Optional[CacheInvalidationStrategy] = None):
-        CacheStorage.__init__(self, invalidate_strategy)
+    def __init__(
+        self,
+        invalidate_strategy: Optional[CacheInvalidationStrategy] = None,
+        stats: Optional[CacheStats] = None,
+    ):
+        CacheStorage.__init__(self, invalidate_strategy, stats)
         self._data: Dict[Any, Any] = {}
 
     async def clear(self) -> None:
@@ -59,7 +143,12 @@ class InMemoryCacheStorage(CacheStorage):
         self._data.clear()
 
     async def retrieve_all(self) -> List[Optional[Any]]:
-        return [self.retrieve(key) for key in list(self._data.keys())]
+        values: List[Optional[Any]] = []
+        for key, obj in list(self._data.items()):
+            if await self._evict_if_expired(key, obj):
+                continue
+            values.append(obj[VALUE_PLACEHOLDER])
+        return values
 
     async def update(self, **kwargs: Any) -> None:
         try:
@@ -71,14 +160,11 @@ class InMemoryCacheStorage(CacheStorage):
 
     async def retrieve(self, key: str) -> Optional[Any]:
         obj = self._data.get(key)
-        if obj is None:
-            return obj
-        try:
-            await self._invalidate_strategy.process_retrieve(obj=obj)
-            return obj[VALUE_PLACEHOLDER]
-        except CacheExpiredError:
-            await self.delete(key)
+        if obj is None or await self._evict_if_expired(key, obj):
+            self.stats.record_miss(key)
             return None
+        self.stats.record_hit(key)
+        return obj[VALUE_PLACEHOLDER]
 
     async def delete(self, key: str) -> None:
         del self._data[key]
@@ -86,5 +172,256 @@ class InMemoryCacheStorage(CacheStorage):
     async def contains_similar(self, item: Any) -> bool:
         return await self._invalidate_strategy.check_is_contains_similar(self, item)
 
+    async def get_stats(self) -> CacheStatsSnapshot:
+        size_in_bytes = 0
+        for obj in self._data.values():
+            try:
+                size_in_bytes += len(pickle.dumps(obj[VALUE_PLACEHOLDER]))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                size_in_bytes += sys.getsizeof(obj[VALUE_PLACEHOLDER])
+        return self.stats.snapshot(entries=len(self._data), size_in_bytes=size_in_bytes)
+
+    async def _export_entries(self) -> List[SnapshotEntry]:
+        now = time.monotonic()
+        return [
+            (key, obj[VALUE_PLACEHOLDER], now - obj[ADD_TIME_PLACEHOLDER])
+            for key, obj in self._data.items()
+        ]
+
+    async def _import_entries(self, entries: List[SnapshotEntry]) -> None:
+        now = time.monotonic()
+        for key, value, age in entries:
+            self._data[key] = {VALUE_PLACEHOLDER: value, ADD_TIME_PLACEHOLDER: now - age}
+
+    async def _evict_if_expired(self, key: str, obj: Dict[str, Any]) -> bool:
+        if not await self._is_expired(obj):
+            return False
+        self._data.pop(key, None)
+        self.stats.record_expiration(key)
+        return True
+
     def __del__(self) -> None:
         del self._data
+
+
+class SQLiteCacheStorage(CacheStorage):
+    """
+    Cache storage that keeps entries in a local SQLite database in WAL mode,
+    so it can be shared by several processes on the same host
+    (e.g. webhook server and a few polling workers).
+
+    Every sqlite3 call is offloaded to a dedicated thread, so the event loop is never
+    blocked by disk access. Values are serialized with pickle, so the database file
+    should be trusted as much as the code that reads it.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, 'os.PathLike[str]'],
+        invalidate_strategy: Optional[CacheInvalidationStrategy] = None,
+        max_entries: Optional[int] = None,
+        busy_timeout: float = DEFAULT_SQLITE_BUSY_TIMEOUT,
+        stats: Optional[CacheStats] = None,
+    ) -> None:
+        """
+        :param path: path to the database file, all processes must use the same path
+        :param invalidate_strategy: strategy that decides whether entry is expired or not
+        :param max_entries: if set, the oldest entries are evicted when the limit is exceeded
+        :param busy_timeout: how long to wait for a lock held by another process
+        :param stats: collector of cache metrics, counters are kept per process
+        """
+        CacheStorage.__init__(self, invalidate_strategy, stats)
+        if max_entries is not None and max_entries <= 0:
+            raise ValueError('max_entries must be a positive number')
+        self._path = os.fspath(path)
+        self._max_entries = max_entries
+        self._busy_timeout = busy_timeout
+        self._connection: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite_cache_')
+
+    async def clear(self) -> None:
+        await self._invalidate_strategy.process_delete()
+        await self._run_in_thread(self._execute, 'DELETE FROM cache')
+
+    async def update(self, **kwargs: Any) -> None:
+        try:
+            await self._invalidate_strategy.process_update(**kwargs)
+        except CacheValidationError:
+            return None
+        await self._insert_entries([(key, value, 0.0) for key, value in kwargs.items()])
+
+    async def retrieve(self, key: str) -> Optional[Any]:
+        row = await self._run_in_thread(self._select_one, key)
+        if row is None:
+            self.stats.record_miss(key)
+            return None
+        value, is_expired = await self._unpack_row(row)
+        if is_expired:
+            self.stats.record_expiration(key)
+            self.stats.record_miss(key)
+            await self.delete(key)
+            return None
+        self.stats.record_hit(key)
+        return value
+
+    async def retrieve_all(self) -> List[Optional[Any]]:
+        rows = await self._run_in_thread(self._select_all)
+        values: List[Optional[Any]] = []
+        expired_keys: List[str] = []
+        for key, *row in rows:
+            value, is_expired = await self._unpack_row(row)
+            if is_expired:
+                self.stats.record_expiration(key)
+                expired_keys.append(key)
+            else:
+                values.append(value)
+        if expired_keys:
+            await self._run_in_thread(self._delete_many, expired_keys)
+        return values
+
+    async def delete(self, key: str) -> None:
+        await self._run_in_thread(self._delete_many, [key])
+
+    async def contains_similar(self, item: Any) -> bool:
+        return await self._invalidate_strategy.check_is_contains_similar(self, item)
+
+    async def get_stats(self) -> CacheStatsSnapshot:
+        entries, size_in_bytes = await self._run_in_thread(self._measure)
+        return self.stats.snapshot(entries=entries, size_in_bytes=size_in_bytes)
+
+    async def close(self) -> None:
+        await self._run_in_thread(self._close_connection)
+        self._executor.shutdown(wait=True)
+
+    async def _export_entries(self) -> List[SnapshotEntry]:
+        now = time.time()
+        return [
+            (key, pickle.loads(serialized_value), now - added_at)
+            for key, serialized_value, added_at in await self._run_in_thread(self._select_all)
+        ]
+
+    async def _import_entries(self, entries: List[SnapshotEntry]) -> None:
+        # entries that were put by other processes are fresher than snapshot ones
+        await self._insert_entries(entries, replace=False)
+
+    async def _insert_entries(self, entries: List[SnapshotEntry], replace: bool = True) -> None:
+        now = time.time()
+        rows: List[Tuple[str, bytes, float]] = []
+        for key, value, age in entries:
+            try:
+                rows.append(
+                    (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now - age)
+                )
+            except (pickle.PicklingError, TypeError, AttributeError):
+                logger.debug('Value for key %s cannot be pickled and will not be cached', key)
+        if not rows:
+            return None
+        evicted_keys = await self._run_in_thread(self._insert, rows, replace)
+        for key in evicted_keys:
+            self.stats.record_eviction(key)
+
+    async def _unpack_row(self, row: Any) -> Tuple[Optional[Any], bool]:
+        serialized_value, added_at = row
+        obj = {
+            VALUE_PLACEHOLDER: pickle.loads(serialized_value),
+            # monotonic clock isn't shared between processes, so the wall clock time
+            # is stored and converted back to local monotonic time for invalidation strategy
+            ADD_TIME_PLACEHOLDER: time.monotonic() - (time.time() - added_at),
+        }
+        if await self._is_expired(obj):
+            return None, True
+        return obj[VALUE_PLACEHOLDER], False
+
+    async def _run_in_thread(self, fn: Callable[..., _R], *args: Any) -> _R:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+        connection = sqlite3.connect(
+            self._path,
+            timeout=self._busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, added_at REAL NOT NULL)'
+        )
+        connection.execute('CREATE INDEX IF NOT EXISTS cache_added_at ON cache (added_at)')
+        self._connection = connection
+        return connection
+
+    def _execute(self, query: str, *params: Any) -> None:
+        self._get_connection().execute(query, params)
+
+    def _insert(self, rows: List[Tuple[str, bytes, float]], replace: bool) -> List[str]:
+        connection = self._get_connection()
+        evicted_keys: List[str] = []
+        on_conflict = 'REPLACE' if replace else 'IGNORE'
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                f'INSERT OR {on_conflict} INTO cache (key, value, added_at) VALUES (?, ?, ?)',
+                rows,
+            )
+            if self._max_entries is not None:
+                evicted_keys = [
+                    key
+                    for key, in connection.execute(
+                        'SELECT key FROM cache ORDER BY added_at DESC LIMIT -1 OFFSET ?',
+                        (self._max_entries,),
+                    )
+                ]
+                connection.executemany(
+                    'DELETE FROM cache WHERE key = ?', [(key,) for key in evicted_keys]
+                )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return evicted_keys
+
+    def _measure(self) -> Tuple[int, int]:
+        cursor = self._get_connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache'
+        )
+        return cast(Tuple[int, int], cursor.fetchone())
+
+    def _select_one(self, key: str) -> Optional[Tuple[bytes, float]]:
+        cursor = self._get_connection().execute(
+            'SELECT value, added_at FROM cache WHERE key = ?', (key,)
+        )
+        return cast(Optional[Tuple[bytes, float]], cursor.fetchone())
+
+    def _select_all(self) -> List[Tuple[str, bytes, float]]:
+        cursor = self._get_connection().execute('SELECT key, value, added_at FROM cache')
+        return cast(List[Tuple[str, bytes, float]], cursor.fetchall())
+
+    def _delete_many(self, keys: List[str]) -> None:
+        self._get_connection().executemany(
+            'DELETE FROM cache WHERE key = ?', [(key,) for key in keys]
+        )
+
+    def _close_connection(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+def _encode_and_write_snapshot(
+    path: Union[str, 'os.PathLike[str]'], entries: List[SnapshotEntry]
+) -> None:
+    write_snapshot_file(path, encode_snapshot(entries))
+
+
+def _read_and_decode_snapshot(
+    path: Union[str, 'os.PathLike[str]'], request_headers: Optional[Dict[str, Any]]
+) -> List[SnapshotEntry]:
+    raw = read_snapshot_file(path)
+    if raw is None:
+        return []
+    return decode_snapshot(raw, request_headers)
@@ -1,6 +1,9 @@
+import hashlib
+import json
 import time
 from typing import Any, Dict
 
+from glQiwiApi.core.abc.api_method import Request
 from glQiwiApi.core.cache.constants import ADD_TIME_PLACEHOLDER, VALUE_PLACEHOLDER
 
 
@@ -9,3 +12,24 @@ def embed_cache_time(**kwargs: Any) -> Dict[Any, Any]:
         key: {VALUE_PLACEHOLDER: value, ADD_TIME_PLACEHOLDER: time.monotonic()}
         for key, value in kwargs.items()
     }
+
+
+def make_request_fingerprint(request: Request, prefix: str, label: str) -> str:
+    """
+    Fingerprint of request that doesn't depend on order of parameters and is stable
+    between processes, so it can be used with storages shared by several workers
+    """
+    fingerprint = json.dumps(
+        [
+            request.http_method,
+            request.endpoint,
+            request.params,
+            request.data,
+            request.json_payload,
+            request.headers,
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    digest = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+    return f'{prefix}{label}:{digest}'
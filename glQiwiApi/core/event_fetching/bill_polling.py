@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import heapq
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple, Union, cast
+
+from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher
+from glQiwiApi.core.event_fetching.executor import BaseExecutor, HandlerContext, _EventHandlerType
+from glQiwiApi.core.event_fetching.in_flight import DEFAULT_DRAIN_TIMEOUT, InFlightTracker
+from glQiwiApi.qiwi.clients.p2p.client import QiwiP2PClient
+from glQiwiApi.qiwi.clients.p2p.types import Bill, BillWebhook
+from glQiwiApi.utils.synchronous import adapter
+
+logger = logging.getLogger('glQiwiApi.executor')
+
+DEFAULT_MIN_BILL_INTERVAL = 5.0
+DEFAULT_MAX_BILL_INTERVAL = 300.0
+# bill, that is tracked for 10 minutes, is checked every minute
+DEFAULT_AGE_RATIO = 0.1
+DEFAULT_MAX_CONCURRENT_REQUESTS = 10
+INITIAL_BILL_STATUS = 'WAITING'
+FINAL_BILL_STATUSES = frozenset({'PAID', 'REJECTED', 'EXPIRED'})
+# interval is doubled after every failed check in a row, up to max_interval
+ERROR_BACKOFF_FACTOR = 2
+P2P_CLIENT_CTX_KEY = 'p2p_client'
+BILL_WEBHOOK_VERSION = '1'
+
+
+@dataclass
+class _TrackedBill:
+    bill_id: str
+    expire_at: Optional[datetime]
+    tracked_at: float
+    last_status: Optional[str]
+    next_check_at: float = 0.0
+    is_checked: bool = False
+    failures: int = 0
+    # the latest status change, that is being handled, changes of a bill are handled in order
+    dispatching: Optional[asyncio.Future[None]] = None
+
+
+class BillPollingExecutor(BaseExecutor):
+    """
+    Polls statuses of pending P2P bills for those, who can't receive webhooks.
+
+    Interval between checks of a bill grows with its age, so fresh bills,
+    that are most likely to be paid, are checked often and old ones rarely.
+    Bill is checked once more right at `expire_at` and then is dropped.
+    Every status change is dispatched to `QiwiDispatcher.bill_handler` as `BillWebhook`,
+    so the same handlers work in webhook and polling mode. P2P client is available to handlers
+    as `ctx.p2p_client`.
+    Every bill is checked and handled in its own task, so a slow request or handler
+    doesn't delay checks of other bills.
+    """
+
+    def __init__(
+        self,
+        p2p_client: QiwiP2PClient,
+        dispatcher: BaseDispatcher,
+        context: HandlerContext,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        min_interval: float = DEFAULT_MIN_BILL_INTERVAL,
+        max_interval: float = DEFAULT_MAX_BILL_INTERVAL,
+        age_ratio: float = DEFAULT_AGE_RATIO,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+        on_startup: Optional[_EventHandlerType] = None,
+        on_shutdown: Optional[_EventHandlerType] = None,
+        drain_timeout: Optional[float] = DEFAULT_DRAIN_TIMEOUT,
+    ) -> None:
+        """
+        :param p2p_client: client, that is used to get bills
+        :param min_interval: interval between checks of a fresh bill
+        :param max_interval: interval between checks of an old bill
+        :param age_ratio: interval between checks is age of bill multiplied by this ratio
+        :param max_concurrent_requests: how many bills can be requested at once
+        :param drain_timeout: how long to wait for handlers, that are in progress, on shutdown,
+         None means to wait forever
+        """
+        if not 0 < min_interval <= max_interval:
+            raise ValueError('Intervals must be positive and min_interval <= max_interval')
+        if max_concurrent_requests < 1:
+            raise ValueError('max_concurrent_requests must be positive')
+        super().__init__(
+            dispatcher,
+            loop=loop,
+            on_startup=on_startup,
+            on_shutdown=on_shutdown,
+            context=context,
+        )
+        self._p2p_client = p2p_client
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._age_ratio = age_ratio
+        self._max_concurrent_requests = max_concurrent_requests
+        self._bills: Dict[str, _TrackedBill] = {}
+        self._schedule: List[Tuple[float, str]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._drain_timeout = drain_timeout
+        self._checks: Set[asyncio.Task[None]] = set()
+        self._in_flight: InFlightTracker[BillWebhook] = InFlightTracker()
+
+        self._context[P2P_CLIENT_CTX_KEY] = self._p2p_client
+
+    @property
+    def pending_bills(self) -> List[str]:
+        return list(self._bills)
+
+    def track(self, bill: Union[Bill, str], expire_at: Optional[datetime] = None) -> None:
+        """
+        Start polling status of the bill
+
+        :param bill: bill or its id
+        :param expire_at: when bill expires, taken from the bill if it's passed on
+        """
+        last_status: Optional[str] = None
+        if isinstance(bill, Bill):
+            expire_at = expire_at or bill.expire_at
+            last_status = bill.status.value
+            bill = bill.id
+
+        tracked_bill = _TrackedBill(
+            bill_id=bill, expire_at=expire_at, tracked_at=time.monotonic(), last_status=last_status
+        )
+        self._bills[bill] = tracked_bill
+        self._schedule_check(tracked_bill, time.monotonic())
+
+    def untrack(self, bill_id: str) -> None:
+        # entry in the schedule is skipped when it's due
+        self._bills.pop(bill_id, None)
+
+    def start_polling(self) -> None:
+        try:
+            self.loop.create_task(self._run_infinite_polling())
+            adapter.run_forever_safe(self.loop)
+        except (SystemExit, KeyboardInterrupt):  # pragma: no cover
+            # allow graceful shutdown
+            pass
+
+    async def start_non_blocking_polling(self) -> asyncio.Task[None]:
+        return asyncio.create_task(self._run_infinite_polling())
+
+    async def _run_infinite_polling(self) -> None:
+        self._wakeup = asyncio.Event()
+        semaphore = asyncio.Semaphore(self._max_concurrent_requests)
+        try:
+            await self.welcome()
+            while True:
+                for tracked_bill in self._pop_due_bills(time.monotonic()):
+                    check = asyncio.create_task(self._check_bill(tracked_bill, semaphore))
+                    self._checks.add(check)
+                    check.add_done_callback(self._checks.discard)
+                await self._wait_for_next_check()
+        finally:
+            await asyncio.shield(self._close())
+
+    async def _close(self) -> None:
+        # checks are cut off, bills are checked again after restart anyway
+        checks = list(self._checks)
+        for check in checks:
+            check.cancel()
+        for check in checks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await check
+        if self._in_flight:
+            logger.info('Waiting for %d bill status changes to be handled', len(self._in_flight))
+        abandoned = await self._in_flight.drain(self._drain_timeout)
+        if abandoned:
+            logger.warning(
+                'Handling of status changes of %d bills was abandoned on shutdown: %s',
+                len(abandoned),
+                ', '.join(webhook.bill.id for webhook in abandoned),
+            )
+        await asyncio.gather(self.goodbye(), self._p2p_client.close())
+
+    async def _wait_for_next_check(self) -> None:
+        wakeup = cast(asyncio.Event, self._wakeup)
+        wakeup.clear()
+        timeout = None
+        if self._schedule:
+            timeout = max(self._schedule[0][0] - time.monotonic(), 0)
+        try:
+            await asyncio.wait_for(wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _pop_due_bills(self, now: float) -> List[_TrackedBill]:
+        due_bills: List[_TrackedBill] = []
+        while self._schedule and self._schedule[0][0] <= now:
+            check_at, bill_id = heapq.heappop(self._schedule)
+            tracked_bill = self._bills.get(bill_id)
+            # bill was untracked or rescheduled
+            if tracked_bill is None or tracked_bill.next_check_at != check_at:
+                continue
+            due_bills.append(tracked_bill)
+        return due_bills
+
+    async def _check_bill(self, tracked_bill: _TrackedBill, semaphore: asyncio.Semaphore) -> None:
+        tracked_bill.is_checked = True
+        try:
+            async with semaphore:
+                bill = await self._p2p_client.get_bill_by_id(tracked_bill.bill_id)
+        except Exception as ex:
+            logger.error('Handle %r while checking bill %s', ex, tracked_bill.bill_id)
+            tracked_bill.failures += 1
+            self._reschedule_or_drop(tracked_bill)
+            return None
+        tracked_bill.failures = 0
+
+        if tracked_bill.expire_at is None:
+            tracked_bill.expire_at = bill.expire_at
+
+        status = bill.status.value
+        if status in FINAL_BILL_STATUSES:
+            self._bills.pop(tracked_bill.bill_id, None)
+        else:
+            self._reschedule_or_drop(tracked_bill)
+
+        previous_status, tracked_bill.last_status = tracked_bill.last_status, status
+        if previous_status is None and status == INITIAL_BILL_STATUS:
+            # bill was tracked by id, so its status has just become known rather than changed
+            return None
+        if status != previous_status:
+            webhook = _make_bill_webhook(bill)
+            dispatching = asyncio.ensure_future(
+                self._dispatch(webhook, previous=tracked_bill.dispatching)
+            )
+            tracked_bill.dispatching = dispatching
+            self._in_flight.add(dispatching, webhook)
+
+    async def _dispatch(
+        self, webhook: BillWebhook, previous: Optional[asyncio.Future[None]]
+    ) -> None:
+        if previous is not None:
+            # failures of handlers are passed on to exception handler of dispatcher
+            await asyncio.wait([previous])
+        await self._dispatcher.process_event(webhook, self._context)
+
+    def _reschedule_or_drop(self, tracked_bill: _TrackedBill) -> None:
+        if tracked_bill.bill_id not in self._bills:
+            return None
+        if tracked_bill.expire_at is not None and _is_past(tracked_bill.expire_at):
+            logger.debug('Bill %s has expired and is not tracked anymore', tracked_bill.bill_id)
+            self._bills.pop(tracked_bill.bill_id, None)
+            return None
+        self._schedule_check(tracked_bill, time.monotonic())
+
+    def _schedule_check(self, tracked_bill: _TrackedBill, now: float) -> None:
+        age = now - tracked_bill.tracked_at
+        interval = min(max(age * self._age_ratio, self._min_interval), self._max_interval)
+        if tracked_bill.failures:
+            backoff = ERROR_BACKOFF_FACTOR ** min(tracked_bill.failures, 32)
+            interval = min(interval * backoff, self._max_interval)
+        if tracked_bill.expire_at is not None:
+            # the last check is done right at expiration, payment could be made at the last moment
+            interval = min(interval, max(_seconds_until(tracked_bill.expire_at), 0))
+        if tracked_bill.last_status is None and not tracked_bill.is_checked:
+            # status is unknown, so the first check is done as soon as possible
+            interval = 0
+        tracked_bill.next_check_at = now + interval
+        heapq.heappush(self._schedule, (tracked_bill.next_check_at, tracked_bill.bill_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+
+def _make_bill_webhook(bill: Bill) -> BillWebhook:
+    return BillWebhook.parse_obj(
+        {
+            'version': BILL_WEBHOOK_VERSION,
+            'bill': bill.dict(by_alias=True, exclude={'pay_url'}),
+        }
+    )
+
+
+def _seconds_until(moment: datetime) -> float:
+    return (moment - datetime.now(moment.tzinfo)).total_seconds()
+
+
+def _is_past(moment: datetime) -> bool:
+    return _seconds_until(moment) <= 0
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import contextlib
+import logging
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar, Union, cast
+
+from glQiwiApi.utils.compat import json
+
+logger = logging.getLogger('glQiwiApi.checkpoints')
+
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_SQLITE_BUSY_TIMEOUT = 5.0
+
+_R = TypeVar('_R')
+
+
+@dataclass(frozen=True)
+class Checkpoint:
+    """Position of polling, that all events before it were processed"""
+
+    offset: int
+    updates_from: datetime
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'offset': self.offset, 'updates_from': self.updates_from.isoformat()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> Checkpoint:
+        return cls(
+            offset=int(data['offset']), updates_from=datetime.fromisoformat(data['updates_from'])
+        )
+
+
+class BaseCheckpointStorage(abc.ABC):
+    @abc.abstractmethod
+    async def load(self, key: str) -> Optional[Checkpoint]:
+        pass
+
+    @abc.abstractmethod
+    async def save(self, checkpoints: Dict[str, Checkpoint]) -> None:
+        """Save several checkpoints at once"""
+
+    async def close(self) -> None:
+        pass
+
+
+class FileCheckpointStorage(BaseCheckpointStorage):
+    """
+    Keeps checkpoints of all wallets in one json file.
+    File is replaced atomically, so it's never left half-written after crash.
+
+    Read-modify-write of the file is guarded by exclusive lock of `<path>.lock`,
+    so several processes (e.g. shards of `ShardedPollingSupervisor`) can share it.
+    Locking isn't supported on Windows, so there the file must be used by one process,
+    use `SQLiteCheckpointStorage` instead.
+    """
+
+    def __init__(self, path: Union[str, 'os.PathLike[str]']) -> None:
+        self._path = os.fspath(path)
+        self._lock = asyncio.Lock()
+
+    async def load(self, key: str) -> Optional[Checkpoint]:
+        data = await asyncio.get_running_loop().run_in_executor(None, self._read)
+        if key not in data:
+            return None
+        return Checkpoint.from_dict(data[key])
+
+    async def save(self, checkpoints: Dict[str, Checkpoint]) -> None:
+        async with self._lock:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, checkpoints)
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self._path, 'rb') as f:
+                return cast(Dict[str, Any], json.loads(f.read()))
+        except FileNotFoundError:
+            return {}
+
+    def _write(self, checkpoints: Dict[str, Checkpoint]) -> None:
+        with _exclusive_lock(f'{self._path}.lock'):
+            data = self._read()
+            data.update({key: checkpoint.to_dict() for key, checkpoint in checkpoints.items()})
+            raw = json.dumps(data)
+            if isinstance(raw, str):
+                # stdlib json is used, when orjson isn't installed
+                raw = raw.encode('utf-8')
+            tmp_path = f'{self._path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(raw)
+            os.replace(tmp_path, self._path)
+
+
+if sys.platform == 'win32':  # pragma: no cover
+
+    @contextlib.contextmanager
+    def _exclusive_lock(path: str) -> Iterator[None]:
+        yield
+
+else:
+    import fcntl
+
+    @contextlib.contextmanager
+    def _exclusive_lock(path: str) -> Iterator[None]:
+        """Lock is released by OS, if process crashes while holding it"""
+        with open(path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+class SQLiteCheckpointStorage(BaseCheckpointStorage):
+    """
+    Keeps checkpoints in SQLite database in WAL mode, so several processes
+    can checkpoint their wallets into one file.
+    Every sqlite3 call is offloaded to a dedicated thread.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, 'os.PathLike[str]'],
+        busy_timeout: float = DEFAULT_SQLITE_BUSY_TIMEOUT,
+    ) -> None:
+        self._path = os.fspath(path)
+        self._busy_timeout = busy_timeout
+        self._connection: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite_checkpoint_')
+
+    async def load(self, key: str) -> Optional[Checkpoint]:
+        row = await self._run_in_thread(self._select_one, key)
+        if row is None:
+            return None
+        offset, updates_from = row
+        return Checkpoint.from_dict({'offset': offset, 'updates_from': updates_from})
+
+    async def save(self, checkpoints: Dict[str, Checkpoint]) -> None:
+        rows = [
+            (key, checkpoint.offset, checkpoint.updates_from.isoformat())
+            for key, checkpoint in checkpoints.items()
+        ]
+        await self._run_in_thread(self._upsert, rows)
+
+    async def close(self) -> None:
+        await self._run_in_thread(self._close_connection)
+        self._executor.shutdown(wait=True)
+
+    async def _run_in_thread(self, fn: Callable[..., _R], *args: Any) -> _R:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+        connection = sqlite3.connect(
+            self._path,
+            timeout=self._busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS checkpoints ('
+            'key TEXT PRIMARY KEY, txn_offset INTEGER NOT NULL, updates_from TEXT NOT NULL)'
+        )
+        self._connection = connection
+        return connection
+
+    def _select_one(self, key: str) -> Optional[Tuple[int, str]]:
+        cursor = self._get_connection().execute(
+            'SELECT txn_offset, updates_from FROM checkpoints WHERE key = ?', (key,)
+        )
+        return cast(Optional[Tuple[int, str]], cursor.fetchone())
+
+    def _upsert(self, rows: List[Tuple[str, int, str]]) -> None:
+        connection = self._get_connection()
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany(
+                'INSERT OR REPLACE INTO checkpoints (key, txn_offset, updates_from) '
+                'VALUES (?, ?, ?)',
+                rows,
+            )
+
+    def _close_connection(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class CheckpointWriter:
+    """
+    Collects checkpoints in memory and saves them to storage in background
+    every `flush_interval` seconds, so polling never waits for disk.
+    Only the latest checkpoint of every key is written.
+    """
+
+    def __init__(
+        self, storage: BaseCheckpointStorage, flush_interval: float = DEFAULT_FLUSH_INTERVAL
+    ) -> None:
+        self._storage = storage
+        self._flush_interval = flush_interval
+        self._pending: Dict[str, Checkpoint] = {}
+        self._flushing_task: Optional[asyncio.Task[None]] = None
+
+    async def load(self, key: str) -> Optional[Checkpoint]:
+        return await self._storage.load(key)
+
+    def record(self, key: str, checkpoint: Checkpoint) -> None:
+        self._pending[key] = checkpoint
+
+    def discard(self, key: str) -> None:
+        """Forget checkpoint of key, that isn't saved yet"""
+        self._pending.pop(key, None)
+
+    def start(self) -> None:
+        if self._flushing_task is None:
+            self._flushing_task = asyncio.create_task(self._flush_periodically())
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        checkpoints, self._pending = self._pending, {}
+        try:
+            await self._storage.save(checkpoints)
+        except Exception:
+            # checkpoints recorded after the failed flush are newer, so they win
+            self._pending = {**checkpoints, **self._pending}
+            raise
+
+    async def close(self) -> None:
+        if self._flushing_task is not None:
+            self._flushing_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flushing_task
+            self._flushing_task = None
+        try:
+            await self.flush()
+        finally:
+            await self._storage.close()
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception as ex:
+                logger.error('Failed to save checkpoints: %r', ex)
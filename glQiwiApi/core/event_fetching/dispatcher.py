@@ -5,15 +5,21 @@ import asyncio
 import inspect
 import logging
 import operator
+import time
+from dataclasses import dataclass, field
 from typing import (
     Any,
     Awaitable,
     Callable,
+    Dict,
     Generic,
     Iterable,
     List,
+    Mapping,
     Optional,
     Sequence,
+    Set,
+    Tuple,
     Type,
     TypeVar,
     Union,
@@ -21,11 +27,15 @@ from typing import (
 )
 
 from glQiwiApi.core.event_fetching.class_based.base import Handler
+from glQiwiApi.core.event_fetching.handler_index import HandlerIndex
+from glQiwiApi.core.event_fetching.middlewares import MiddlewareManager, NextHandler, current_trace
+from glQiwiApi.core.event_fetching.worker_pool import release_worker
 from glQiwiApi.qiwi.clients.p2p.types import BillWebhook
 from glQiwiApi.qiwi.clients.wallet.types.transaction import Transaction
 from glQiwiApi.qiwi.clients.wallet.types.webhooks import TransactionWebhook
+from glQiwiApi.yoo_money.types import Operation
 
-from .filters import BaseFilter, LambdaBasedFilter
+from .filters import BaseFilter, LambdaBasedFilter, compile_filters
 
 logger = logging.getLogger('glQiwiApi.dispatcher')
 
@@ -38,29 +48,100 @@ class CancelHandler(Exception):
     pass
 
 
+class HandlerTimeoutError(Exception):
+    """Handler hasn't finished in time, it's passed on to `exception_handler`"""
+
+    def __init__(self, handler: Any, timeout: float) -> None:
+        super().__init__(f'Handler {handler!r} has not finished in {timeout} seconds')
+        self.handler = handler
+        self.timeout = timeout
+
+
 Event = TypeVar('Event')
 F = TypeVar('F', bound=Callable[..., Any])
+_TimeoutCallback = Callable[..., Union[None, Awaitable[None]]]
+
+DEFAULT_MAX_BATCH_SIZE = 100
+DEFAULT_MAX_BATCH_LATENCY = 1.0
 
 
 class BaseDispatcher(abc.ABC):
     def __init__(self) -> None:
+        # called once for every event before it's routed to handlers
+        self.outer_middleware = MiddlewareManager()
+        # called for every handler, whose filters have passed, shared by all collections
+        self.inner_middleware = MiddlewareManager()
+        self._outer_chain: NextHandler = self._dispatch
+        self._outer_chain_version = self.outer_middleware.version
+        # event type -> collections, that accept events of this type
+        self._routes: Dict[Type[Any], Tuple[HandlerCollection[Any], ...]] = {}
         self.exception_handler = HandlerCollection(Exception)
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if isinstance(value, HandlerCollection):
+            # exception handlers receive errors of the chain, so they don't run inside of it
+            if name != 'exception_handler':
+                value.middleware = self.inner_middleware
+            self.invalidate_routes()
+
+    def invalidate_routes(self) -> None:
+        """
+        Drop cached routes of event types, must be called
+        if `__all_handlers__` changes without assignment of attribute
+        """
+        routes = self.__dict__.get('_routes')
+        if routes is not None:
+            routes.clear()
+
     async def process_event(self, event: Event, *args: Any) -> None:
         """
         Feed handlers with event.
 
         :param event: any object that will be propagated to handlers
         """
-        coroutines = [h.notify(event, *args) for h in self.__all_handlers__]
-        results = await asyncio.gather(*coroutines, return_exceptions=True)
-        for result in results:
-            if self.exception_handler.is_empty:
-                break
-            if not isinstance(result, Exception):
-                continue
+        if self._outer_chain_version != self.outer_middleware.version:
+            self._outer_chain = self.outer_middleware.wrap(self._dispatch)
+            self._outer_chain_version = self.outer_middleware.version
+        try:
+            await self._outer_chain(event, *args)
+        except Exception as ex:
+            await self._handle_exception(ex, *args)
+
+    async def _dispatch(self, event: Event, *args: Any) -> None:
+        collections = self._resolve_routes(type(event))
+        if len(collections) == 1:
+            # the most common case doesn't need gather
+            try:
+                await collections[0].notify(event, *args)
+            except Exception as ex:
+                await self._handle_exception(ex, *args)
+            return None
 
-            await self.exception_handler.notify(result, *args)
+        results = await asyncio.gather(
+            *(collection.notify(event, *args) for collection in collections),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                await self._handle_exception(result, *args)
+
+    def _resolve_routes(self, event_type: Type[Any]) -> Tuple[HandlerCollection[Any], ...]:
+        collections = self._routes.get(event_type)
+        if collections is None:
+            # issubclass walks MRO, so handlers of base class receive events of subclasses
+            collections = tuple(
+                collection
+                for collection in self.__all_handlers__
+                if issubclass(event_type, collection.event_types)
+            )
+            self._routes[event_type] = collections
+        return collections
+
+    async def _handle_exception(self, exception: Exception, *args: Any) -> None:
+        if self.exception_handler.is_empty:
+            return None
+        await self.exception_handler.notify(exception, *args)
 
     @property
     @abc.abstractmethod
@@ -79,18 +160,47 @@ class QiwiDispatcher(BaseDispatcher):
         return self.bill_handler, self.transaction_handler
 
 
+class YooMoneyDispatcher(BaseDispatcher):
+    def __init__(self) -> None:
+        super().__init__()
+        self.operation_handler = HandlerCollection(Operation)
+
+    @property
+    def __all_handlers__(self) -> Sequence[HandlerCollection[Any]]:
+        return (self.operation_handler,)
+
+
 class HandlerCollection(Generic[Event]):
     def __init__(self, *event_types: Type[Event], once: bool = True) -> None:
         self._handlers: List[EventHandler[Event]] = []
+        self._index: HandlerIndex[EventHandler[Event]] = HandlerIndex()
+        # replaced by inner middleware of dispatcher, when collection is assigned to it
+        self.middleware = MiddlewareManager()
         self._once = once
-        self._event_filter: Callable[[Event], bool] = lambda e: isinstance(e, event_types)
+        self._event_types = event_types
+
+    @property
+    def event_types(self) -> Tuple[Type[Event], ...]:
+        return self._event_types
 
     async def notify(self, event: Event, *args: Any) -> None:
-        if not self._event_filter(event):
+        if not isinstance(event, self._event_types):
             return None
-        for handler in self._handlers:
+        trace = current_trace.get()
+        filter_time = 0.0
+        for handler in self._index.candidates(event):
             try:
-                await handler.check_then_execute(event, *args)
+                if trace is None:
+                    passed = await handler.check(event)
+                else:
+                    started_at = time.perf_counter()
+                    passed = await handler.check(event)
+                    filter_time += time.perf_counter() - started_at
+                if not passed:
+                    continue
+                if trace is not None:
+                    trace.filter_time, trace.handler = filter_time, handler.callback
+                await handler.execute(event, *args, middleware=self.middleware)
                 if self._once:
                     break
             except SkipHandler:
@@ -98,9 +208,21 @@ class HandlerCollection(Generic[Event]):
             except CancelHandler:
                 break
 
-    def __call__(self, *filters: BaseFilter[Event]) -> Callable[[F], F]:
+    def __call__(
+        self,
+        *filters: BaseFilter[Event],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        on_timeout: Optional[_TimeoutCallback] = None,
+    ) -> Callable[[F], F]:
         def decorator(callback: F) -> F:
-            self.register_handler(callback, *filters)
+            self.register_handler(
+                callback,
+                *filters,
+                max_concurrency=max_concurrency,
+                timeout=timeout,
+                on_timeout=on_timeout,
+            )
             return callback
 
         return decorator
@@ -109,6 +231,9 @@ class HandlerCollection(Generic[Event]):
         self,
         event_handler: Union[Callable[..., Awaitable[Any]], Type[Handler[Event]]],
         *filters: Union[Callable[[Event], bool], BaseFilter[Event]],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        on_timeout: Optional[_TimeoutCallback] = None,
     ) -> None:
         """
         Add new event handler.
@@ -117,18 +242,89 @@ class HandlerCollection(Generic[Event]):
         :param event_handler: event handler, low order function
          which works with events
         :param filters: filter for low order function execution
+        :param max_concurrency: how many events handler can process at once,
+         other events wait for a free slot
+        :param timeout: deadline of handler in seconds, when it passes,
+         handler is cancelled and `HandlerTimeoutError` is passed on to `exception_handler`
+        :param on_timeout: function or coroutine, which is called with event and arguments
+         of handler, when handler is cancelled by timeout
         """
-        generated_filters: List[BaseFilter[Event]] = []
-        for filter_ in filters:
-            if inspect.isfunction(filter_):
-                generated_filters.append(LambdaBasedFilter(filter_))
-            else:
-                generated_filters.append(cast(BaseFilter[Event], filter_))
+        self._add_handler(
+            EventHandler(
+                event_handler,
+                *_make_filters(filters),
+                max_concurrency=max_concurrency,
+                timeout=timeout,
+                on_timeout=on_timeout,
+            )
+        )
+
+    def batch(
+        self,
+        *filters: BaseFilter[Event],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_latency: float = DEFAULT_MAX_BATCH_LATENCY,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        on_timeout: Optional[_TimeoutCallback] = None,
+    ) -> Callable[[F], F]:
+        """Register batch handler by decorator, see `register_batch_handler`"""
+
+        def decorator(callback: F) -> F:
+            self.register_batch_handler(
+                callback,
+                *filters,
+                max_batch_size=max_batch_size,
+                max_latency=max_latency,
+                max_concurrency=max_concurrency,
+                timeout=timeout,
+                on_timeout=on_timeout,
+            )
+            return callback
 
-        self._handlers.append(EventHandler(event_handler, *generated_filters))
+        return decorator
+
+    def register_batch_handler(
+        self,
+        event_handler: Callable[..., Awaitable[Optional[Mapping[int, Exception]]]],
+        *filters: Union[Callable[[Event], bool], BaseFilter[Event]],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_latency: float = DEFAULT_MAX_BATCH_LATENCY,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        on_timeout: Optional[_TimeoutCallback] = None,
+    ) -> None:
+        """
+        Add handler, that receives list of events instead of one event,
+        e.g. to save them into database by one query.
+        Filters are applied to every event separately.
+
+        Handler may return mapping of index of event in the list to exception,
+        that has occurred while handling this event, other events are considered handled.
+        Every failure is passed on to `exception_handler` separately.
+
+        :param max_batch_size: batch is passed on to handler as soon as it has so many events
+        :param max_latency: how long the first event of batch can wait for other events
+        """
+        self._add_handler(
+            BatchEventHandler(
+                event_handler,
+                *_make_filters(filters),
+                max_batch_size=max_batch_size,
+                max_latency=max_latency,
+                max_concurrency=max_concurrency,
+                timeout=timeout,
+                on_timeout=on_timeout,
+            )
+        )
+
+    def _add_handler(self, handler: EventHandler[Event]) -> None:
+        self._handlers.append(handler)
+        self._index.add(handler, handler.filters)
 
     def remove_handler(self, handler: EventHandler[Event]) -> None:
         self._handlers.remove(handler)
+        self._index.remove(handler, handler.filters)
 
     def __iter__(self) -> Iterable[EventHandler[Event]]:
         return iter(self._handlers)
@@ -148,15 +344,198 @@ class EventHandler(Generic[Event]):
         self,
         handler: Union[Callable[..., Awaitable[Any]], Type[Handler[Event]]],
         *filters: BaseFilter[Event],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        on_timeout: Optional[_TimeoutCallback] = None,
     ) -> None:
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError('max_concurrency must be positive')
+        if timeout is not None and timeout <= 0:
+            raise ValueError('timeout must be positive')
+        self._max_concurrency = max_concurrency
+        # semaphore is created lazily, because it must be bound to running event loop
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._timeout = timeout
+        self._on_timeout = on_timeout
         self._handler = handler
+        self._chain: NextHandler = cast(NextHandler, handler)
+        self._chain_version: Optional[int] = None
         self._filters = tuple(filter(lambda f: operator.not_(operator.eq(f, None)), filters))
+        # filters are compiled once, so sync filters are evaluated without creating coroutines
+        self._compiled_filters = compile_filters(self._filters)
+
+    @property
+    def filters(self) -> Tuple[BaseFilter[Event], ...]:
+        return self._filters
+
+    @property
+    def callback(self) -> Union[Callable[..., Awaitable[Any]], Type[Handler[Any]]]:
+        return self._handler
+
+    async def check(self, event: Event) -> bool:
+        """Apply all filters to event"""
+        for step in self._compiled_filters:
+            if isinstance(step, BaseFilter):
+                if not await step.check(event):
+                    return False
+            elif not step(event):
+                return False
+        return True
+
+    async def execute(
+        self, event: Event, *args: Any, middleware: Optional[MiddlewareManager] = None
+    ) -> Any:
+        """
+        Pass on event to handler through chain of middlewares,
+        respecting limit of concurrency and timeout of handler
+
+        :param middleware: inner middlewares, chain is composed again only when they change
+        """
+        chain = cast(NextHandler, self._handler)
+        if middleware is not None:
+            if self._chain_version != middleware.version:
+                self._chain = middleware.wrap(chain)
+                self._chain_version = middleware.version
+            chain = self._chain
+
+        if self._max_concurrency is None:
+            return await self._run_with_timeout(chain, event, *args)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        async with self._semaphore:
+            return await self._run_with_timeout(chain, event, *args)
+
+    async def _run_with_timeout(self, chain: NextHandler, event: Event, *args: Any) -> Any:
+        if self._timeout is None:
+            return await chain(event, *args)
+        try:
+            return await asyncio.wait_for(chain(event, *args), self._timeout)
+        except asyncio.TimeoutError:
+            if self._on_timeout is not None:
+                result = self._on_timeout(event, *args)
+                if inspect.isawaitable(result):
+                    await result
+            raise HandlerTimeoutError(self._handler, self._timeout) from None
 
     async def check_then_execute(self, event: Event, *args: Any) -> Optional[Any]:
         """Check event, apply all filters and then pass on to handler"""
-        for f in self._filters:
-            if not await f.check(event):
-                break
+        if not await self.check(event):
+            return None
+        return await self.execute(event, *args)
+
+
+@dataclass
+class _PendingBatch:
+    args: Tuple[Any, ...]
+    middleware: Optional[MiddlewareManager]
+    events: List[Any] = field(default_factory=list)
+    results: List[asyncio.Future[None]] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+
+class BatchEventHandler(EventHandler[Event]):
+    """
+    Collects events, that have passed filters, and passes them on to handler by batches.
+    Every event waits until its batch is handled, so executor knows when event is done,
+    but it gives its worker of `WorkerPool` back meanwhile.
+    Events with different arguments (e.g. contexts of different wallets) are never mixed.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[..., Awaitable[Optional[Mapping[int, Exception]]]],
+        *filters: BaseFilter[Event],
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_latency: float = DEFAULT_MAX_BATCH_LATENCY,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        on_timeout: Optional[_TimeoutCallback] = None,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size must be positive')
+        if max_latency < 0:
+            raise ValueError('max_latency must not be negative')
+        super().__init__(
+            handler,
+            *filters,
+            max_concurrency=max_concurrency,
+            timeout=timeout,
+            on_timeout=on_timeout,
+        )
+        self._max_batch_size = max_batch_size
+        self._max_latency = max_latency
+        self._pending: Dict[Tuple[int, ...], _PendingBatch] = {}
+        self._flushing: Set[asyncio.Task[None]] = set()
+
+    async def execute(
+        self, event: Event, *args: Any, middleware: Optional[MiddlewareManager] = None
+    ) -> None:
+        loop = asyncio.get_running_loop()
+        key = tuple(id(arg) for arg in args)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _PendingBatch(args, middleware)
+            batch.timer = loop.call_later(self._max_latency, self._start_flush, key)
+
+        result: asyncio.Future[None] = loop.create_future()
+        batch.events.append(event)
+        batch.results.append(result)
+        if len(batch.events) >= self._max_batch_size:
+            self._start_flush(key)
+        # otherwise worker of pool would wait for the batch, so batch couldn't outgrow the pool
+        release_worker()
+        await result
+
+    async def flush(self) -> None:
+        """Pass on all pending events to handler immediately and wait until they're handled"""
+        for key in list(self._pending):
+            self._start_flush(key)
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def _start_flush(self, key: Tuple[int, ...]) -> None:
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return None
+        if batch.timer is not None:
+            batch.timer.cancel()
+        task = asyncio.ensure_future(self._handle_batch(batch))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _handle_batch(self, batch: _PendingBatch) -> None:
+        try:
+            failures = await super().execute(
+                cast(Event, batch.events), *batch.args, middleware=batch.middleware
+            )
+        except asyncio.CancelledError:
+            for result in batch.results:
+                result.cancel()
+            raise
+        except Exception as ex:
+            for result in batch.results:
+                if not result.done():
+                    result.set_exception(ex)
+            return None
+
+        failures = failures or {}
+        for index, result in enumerate(batch.results):
+            if result.done():  # event was cancelled while waiting for batch
+                continue
+            error = failures.get(index)
+            if error is None:
+                result.set_result(None)
+            else:
+                result.set_exception(error)
+
+
+def _make_filters(
+    filters: Sequence[Union[Callable[[Event], bool], BaseFilter[Event]]]
+) -> List[BaseFilter[Event]]:
+    generated_filters: List[BaseFilter[Event]] = []
+    for filter_ in filters:
+        if inspect.isfunction(filter_):
+            generated_filters.append(LambdaBasedFilter(filter_))
         else:
-            return await self._handler(event, *args)
-        return None  # hint for mypy
+            generated_filters.append(cast(BaseFilter[Event], filter_))
+    return generated_filters
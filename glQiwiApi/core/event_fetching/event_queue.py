@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import collections
+import contextlib
+import itertools
+import logging
+import os
+import pickle
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, List, Optional, Tuple, TypeVar, Union, cast
+
+from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher
+from glQiwiApi.core.event_fetching.in_flight import DEFAULT_DRAIN_TIMEOUT, InFlightTracker
+
+logger = logging.getLogger('glQiwiApi.event_queue')
+
+DEFAULT_MAX_QUEUE_SIZE = 1000
+DEFAULT_SQLITE_BUSY_TIMEOUT = 5.0
+
+_R = TypeVar('_R')
+
+
+@dataclass(frozen=True)
+class Delivery:
+    """Event taken from the queue, it stays in the queue until it's acknowledged"""
+
+    id: int
+    event: Any
+
+
+class BaseEventQueue(abc.ABC):
+    """
+    Buffer between source of events (polling or webhooks) and dispatcher,
+    so fetching isn't slowed down by handlers.
+    Events are delivered at least once: event, that was taken but not acknowledged,
+    may be delivered again.
+    """
+
+    @abc.abstractmethod
+    async def put(self, event: Any) -> None:
+        """Put event into the queue, waits while the queue is full"""
+
+    @abc.abstractmethod
+    async def get(self) -> Delivery:
+        """Take the oldest event, waits while the queue is empty"""
+
+    @abc.abstractmethod
+    async def ack(self, delivery: Delivery) -> None:
+        """Remove handled event from the queue"""
+
+    @abc.abstractmethod
+    async def join(self) -> None:
+        """Wait until every event, that was put, is acknowledged"""
+
+    @abc.abstractmethod
+    def __len__(self) -> int:
+        """Number of events, that aren't acknowledged yet"""
+
+    @property
+    def is_durable(self) -> bool:
+        """Events, that aren't acknowledged, are delivered again after restart"""
+        return False
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryEventQueue(BaseEventQueue):
+    """
+    Bounded queue in memory of the process.
+    It's fast, but events, that are buffered, are lost on crash.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAX_QUEUE_SIZE) -> None:
+        """
+        :param maxsize: number of events, that aren't acknowledged yet, when queue is full
+         `put` waits, so fetching is paused until handlers catch up
+        """
+        if maxsize < 1:
+            raise ValueError('Queue size must be positive')
+        self._maxsize = maxsize
+        self._ids = itertools.count()
+        self._ready: Deque[Delivery] = collections.deque()
+        self._size = 0
+        self._changed: Optional[asyncio.Condition] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    async def put(self, event: Any) -> None:
+        changed = self._get_condition()
+        async with changed:
+            await changed.wait_for(lambda: self._size < self._maxsize)
+            self._size += 1
+            self._ready.append(Delivery(next(self._ids), event))
+            changed.notify_all()
+
+    async def get(self) -> Delivery:
+        changed = self._get_condition()
+        async with changed:
+            await changed.wait_for(lambda: bool(self._ready))
+            return self._ready.popleft()
+
+    async def ack(self, delivery: Delivery) -> None:
+        changed = self._get_condition()
+        async with changed:
+            self._size -= 1
+            changed.notify_all()
+
+    async def join(self) -> None:
+        changed = self._get_condition()
+        async with changed:
+            await changed.wait_for(lambda: self._size == 0)
+
+    async def close(self) -> None:
+        if self._size:
+            logger.warning('%d events are left in memory queue and are lost', self._size)
+
+    def _get_condition(self) -> asyncio.Condition:
+        # condition is created lazily, because it must be bound to running event loop
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+
+class SQLiteEventQueue(BaseEventQueue):
+    """
+    Durable queue in SQLite database in WAL mode.
+    Event is written to disk before `put` returns and is deleted only when it's acknowledged,
+    so events, that weren't handled before crash, are delivered again after restart.
+
+    Every sqlite3 call is offloaded to a dedicated thread. Events are serialized with pickle,
+    so the database file should be trusted as much as the code that reads it.
+    Database file must be used by one queue in one process at a time.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, 'os.PathLike[str]'],
+        maxsize: Optional[int] = None,
+        busy_timeout: float = DEFAULT_SQLITE_BUSY_TIMEOUT,
+    ) -> None:
+        """
+        :param path: path to the database file
+        :param maxsize: if set, `put` waits while the queue has this number of events
+        :param busy_timeout: how long to wait for a lock of the database file
+        """
+        if maxsize is not None and maxsize < 1:
+            raise ValueError('Queue size must be positive')
+        self._path = os.fspath(path)
+        self._maxsize = maxsize
+        self._busy_timeout = busy_timeout
+        self._connection: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite_queue_')
+        self._changed: Optional[asyncio.Condition] = None
+        self._reading: Optional[asyncio.Lock] = None
+        # events, that aren't acknowledged, events, that aren't delivered yet,
+        # and id of the last delivered event
+        self._size = 0
+        self._ready = 0
+        self._cursor = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def is_durable(self) -> bool:
+        return True
+
+    async def put(self, event: Any) -> None:
+        payload = pickle.dumps(event, protocol=pickle.HIGHEST_PROTOCOL)
+        changed = await self._open()
+        async with changed:
+            await changed.wait_for(lambda: self._maxsize is None or self._size < self._maxsize)
+            # place is reserved before writing, so concurrent producers can't overfill the queue
+            self._size += 1
+        # if producer is cancelled, write is completed anyway, so counters match the table
+        await asyncio.shield(asyncio.ensure_future(self._write(payload)))
+
+    async def get(self) -> Delivery:
+        changed = await self._open()
+        async with cast(asyncio.Lock, self._reading):
+            async with changed:
+                await changed.wait_for(lambda: self._ready > 0)
+            # reading has no side effects, so cancelled consumer doesn't lose the event
+            delivery_id, payload = await self._run_in_thread(self._select_next, self._cursor)
+            self._cursor = delivery_id
+            self._ready -= 1
+        return Delivery(delivery_id, pickle.loads(payload))
+
+    async def ack(self, delivery: Delivery) -> None:
+        changed = await self._open()
+        await self._run_in_thread(self._delete, delivery.id)
+        async with changed:
+            self._size -= 1
+            changed.notify_all()
+
+    async def join(self) -> None:
+        changed = await self._open()
+        async with changed:
+            await changed.wait_for(lambda: self._size == 0)
+
+    async def close(self) -> None:
+        await self._run_in_thread(self._close_connection)
+        self._executor.shutdown(wait=True)
+
+    async def _open(self) -> asyncio.Condition:
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+            self._reading = asyncio.Lock()
+            # other calls wait for the lock, so they see restored counters
+            async with self._changed:
+                # events, that weren't acknowledged before restart, are delivered again
+                self._size = self._ready = await self._run_in_thread(self._count)
+            if self._size:
+                logger.info('%d events are restored from %s', self._size, self._path)
+        return self._changed
+
+    async def _write(self, payload: bytes) -> None:
+        changed = cast(asyncio.Condition, self._changed)
+        try:
+            await self._run_in_thread(self._insert, payload)
+        except BaseException:
+            async with changed:
+                self._size -= 1
+                changed.notify_all()
+            raise
+        async with changed:
+            self._ready += 1
+            changed.notify_all()
+
+    async def _run_in_thread(self, fn: Callable[..., _R], *args: Any) -> _R:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+        connection = sqlite3.connect(
+            self._path,
+            timeout=self._busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        # in WAL mode it survives crash of the process, only power loss can roll back commits
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, payload BLOB NOT NULL)'
+        )
+        self._connection = connection
+        return connection
+
+    def _count(self) -> int:
+        cursor = self._get_connection().execute('SELECT COUNT(*) FROM events')
+        return cast(int, cursor.fetchone()[0])
+
+    def _insert(self, payload: bytes) -> None:
+        self._get_connection().execute('INSERT INTO events (payload) VALUES (?)', (payload,))
+
+    def _select_next(self, after_id: int) -> Tuple[int, bytes]:
+        cursor = self._get_connection().execute(
+            'SELECT id, payload FROM events WHERE id > ? ORDER BY id LIMIT 1', (after_id,)
+        )
+        return cast(Tuple[int, bytes], cursor.fetchone())
+
+    def _delete(self, delivery_id: int) -> None:
+        self._get_connection().execute('DELETE FROM events WHERE id = ?', (delivery_id,))
+
+    def _close_connection(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+class EventQueueConsumer:
+    """
+    Takes events from the queue and passes them on to dispatcher with fixed concurrency.
+    Event is acknowledged after dispatcher has processed it, errors of handlers are
+    passed on to exception handler of dispatcher as usual.
+    """
+
+    def __init__(
+        self,
+        queue: BaseEventQueue,
+        dispatcher: BaseDispatcher,
+        *args: Any,
+        concurrency: int = 1,
+        drain_timeout: Optional[float] = DEFAULT_DRAIN_TIMEOUT,
+    ) -> None:
+        """
+        :param queue: queue, that events are taken from
+        :param dispatcher: dispatcher, which processing events
+        :param args: arguments, that are passed on to handlers along with event,
+         e.g. `HandlerContext`
+        :param concurrency: number of events, that are handled simultaneously
+        :param drain_timeout: how long `close` waits for queued events and handlers,
+         that are in progress, None means to wait forever
+        """
+        if concurrency < 1:
+            raise ValueError('Concurrency must be positive')
+        self._queue = queue
+        self._dispatcher = dispatcher
+        self._args = args
+        self._concurrency = concurrency
+        self._drain_timeout = drain_timeout
+        self._workers: List[asyncio.Task[None]] = []
+        self._in_flight: InFlightTracker[Delivery] = InFlightTracker()
+
+    @property
+    def is_started(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        if self.is_started:
+            return None
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self._concurrency)]
+
+    async def close(self) -> List[Any]:
+        """
+        Wait until the queue is empty at most `drain_timeout` seconds and stop workers.
+        Events, that aren't acknowledged by then, stay in the queue.
+
+        :return: events, whose handling was abandoned
+        """
+        if not self.is_started:
+            return []
+        deadline = None if self._drain_timeout is None else time.monotonic() + self._drain_timeout
+        if len(self._queue):
+            logger.info('Waiting for %d queued events to be handled', len(self._queue))
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._queue.join(), timeout=_remaining(deadline))
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            with contextlib.suppress(asyncio.CancelledError):
+                await worker
+        self._workers = []
+        abandoned = await self._in_flight.drain(_remaining(deadline))
+        if abandoned:
+            logger.warning('Handling of %d queued events was abandoned', len(abandoned))
+        return [delivery.event for delivery in abandoned]
+
+    async def _work(self) -> None:
+        while True:
+            delivery = await self._queue.get()
+            handling = asyncio.ensure_future(self._handle(delivery))
+            # cancellation of worker doesn't cut handler off, it's drained by `close`
+            await asyncio.shield(self._in_flight.add(handling, delivery))
+
+    async def _handle(self, delivery: Delivery) -> None:
+        try:
+            await self._dispatcher.process_event(delivery.event, *self._args)
+        except Exception as ex:
+            logger.exception('Failed to process queued event %r: %r', delivery.event, ex)
+        await self._queue.ack(delivery)
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
@@ -2,12 +2,27 @@ from __future__ import annotations
 
 import abc
 import asyncio
+import contextlib
+import functools
+import hashlib
 import inspect
 import logging
 from copy import deepcopy
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Union, cast
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
 
 from glQiwiApi.utils.date_conversion import localize_datetime_according_to_moscow_timezone
 
@@ -20,19 +35,34 @@ from aiohttp import web
 from aiohttp.web import _run_app  # noqa
 
 from glQiwiApi import QiwiWrapper
+from glQiwiApi.core.event_fetching.checkpoints import (
+    BaseCheckpointStorage,
+    Checkpoint,
+    CheckpointWriter,
+)
 from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher
+from glQiwiApi.core.event_fetching.event_queue import BaseEventQueue, EventQueueConsumer
+from glQiwiApi.core.event_fetching.in_flight import DEFAULT_DRAIN_TIMEOUT, InFlightTracker
+from glQiwiApi.core.event_fetching.polling_interval import AdaptivePollingInterval
 from glQiwiApi.core.event_fetching.webhooks.app import configure_app
 from glQiwiApi.core.event_fetching.webhooks.config import WebhookConfig
+from glQiwiApi.core.event_fetching.webhooks.services.collision_detector import (
+    AbstractCollisionDetector,
+    WindowedCollisionDetector,
+)
+from glQiwiApi.core.event_fetching.worker_pool import DEFAULT_QUEUE_SIZE, WorkerPool
 from glQiwiApi.ext.webhook_url import WebhookURL
 from glQiwiApi.qiwi.clients.wallet.client import QiwiWallet
 from glQiwiApi.qiwi.clients.wallet.methods.history import MAX_HISTORY_LIMIT
-from glQiwiApi.qiwi.clients.wallet.types import History
+from glQiwiApi.qiwi.clients.wallet.types import History, Transaction
+from glQiwiApi.utils.pagination import DEFAULT_READ_AHEAD, iterate_pages
 from glQiwiApi.utils.synchronous import adapter
 
 logger = logging.getLogger('glQiwiApi.executor')
 
 TIMEOUT_IF_EXCEPTION = 40
 DEFAULT_TIMEOUT = 5
+DEFAULT_MAX_TIMEOUT = TIMEOUT_IF_EXCEPTION
 WALLET_CTX_KEY = 'wallet'
 
 
@@ -79,10 +109,24 @@ class ExecutorEvent:
         return len(self._handlers)
 
     async def fire(self) -> None:
+        """
+        Call all handlers one after another, failure of one handler doesn't prevent
+        others from being called, the first error is raised when all handlers are done
+        """
+        errors: List[Exception] = []
         for handler_spec in self._handlers:
-            if handler_spec.is_awaitable:
-                return await handler_spec.handler_fn(self.context)  # type: ignore
-            await self._loop.run_in_executor(None, handler_spec.handler_fn, self.context)
+            try:
+                if handler_spec.is_awaitable:
+                    await handler_spec.handler_fn(self.context)
+                else:
+                    await self._loop.run_in_executor(None, handler_spec.handler_fn, self.context)
+            except Exception as ex:
+                logger.exception(
+                    'Handler %r of executor event has failed', handler_spec.handler_fn
+                )
+                errors.append(ex)
+        if errors:
+            raise errors[0]
 
 
 def start_webhook(
@@ -93,6 +137,7 @@ def start_webhook(
     on_shutdown: Optional[_EventHandlerType] = None,
     loop: Optional[asyncio.AbstractEventLoop] = None,
     context: Union[Dict[str, Any], HandlerContext, None] = None,
+    collision_detector: Optional[AbstractCollisionDetector[Any]] = None,
 ) -> None:
     """
     Blocking function that listens for webhooks.
@@ -105,6 +150,8 @@ def start_webhook(
     :param webhook_config:
     :param loop:
     :param context: context, that could be transmitted to handlers
+    :param collision_detector: detector of already processed events,
+     `WindowedCollisionDetector` by default
     """
     if context is None:
         context = {}
@@ -115,6 +162,7 @@ def start_webhook(
         on_startup=on_startup,
         loop=loop,
         context=HandlerContext(context),
+        collision_detector=collision_detector,
     )
     executor.start_webhook(config=webhook_config)
 
@@ -128,6 +176,7 @@ def start_polling(
     on_shutdown: Optional[_EventHandlerType] = None,
     loop: Optional[asyncio.AbstractEventLoop] = None,
     context: Union[Dict[str, Any], HandlerContext, None] = None,
+    max_timeout_in_seconds: float = DEFAULT_MAX_TIMEOUT,
 ) -> None:
     """
     Setup for long-polling mode. Support only `glQiwiApi.types.Transaction` as event.
@@ -137,6 +186,8 @@ def start_polling(
     :param skip_updates:
     :param timeout_in_seconds: timeout of polling in seconds, if the timeout is too small,
          the API can throw an exception
+    :param max_timeout_in_seconds: timeout, that polling backs off to when there are no new
+         transactions or API answers with errors
     :param on_startup: function or coroutine,
          which will be executed on startup
     :param on_shutdown: function or coroutine,
@@ -150,6 +201,7 @@ def start_polling(
         wallet,
         dispatcher,
         timeout=timeout_in_seconds,
+        max_timeout=max_timeout_in_seconds,
         skip_updates=skip_updates,
         on_startup=on_startup,
         on_shutdown=on_shutdown,
@@ -168,6 +220,7 @@ async def start_non_blocking_qiwi_api_polling(
     on_shutdown: Optional[_EventHandlerType] = None,
     loop: Optional[asyncio.AbstractEventLoop] = None,
     context: Union[Dict[str, Any], HandlerContext, None] = None,
+    max_timeout_in_seconds: float = DEFAULT_MAX_TIMEOUT,
 ) -> asyncio.Task:
     if context is None:
         context = {}
@@ -175,6 +228,7 @@ async def start_non_blocking_qiwi_api_polling(
         wallet,
         dispatcher,
         timeout=timeout_in_seconds,
+        max_timeout=max_timeout_in_seconds,
         skip_updates=skip_updates,
         on_startup=on_startup,
         on_shutdown=on_shutdown,
@@ -189,8 +243,11 @@ def configure_app_for_qiwi_webhooks(
     dispatcher: BaseDispatcher,
     app: web.Application,
     cfg: WebhookConfig,
+    collision_detector: Optional[AbstractCollisionDetector[Any]] = None,
 ) -> web.Application:
-    executor = WebhookExecutor(wallet, dispatcher, context=HandlerContext({}))
+    executor = WebhookExecutor(
+        wallet, dispatcher, context=HandlerContext({}), collision_detector=collision_detector
+    )
     return executor.add_routes_for_webhook(app, cfg)
 
 
@@ -269,7 +326,42 @@ class PollingExecutor(BaseExecutor):
         skip_updates: bool = False,
         on_startup: Optional[_EventHandlerType] = None,
         on_shutdown: Optional[_EventHandlerType] = None,
+        max_timeout: Union[float, int] = DEFAULT_MAX_TIMEOUT,
+        polling_interval: Optional[AdaptivePollingInterval] = None,
+        history_read_ahead: int = DEFAULT_READ_AHEAD,
+        checkpoint_storage: Optional[BaseCheckpointStorage] = None,
+        checkpoint_key: Optional[str] = None,
+        workers: Optional[int] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        ordering_key: Optional[Callable[[Transaction], Hashable]] = None,
+        drain_timeout: Optional[float] = DEFAULT_DRAIN_TIMEOUT,
+        event_queue: Optional[BaseEventQueue] = None,
     ) -> None:
+        """
+        :param timeout: interval between requests while new transactions keep arriving
+        :param max_timeout: interval that polling backs off to when idle or on errors,
+         pass on the same value as `timeout` to poll with fixed interval
+        :param polling_interval: custom scheduler of intervals, overrides `timeout`
+         and `max_timeout`
+        :param history_read_ahead: number of history pages, that can be fetched in background
+         while executor handles burst of more than `MAX_HISTORY_LIMIT` transactions
+        :param checkpoint_storage: storage of last processed transaction, if it's passed on,
+         polling resumes from the saved position after restart
+        :param checkpoint_key: key of the wallet in checkpoint storage,
+         by default it's derived from API token
+        :param workers: if it's passed on, transactions are handled by fixed number of workers
+         instead of one task per transaction
+        :param queue_size: number of transactions, that can wait for a free worker,
+         when queue is full fetching is paused
+        :param ordering_key: function, that returns key of transaction
+         (e.g. ``lambda txn: txn.account``), transactions with the same key are handled
+         one after another in order of date, requires `workers`
+        :param drain_timeout: how long to wait for handlers, that are in progress, on shutdown,
+         handlers that don't finish in time are cancelled, None means to wait forever
+        :param event_queue: if it's passed on, fetched transactions are put into the queue
+         and handled by its consumers in background, so polling isn't slowed down by handlers,
+         `workers` is number of consumers then
+        """
         super(PollingExecutor, self).__init__(
             dispatcher,
             loop=loop,
@@ -279,88 +371,282 @@ class PollingExecutor(BaseExecutor):
         )
         self.offset: Optional[int] = None
         self.get_updates_from = localize_datetime_according_to_moscow_timezone(datetime.now())
-        self._timeout = _parse_timeout(timeout)
+        if polling_interval is None:
+            min_timeout = _parse_timeout(timeout)
+            polling_interval = AdaptivePollingInterval(
+                min_interval=min_timeout,
+                max_interval=max(_parse_timeout(max_timeout), min_timeout),
+            )
+        self._polling_interval = polling_interval
+        self._history_read_ahead = history_read_ahead
+        self._checkpoint_writer: Optional[CheckpointWriter] = None
+        if checkpoint_storage is not None:
+            self._checkpoint_writer = CheckpointWriter(checkpoint_storage)
+        self._checkpoint_key = checkpoint_key or _default_checkpoint_key(wallet)
+        if ordering_key is not None and workers is None:
+            raise ValueError('ordering_key can be used only with fixed number of workers')
+        if ordering_key is not None and event_queue is not None:
+            raise ValueError('ordering_key can not be used with event queue')
+        self._worker_pool: Optional[WorkerPool] = None
+        self._event_queue = event_queue
+        self._queue_consumer: Optional[EventQueueConsumer] = None
+        if event_queue is not None:
+            self._queue_consumer = EventQueueConsumer(
+                event_queue,
+                dispatcher,
+                self._context,
+                concurrency=workers or 1,
+                drain_timeout=drain_timeout,
+            )
+        elif workers is not None:
+            self._worker_pool = WorkerPool(workers, queue_size)
+        self._ordering_key = ordering_key
+        self._drain_timeout = drain_timeout
+        self._in_flight: InFlightTracker[Transaction] = InFlightTracker()
+        self._polling_task: Optional[asyncio.Task[None]] = None
+        self._abandoned_transactions: List[Transaction] = []
         self.skip_updates = skip_updates
         self._wallet = wallet
 
         self._context[WALLET_CTX_KEY] = self._wallet
 
     def start_polling(self) -> None:
+        self.loop.create_task(self._run_infinite_polling())
         try:
-            self.loop.create_task(self._run_infinite_polling())
-            adapter.run_forever_safe(self.loop)
+            adapter.run_forever_safe(self.loop, callback=self.stop)
         except (SystemExit, KeyboardInterrupt):  # pragma: no cover
             # allow graceful shutdown
-            pass
+            adapter.safe_cancel(self.loop, callback=self.stop)
 
     async def start_non_blocking_polling(self) -> asyncio.Task:
         return asyncio.create_task(self._run_infinite_polling())
 
-    async def _run_infinite_polling(self) -> None:
-        default_timeout = self._timeout
+    async def stop(self) -> List[Transaction]:
+        """
+        Stop fetching new transactions, wait for handlers, that are in progress,
+        at most `drain_timeout` seconds and call shutdown hooks
+
+        :return: transactions, whose handling was abandoned
+        """
+        if self._polling_task is not None and not self._polling_task.done():
+            self._polling_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._polling_task
+        return self._abandoned_transactions
 
+    async def _run_infinite_polling(self) -> None:
+        self._polling_task = asyncio.current_task()
         try:
+            await self._restore_checkpoint()
+            if self._checkpoint_writer is not None:
+                self._checkpoint_writer.start()
+            if self._queue_consumer is not None:
+                self._queue_consumer.start()
             await self.welcome()
             while True:
                 try:
-                    await self._try_fetch_new_updates()
-                    self._set_timeout(default_timeout)
+                    new_updates_count = await self._try_fetch_new_updates()
+                    self._polling_interval.on_updates(new_updates_count)
+                    delay = self._polling_interval.next_delay()
                 except Exception as ex:
-                    self._set_timeout(TIMEOUT_IF_EXCEPTION)
-                    logger.error('Handle !r. Sleeping %s seconds', ex, self._timeout)
-                await asyncio.sleep(self._timeout)
+                    self._polling_interval.on_error(ex)
+                    delay = self._polling_interval.next_delay()
+                    logger.error('Handle %r. Sleeping %.2f seconds', ex, delay)
+                await asyncio.sleep(delay)
         finally:
-            await asyncio.shield(asyncio.gather(self.goodbye(), self._wallet.close()))
+            await asyncio.shield(self._close())
+
+    async def _close(self) -> None:
+        await self._drain_in_flight()
+        await asyncio.gather(
+            self.goodbye(),
+            self._wallet.close(),
+            self._close_checkpoints(),
+            self._close_worker_pool(),
+            self._close_event_queue(),
+        )
 
-    async def _try_fetch_new_updates(self) -> None:
+    async def _drain_in_flight(self) -> None:
+        if self._queue_consumer is not None:
+            event_queue = cast(BaseEventQueue, self._event_queue)
+            # checkpoint is moved as soon as transactions are put into the queue,
+            # so abandoned ones are delivered again after restart only by durable queue
+            self._abandoned_transactions = await self._queue_consumer.close()
+            if event_queue.is_durable or not (self._abandoned_transactions or len(event_queue)):
+                self._record_checkpoint()
+            elif self._checkpoint_writer is not None:
+                # checkpoint, that was saved before, is kept, so at least transactions,
+                # that were fetched after it, are fetched again after restart
+                self._checkpoint_writer.discard(self._checkpoint_key)
+            return None
+        if self._in_flight:
+            logger.info('Waiting for %d transactions to be handled', len(self._in_flight))
+        self._abandoned_transactions = await self._in_flight.drain(self._drain_timeout)
+        if self._abandoned_transactions:
+            # checkpoint isn't moved, so abandoned transactions are fetched again after restart
+            logger.warning(
+                'Handling of %d transactions was abandoned on shutdown: %s',
+                len(self._abandoned_transactions),
+                ', '.join(str(txn.id) for txn in self._abandoned_transactions),
+            )
+        else:
+            self._record_checkpoint()
+
+    async def _restore_checkpoint(self) -> None:
+        if self._checkpoint_writer is None:
+            return None
+        checkpoint = await self._checkpoint_writer.load(self._checkpoint_key)
+        if checkpoint is None:
+            return None
+        logger.info(
+            'Resume polling from transaction %d (%s)', checkpoint.offset, checkpoint.updates_from
+        )
+        self.offset = checkpoint.offset
+        self.get_updates_from = checkpoint.updates_from
+
+    def _record_checkpoint(self) -> None:
+        if self._checkpoint_writer is None or self.offset is None:
+            return None
+        self._checkpoint_writer.record(
+            self._checkpoint_key, Checkpoint(self.offset, self.get_updates_from)
+        )
+
+    async def _close_checkpoints(self) -> None:
+        if self._checkpoint_writer is not None:
+            await self._checkpoint_writer.close()
+
+    async def _close_worker_pool(self) -> None:
+        if self._worker_pool is not None:
+            await self._worker_pool.close(drain=False)
+
+    async def _close_event_queue(self) -> None:
+        if self._event_queue is not None:
+            await self._event_queue.close()
+
+    async def _try_fetch_new_updates(self) -> int:
+        """Returns count of new transactions, that were dispatched"""
         try:
             history = await self._fetch_history()
         except _NoUpdatesToExecute:
-            return None
+            return 0
+        return await self._process_history(history)
+
+    async def _process_history(self, history: History) -> int:
         if self.offset is None:
             first_update = history[0]
             self.offset = first_update.id - 1
         logger.debug('Current transaction offset is %d', self.offset)
+        new_updates_count = sum(1 for event in history if self.offset < event.id)
         await self.process_updates(history)
+        # checkpoint is recorded only when all handlers are done, so nothing is lost on crash
+        self._record_checkpoint()
+        return new_updates_count
 
     async def _fetch_history(self) -> History:
+        """
+        Fetch all transactions since `get_updates_from` following next_txn_id/next_txn_date
+        cursors, so bursts of more than `MAX_HISTORY_LIMIT` transactions are fetched
+        in one tick. Then window start is moved to the latest transaction,
+        so next tick doesn't download the same transactions again.
+        """
         end_date = localize_datetime_according_to_moscow_timezone(datetime.now())
-        if isinstance(self._wallet, QiwiWallet):
-            history = (
-                await self._wallet.history(start_date=self.get_updates_from, end_date=end_date)
-            ).sorted_by_date()
-        else:
-            history = (
-                await self._wallet.transactions(
-                    start_date=self.get_updates_from, end_date=end_date
-                )
-            ).sorted_by_date()
-
-        if len(history) == MAX_HISTORY_LIMIT:
-            logger.debug('History is out of max history transaction limit')
-            first_txn_by_date = history[-1]
-            self.get_updates_from = first_txn_by_date.date
+        transactions: Dict[int, Transaction] = {}
+        async for page in iterate_pages(
+            functools.partial(self._fetch_history_page, end_date=end_date),
+            read_ahead=self._history_read_ahead,
+        ):
+            for txn in page:
+                transactions[txn.id] = txn
+
+        history = History(data=list(transactions.values())).sorted_by_date()
+        if history:
+            self.get_updates_from = history[-1].date
 
         if self.skip_updates:
             self.skip_updates = False
+            if history:
+                self.offset = history.sorted_by_id().last().id
+                self._record_checkpoint()
             raise _NoUpdatesToExecute()
         elif not history:
             raise _NoUpdatesToExecute()
 
         return history
 
+    async def _fetch_history_page(
+        self, cursor: Optional[Tuple[int, datetime]], end_date: datetime
+    ) -> Tuple[List[Transaction], Optional[Tuple[int, datetime]]]:
+        next_txn_id, next_txn_date = cursor or (None, None)
+        if isinstance(self._wallet, QiwiWallet):
+            history = await self._wallet.history(
+                rows=MAX_HISTORY_LIMIT,
+                start_date=self.get_updates_from,
+                end_date=end_date,
+                next_txn_id=next_txn_id,
+                next_txn_date=next_txn_date,
+            )
+        else:
+            history = await self._wallet.transactions(
+                rows=MAX_HISTORY_LIMIT,
+                start_date=self.get_updates_from,
+                end_date=end_date,
+                next_txn_id=next_txn_id,
+                next_txn_date=next_txn_date,
+            )
+
+        has_next_page = len(history) == MAX_HISTORY_LIMIT and None not in (
+            history.next_transaction_id,
+            history.next_transaction_date,
+        )
+        if not has_next_page:
+            return history.transactions, None
+        logger.debug('History is out of max history transaction limit, fetching next page')
+        return history.transactions, (
+            cast(int, history.next_transaction_id),
+            cast(datetime, history.next_transaction_date),
+        )
+
     async def process_updates(self, history: History) -> None:
-        tasks: List[asyncio.Task[None]] = [
-            asyncio.create_task(self._dispatcher.process_event(event, self._context))
+        if self._event_queue is not None:
+            return await self._put_updates_into_queue(history)
+        if self._worker_pool is not None:
+            return await self._process_updates_by_workers(history)
+
+        tasks: List[asyncio.Future[Any]] = [
+            self._in_flight.add(
+                asyncio.create_task(self._dispatcher.process_event(event, self._context)), event
+            )
             for event in history
             if cast(int, self.offset) < event.id
         ]
         if history:
             self.offset = history.sorted_by_id().last().id
-        await asyncio.gather(*tasks)
+        await _wait_for_handlers(tasks)
 
-    def _set_timeout(self, exception_timeout: Union[int, float]) -> None:
-        self._timeout = exception_timeout
+    async def _process_updates_by_workers(self, history: History) -> None:
+        worker_pool = cast(WorkerPool, self._worker_pool)
+        events = [event for event in history if cast(int, self.offset) < event.id]
+        if history:
+            self.offset = history.sorted_by_id().last().id
+
+        results: List[asyncio.Future[Any]] = []
+        for event in events:
+            key = self._ordering_key(event) if self._ordering_key is not None else None
+            # waits while queue is full, so the next tick can't start until workers catch up
+            result = await worker_pool.submit(
+                functools.partial(self._dispatcher.process_event, event, self._context), key
+            )
+            results.append(self._in_flight.add(result, event))
+        await _wait_for_handlers(results)
+
+    async def _put_updates_into_queue(self, history: History) -> None:
+        event_queue = cast(BaseEventQueue, self._event_queue)
+        for event in history:
+            if cast(int, self.offset) < event.id:
+                # waits while queue is full, so fetching is paused until consumers catch up
+                await event_queue.put(event)
+        if history:
+            self.offset = history.sorted_by_id().last().id
 
     async def _shutdown(self) -> None:
         await asyncio.gather(super()._shutdown(), self._wallet.close())
@@ -375,7 +661,15 @@ class WebhookExecutor(BaseExecutor):
         on_startup: Optional[_EventHandlerType] = None,
         on_shutdown: Optional[_EventHandlerType] = None,
         loop: Optional[asyncio.AbstractEventLoop] = None,
+        event_queue: Optional[BaseEventQueue] = None,
+        collision_detector: Optional[AbstractCollisionDetector[Any]] = None,
     ):
+        """
+        :param event_queue: queue of events, that are handled in background,
+         e.g. `SQLiteEventQueue`, so QIWI gets response without waiting for handlers
+        :param collision_detector: detector of already processed events,
+         `WindowedCollisionDetector`, that remembers events for a day, by default
+        """
         super().__init__(
             dispatcher,
             on_startup=on_startup,
@@ -385,6 +679,10 @@ class WebhookExecutor(BaseExecutor):
         )
         self._application = web.Application(loop=self.loop)
         self._wallet = wallet
+        self._event_queue = event_queue
+        if collision_detector is None:
+            collision_detector = WindowedCollisionDetector()
+        self._collision_detector = collision_detector
 
         self._context[WALLET_CTX_KEY] = self._wallet
 
@@ -395,11 +693,7 @@ class WebhookExecutor(BaseExecutor):
             self._supplement_configuration(config)
         )
         try:
-            return configure_app(
-                dispatcher=self._dispatcher,
-                app=app,
-                webhook_config=supplemented_configuration,
-            )
+            return self._configure_app(app, supplemented_configuration)
         finally:
             self.loop.run_until_complete(self._wallet.close())
 
@@ -408,11 +702,7 @@ class WebhookExecutor(BaseExecutor):
             self._supplement_configuration(config)
         )
 
-        self._application = configure_app(
-            dispatcher=self._dispatcher,
-            app=self._application,
-            webhook_config=supplemented_configuration,
-        )
+        self._application = self._configure_app(self._application, supplemented_configuration)
 
         try:
             self.loop.run_until_complete(self.welcome())
@@ -429,6 +719,15 @@ class WebhookExecutor(BaseExecutor):
         finally:
             self.loop.run_until_complete(self.goodbye())
 
+    def _configure_app(self, app: web.Application, config: WebhookConfig) -> web.Application:
+        return configure_app(
+            dispatcher=self._dispatcher,
+            app=app,
+            webhook_config=config,
+            collision_detector=self._collision_detector,
+            event_queue=self._event_queue,
+        )
+
     async def _supplement_configuration(self, config: WebhookConfig) -> WebhookConfig:
         config = deepcopy(config)
         if config.app.base_app is not None:
@@ -464,6 +763,25 @@ class WebhookExecutor(BaseExecutor):
             config.encryption.base64_encryption_key = base64_encryption_key
 
 
+async def _wait_for_handlers(futures: List[asyncio.Future[Any]]) -> None:
+    """
+    Unlike `asyncio.gather`, doesn't cancel handlers when polling is cancelled,
+    so they can be drained on shutdown
+    """
+    if not futures:
+        return None
+    await asyncio.wait(futures)
+    for future in futures:
+        future.result()
+
+
+def _default_checkpoint_key(wallet: Union[QiwiWallet, QiwiWrapper]) -> str:
+    if isinstance(wallet, QiwiWrapper):
+        wallet = wallet._qiwi_wallet
+    # token itself must not be stored on disk
+    return hashlib.sha256(wallet._api_access_token.encode('utf-8')).hexdigest()[:32]
+
+
 def _parse_timeout(timeout: Union[float, int]) -> float:  # pragma: no cover
     if isinstance(timeout, float):
         return timeout
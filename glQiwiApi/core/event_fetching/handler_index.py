@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import bisect
+import itertools
+import math
+from typing import Any, Callable, Dict, Generic, Hashable, List, Optional, Sequence, Tuple, TypeVar
+
+from glQiwiApi.core.event_fetching.filters import BaseFilter, EqualsFilter, RangeFilter
+
+H = TypeVar('H', bound=Hashable)
+
+
+class HandlerIndex(Generic[H]):
+    """
+    Finds handlers, that can match event, without checking all of them.
+
+    Handler with `EqualsFilter` is put into hash table of its attribute,
+    handler with `RangeFilter` is put into sorted list of intervals of its attribute,
+    other handlers are candidates for every event.
+    Candidates are returned in order of registration, so handlers
+    take precedence the same way as without index.
+    """
+
+    def __init__(self) -> None:
+        self._positions: Dict[H, int] = {}
+        self._counter = itertools.count()
+        self._unindexed: List[H] = []
+        self._equality: Dict[str, Dict[Hashable, List[H]]] = {}
+        self._ranges: Dict[str, _IntervalIndex[H]] = {}
+        self._getters: Dict[str, Callable[[Any], Any]] = {}
+
+    @property
+    def is_indexed(self) -> bool:
+        return bool(self._equality or self._ranges)
+
+    def add(self, handler: H, filters: Sequence[BaseFilter[Any]]) -> None:
+        position = next(self._counter)
+        self._positions[handler] = position
+        index_filter = _find_index_filter(filters)
+        if isinstance(index_filter, EqualsFilter):
+            self._getters.setdefault(index_filter.path, index_filter.get_value)
+            buckets = self._equality.setdefault(index_filter.path, {})
+            buckets.setdefault(index_filter.value, []).append(handler)
+        elif isinstance(index_filter, RangeFilter):
+            self._getters.setdefault(index_filter.path, index_filter.get_value)
+            intervals = self._ranges.setdefault(index_filter.path, _IntervalIndex())
+            intervals.add(index_filter.min_value, index_filter.max_value, position, handler)
+        else:
+            self._unindexed.append(handler)
+
+    def remove(self, handler: H, filters: Sequence[BaseFilter[Any]]) -> None:
+        position = self._positions.pop(handler)
+        index_filter = _find_index_filter(filters)
+        if isinstance(index_filter, EqualsFilter):
+            buckets = self._equality[index_filter.path]
+            bucket = buckets[index_filter.value]
+            bucket.remove(handler)
+            if not bucket:
+                del buckets[index_filter.value]
+            if not buckets:
+                del self._equality[index_filter.path]
+        elif isinstance(index_filter, RangeFilter):
+            intervals = self._ranges[index_filter.path]
+            intervals.remove(index_filter.min_value, position)
+            if not intervals:
+                del self._ranges[index_filter.path]
+        else:
+            self._unindexed.remove(handler)
+
+    def candidates(self, event: Any) -> List[H]:
+        if not self.is_indexed:
+            return self._unindexed
+
+        candidates = list(self._unindexed)
+        for path, buckets in self._equality.items():
+            try:
+                candidates.extend(buckets.get(self._getters[path](event), ()))
+            except (AttributeError, TypeError):  # no attribute or unhashable value
+                continue
+        for path, intervals in self._ranges.items():
+            try:
+                candidates.extend(intervals.find(self._getters[path](event)))
+            except (AttributeError, TypeError):  # no attribute or incomparable value
+                continue
+        candidates.sort(key=self._positions.__getitem__)
+        return candidates
+
+
+class _IntervalIndex(Generic[H]):
+    """
+    Intervals sorted by start with segment tree of maximum ends over them.
+    Intervals, that can contain a point, start not after it and are found by binary search,
+    then the tree leads only to those of them, that end not before the point,
+    so one wide interval doesn't make search walk through all intervals after it.
+    """
+
+    def __init__(self) -> None:
+        self._intervals: List[Tuple[Any, int, Any, H]] = []
+        # implicit binary tree: root is 1, children of node are 2 * node and 2 * node + 1,
+        # leaves are intervals, empty leaves and subtrees are None
+        self._max_ends: Optional[List[Any]] = None
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def add(self, start: Any, end: Any, position: int, handler: H) -> None:
+        bisect.insort(self._intervals, (start, position, end, handler))
+        self._max_ends = None
+
+    def remove(self, start: Any, position: int) -> None:
+        index = bisect.bisect_left(self._intervals, (start, position))
+        del self._intervals[index]
+        self._max_ends = None
+
+    def find(self, point: Any) -> List[H]:
+        if self._max_ends is None:
+            self._max_ends = self._build_tree()
+        max_ends = self._max_ends
+        leaves = len(max_ends) // 2
+        last = bisect.bisect_right(self._intervals, (point, math.inf)) - 1
+        found: List[H] = []
+        # node and range [low, high) of intervals, that it covers
+        stack = [(1, 0, leaves)]
+        while stack:
+            node, low, high = stack.pop()
+            max_end = max_ends[node]
+            if low > last or max_end is None or max_end < point:
+                continue
+            if node >= leaves:
+                found.append(self._intervals[low][3])
+                continue
+            middle = (low + high) // 2
+            stack.append((2 * node + 1, middle, high))
+            stack.append((2 * node, low, middle))
+        return found
+
+    def _build_tree(self) -> List[Any]:
+        leaves = 1
+        while leaves < len(self._intervals):
+            leaves *= 2
+        max_ends: List[Any] = [None] * (2 * leaves)
+        for index, (_, _, end, _) in enumerate(self._intervals):
+            max_ends[leaves + index] = end
+        for node in range(leaves - 1, 0, -1):
+            left, right = max_ends[2 * node], max_ends[2 * node + 1]
+            max_ends[node] = (
+                left if right is None or (left is not None and left >= right) else right
+            )
+        return max_ends
+
+
+def _find_index_filter(filters: Sequence[BaseFilter[Any]]) -> Optional[BaseFilter[Any]]:
+    # all filters of handler must pass, so any of declarative filters can be used as a key,
+    # equality is preferred, because hash lookup is cheaper than binary search
+    ranges = (f for f in filters if isinstance(f, RangeFilter))
+    for filter_ in filters:
+        if isinstance(filter_, EqualsFilter) and _is_hashable(filter_.value):
+            return filter_
+    return next(ranges, None)
+
+
+def _is_hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from typing import Any, AsyncIterator, List, Optional, Union, cast
+
+from aiohttp import web
+
+from glQiwiApi import QiwiWrapper
+from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher
+from glQiwiApi.core.event_fetching.event_queue import BaseEventQueue
+from glQiwiApi.core.event_fetching.executor import (
+    HandlerContext,
+    PollingExecutor,
+    WebhookExecutor,
+    _EventHandlerType,
+)
+from glQiwiApi.core.event_fetching.webhooks.config import WebhookConfig
+from glQiwiApi.core.event_fetching.webhooks.services.collision_detector import (
+    AbstractCollisionDetector,
+    WindowedCollisionDetector,
+)
+from glQiwiApi.qiwi.clients.wallet.client import QiwiWallet
+from glQiwiApi.qiwi.clients.wallet.types import History, Transaction
+
+logger = logging.getLogger('glQiwiApi.executor')
+
+DEFAULT_RECONCILIATION_INTERVAL = 300.0
+
+
+class ReconciliationPollingExecutor(PollingExecutor):
+    """
+    Polling executor, that dispatches only transactions,
+    which weren't processed yet according to shared collision detector
+    """
+
+    def __init__(
+        self,
+        *args: Any,
+        collision_detector: AbstractCollisionDetector[Any],
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self._collision_detector = collision_detector
+
+    async def process_updates(self, history: History) -> None:
+        offset = self.offset
+        missed_transactions: List[Transaction] = []
+        for txn in history:
+            if offset is not None and txn.id <= offset:
+                continue
+            if self._collision_detector.has_collision(txn):
+                continue
+            self._collision_detector.add_already_processed_event(txn)
+            missed_transactions.append(txn)
+
+        if missed_transactions:
+            logger.info(
+                'Reconciliation found %d transactions, that were not delivered by webhook',
+                len(missed_transactions),
+            )
+        await super().process_updates(
+            history.copy(exclude={'transactions'}, update={'transactions': missed_transactions})
+        )
+        if history:
+            self.offset = max(cast(int, self.offset), history.sorted_by_id().last().id)
+
+
+class HybridExecutor(WebhookExecutor):
+    """
+    Receives transactions by webhooks and rarely polls history to find transactions,
+    which QIWI failed to deliver. Both sources share one collision detector,
+    so every transaction is dispatched only once.
+    """
+
+    def __init__(
+        self,
+        wallet: Union[QiwiWallet, QiwiWrapper],
+        dispatcher: BaseDispatcher,
+        context: HandlerContext,
+        reconciliation_interval: float = DEFAULT_RECONCILIATION_INTERVAL,
+        collision_detector: Optional[AbstractCollisionDetector[Any]] = None,
+        on_startup: Optional[_EventHandlerType] = None,
+        on_shutdown: Optional[_EventHandlerType] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        event_queue: Optional[BaseEventQueue] = None,
+    ) -> None:
+        """
+        :param reconciliation_interval: interval between requests of history in seconds
+        :param collision_detector: detector, that can tell transaction webhook
+         and transaction of the same payment apart from others,
+         `WindowedCollisionDetector`, that remembers transactions for a day, by default
+        :param event_queue: queue of webhook events, that are handled in background
+        """
+        if collision_detector is None:
+            # the same detector is shared by webhook views and reconciliation
+            collision_detector = WindowedCollisionDetector()
+        super().__init__(
+            wallet,
+            dispatcher,
+            context,
+            on_startup=on_startup,
+            on_shutdown=on_shutdown,
+            loop=loop,
+            event_queue=event_queue,
+            collision_detector=collision_detector,
+        )
+        self._reconciliation_executor = ReconciliationPollingExecutor(
+            wallet,
+            dispatcher,
+            context=self._context,
+            loop=loop,
+            timeout=reconciliation_interval,
+            max_timeout=reconciliation_interval,
+            collision_detector=collision_detector,
+        )
+        self._reconciliation_task: Optional[asyncio.Task[None]] = None
+
+    def _configure_app(self, app: web.Application, config: WebhookConfig) -> web.Application:
+        app = super()._configure_app(app, config)
+        app.cleanup_ctx.append(self._run_reconciliation)
+        return app
+
+    async def _run_reconciliation(self, _: web.Application) -> AsyncIterator[None]:
+        # polling runs while application is running and is stopped on cleanup
+        self._reconciliation_task = asyncio.create_task(
+            self._reconciliation_executor._run_infinite_polling()
+        )
+        yield
+        self._reconciliation_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._reconciliation_task
+        self._reconciliation_task = None
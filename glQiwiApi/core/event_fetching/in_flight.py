@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Dict, Generic, List, Optional, TypeVar
+
+Event = TypeVar('Event')
+
+DEFAULT_DRAIN_TIMEOUT = 10.0
+
+
+class InFlightTracker(Generic[Event]):
+    """
+    Keeps futures of events, that are being handled, so on shutdown
+    executor can wait for them instead of cutting handlers off.
+    """
+
+    def __init__(self) -> None:
+        self._futures: Dict[asyncio.Future[Any], Event] = {}
+
+    def __len__(self) -> int:
+        return len(self._futures)
+
+    def add(self, future: asyncio.Future[Any], event: Event) -> asyncio.Future[Any]:
+        self._futures[future] = event
+        future.add_done_callback(self._discard)
+        return future
+
+    async def drain(self, timeout: Optional[float]) -> List[Event]:
+        """
+        Wait until all tracked events are handled, events that aren't handled
+        in time are cancelled
+
+        :param timeout: deadline in seconds, None means to wait forever
+        :return: events, that were abandoned
+        """
+        if not self._futures:
+            return []
+        in_flight = list(self._futures.items())
+        _, pending = await asyncio.wait([future for future, _ in in_flight], timeout=timeout)
+        for future in pending:
+            future.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        return [event for future, event in in_flight if future in pending]
+
+    def _discard(self, future: asyncio.Future[Any]) -> None:
+        if future in self._futures:
+            del self._futures[future]
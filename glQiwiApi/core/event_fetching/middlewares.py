@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import functools
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher  # pragma: no cover
+
+logger = logging.getLogger('glQiwiApi.dispatcher')
+
+NextHandler = Callable[..., Awaitable[Any]]
+# middleware receives the next handler of the chain, event and arguments of handlers,
+# it must await `handler(event, *args)` to pass on event further
+Middleware = Callable[..., Awaitable[Any]]
+
+_versions = itertools.count()
+
+
+class MiddlewareManager:
+    """
+    Ordered chain of middlewares. The first registered middleware is the outermost one.
+    Chain is composed once after each change, not for every event.
+    """
+
+    def __init__(self) -> None:
+        self._middlewares: List[Middleware] = []
+        # globally unique, so composed chain can be validated by one comparison
+        self.version = next(_versions)
+
+    def register(self, middleware: Middleware) -> Middleware:
+        self._middlewares.append(middleware)
+        self.version = next(_versions)
+        return middleware
+
+    def unregister(self, middleware: Middleware) -> None:
+        self._middlewares.remove(middleware)
+        self.version = next(_versions)
+
+    def __call__(self, middleware: Middleware) -> Middleware:
+        """Allows to register middleware by decorator"""
+        return self.register(middleware)
+
+    def __iter__(self) -> Iterator[Middleware]:
+        return iter(self._middlewares)
+
+    def __len__(self) -> int:
+        return len(self._middlewares)
+
+    def wrap(self, handler: NextHandler) -> NextHandler:
+        for middleware in reversed(self._middlewares):
+            handler = functools.partial(middleware, handler)
+        return handler
+
+
+@dataclass
+class DispatchTrace:
+    """Timestamps of event, that is being dispatched, filled by dispatcher"""
+
+    received_at: float
+    filter_time: float = 0.0
+    handler: Any = None
+
+
+# is set only while TimingMiddleware is enabled, otherwise dispatcher doesn't measure anything
+current_trace: ContextVar[Optional[DispatchTrace]] = ContextVar('current_trace', default=None)
+
+
+@dataclass(frozen=True)
+class HandlerTiming:
+    """
+    :param handler: function or class, that has handled event
+    :param queue_wait: time between receiving of event by dispatcher and start of handler,
+     excluding filters, e.g. time spent in outer middlewares or waiting for other handlers
+    :param filter_time: time spent in filters, including filters of handlers, that were rejected
+    :param handler_time: time spent in handler and inner middlewares registered after timing
+    """
+
+    handler: Any
+    queue_wait: float
+    filter_time: float
+    handler_time: float
+
+
+class TimingMiddleware:
+    """
+    Measures where latency of dispatching goes.
+    Timing of every executed handler is passed on to `on_timing`, by default it's logged.
+
+    >>> TimingMiddleware(on_timing=metrics.observe).setup(dp)
+    """
+
+    def __init__(self, on_timing: Optional[Callable[[HandlerTiming], Any]] = None) -> None:
+        self._on_timing = on_timing or _log_timing
+
+    def setup(self, dispatcher: BaseDispatcher) -> None:
+        dispatcher.outer_middleware.register(self.outer)
+        dispatcher.inner_middleware.register(self.inner)
+
+    async def outer(self, handler: NextHandler, event: Any, *args: Any) -> Any:
+        token = current_trace.set(DispatchTrace(received_at=time.perf_counter()))
+        try:
+            return await handler(event, *args)
+        finally:
+            current_trace.reset(token)
+
+    async def inner(self, handler: NextHandler, event: Any, *args: Any) -> Any:
+        trace = current_trace.get()
+        if trace is None:  # outer middleware isn't registered
+            return await handler(event, *args)
+        # dispatcher sets these fields right before the chain is called
+        filter_time, executed_handler = trace.filter_time, trace.handler
+        started_at = time.perf_counter()
+        try:
+            return await handler(event, *args)
+        finally:
+            self._on_timing(
+                HandlerTiming(
+                    handler=executed_handler,
+                    queue_wait=max(started_at - trace.received_at - filter_time, 0.0),
+                    filter_time=filter_time,
+                    handler_time=time.perf_counter() - started_at,
+                )
+            )
+
+
+def _log_timing(timing: HandlerTiming) -> None:
+    logger.debug(
+        'Handler %r: queue wait %.6f s, filters %.6f s, handler %.6f s',
+        timing.handler,
+        timing.queue_wait,
+        timing.filter_time,
+        timing.handler_time,
+    )
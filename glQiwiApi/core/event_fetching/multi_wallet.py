@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import itertools
+import logging
+from typing import Any, Callable, Hashable, List, Optional, Sequence, Set, Union
+
+import aiohttp
+
+from glQiwiApi import QiwiWrapper
+from glQiwiApi.core.event_fetching.checkpoints import BaseCheckpointStorage, CheckpointWriter
+from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher
+from glQiwiApi.core.event_fetching.executor import (
+    DEFAULT_MAX_TIMEOUT,
+    DEFAULT_TIMEOUT,
+    BaseExecutor,
+    HandlerContext,
+    PollingExecutor,
+    _EventHandlerType,
+    _NoUpdatesToExecute,
+)
+from glQiwiApi.core.event_fetching.in_flight import DEFAULT_DRAIN_TIMEOUT
+from glQiwiApi.core.event_fetching.worker_pool import DEFAULT_QUEUE_SIZE, WorkerPool
+from glQiwiApi.core.session.holder import AbstractSessionHolder, AiohttpSessionHolder
+from glQiwiApi.qiwi.clients.wallet.client import QiwiWallet
+from glQiwiApi.qiwi.clients.wallet.types import Transaction
+from glQiwiApi.utils.synchronous import adapter
+
+logger = logging.getLogger('glQiwiApi.executor')
+
+DEFAULT_MAX_CONCURRENT_REQUESTS = 10
+DEFAULT_CONNECTIONS_LIMIT = 100
+
+
+class MultiWalletPollingExecutor(BaseExecutor):
+    """
+    Polls history of many wallets in one event loop.
+
+    Every wallet has its own offset and adaptive polling interval, first requests
+    are spread evenly over the minimal interval, so wallets don't poll API at the same moment.
+    All wallets share one connection pool and one dispatcher,
+    `ctx.wallet` refers to the wallet that has received the transaction.
+    """
+
+    def __init__(
+        self,
+        wallets: Sequence[Union[QiwiWallet, QiwiWrapper]],
+        dispatcher: BaseDispatcher,
+        context: HandlerContext,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        timeout: Union[float, int] = DEFAULT_TIMEOUT,
+        max_timeout: Union[float, int] = DEFAULT_MAX_TIMEOUT,
+        skip_updates: bool = False,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+        connections_limit: int = DEFAULT_CONNECTIONS_LIMIT,
+        on_startup: Optional[_EventHandlerType] = None,
+        on_shutdown: Optional[_EventHandlerType] = None,
+        checkpoint_storage: Optional[BaseCheckpointStorage] = None,
+        workers: Optional[int] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        ordering_key: Optional[Callable[[Transaction], Hashable]] = None,
+        drain_timeout: Optional[float] = DEFAULT_DRAIN_TIMEOUT,
+    ) -> None:
+        """
+        :param wallets: wallets to poll
+        :param timeout: interval between requests of one wallet while new transactions arrive
+        :param max_timeout: interval that wallet backs off to when idle or on errors
+        :param max_concurrent_requests: how many history requests can be in flight at once
+        :param connections_limit: size of connection pool shared by all wallets
+        :param checkpoint_storage: storage of last processed transaction of every wallet,
+         checkpoints of all wallets are saved in batches by one background task
+        :param workers: if it's passed on, transactions of all wallets are handled
+         by one pool of workers, see `PollingExecutor`
+        :param queue_size: number of transactions, that can wait for a free worker
+        :param ordering_key: transactions with the same key are handled in order of date
+        :param drain_timeout: how long to wait for handlers, that are in progress, on shutdown
+        """
+        if not wallets:
+            raise ValueError('At least one wallet must be provided')
+        if max_concurrent_requests < 1:
+            raise ValueError('max_concurrent_requests must be positive')
+        if ordering_key is not None and workers is None:
+            raise ValueError('ordering_key can be used only with fixed number of workers')
+
+        super().__init__(
+            dispatcher,
+            loop=loop,
+            on_startup=on_startup,
+            on_shutdown=on_shutdown,
+            context=context,
+        )
+        self._pollers: List[PollingExecutor] = [
+            PollingExecutor(
+                wallet,
+                dispatcher,
+                # each wallet gets own context, but values put by user are shared
+                context=HandlerContext(context),
+                loop=loop,
+                timeout=timeout,
+                max_timeout=max_timeout,
+                skip_updates=skip_updates,
+                drain_timeout=drain_timeout,
+            )
+            for wallet in wallets
+        ]
+        self._checkpoint_writer: Optional[CheckpointWriter] = None
+        if checkpoint_storage is not None:
+            self._checkpoint_writer = CheckpointWriter(checkpoint_storage)
+            for poller in self._pollers:
+                poller._checkpoint_writer = self._checkpoint_writer
+        self._worker_pool: Optional[WorkerPool] = None
+        if workers is not None:
+            self._worker_pool = WorkerPool(workers, queue_size)
+            for poller in self._pollers:
+                poller._worker_pool = self._worker_pool
+                poller._ordering_key = ordering_key
+        self._max_concurrent_requests = max_concurrent_requests
+        self._connections_limit = connections_limit
+        self._connector: Optional[aiohttp.TCPConnector] = None
+        self._requests_semaphore: Optional[asyncio.Semaphore] = None
+        self._polling_task: Optional[asyncio.Task[None]] = None
+        self._abandoned_transactions: List[Transaction] = []
+
+    @property
+    def wallets(self) -> List[Union[QiwiWallet, QiwiWrapper]]:
+        return [poller._wallet for poller in self._pollers]
+
+    def start_polling(self) -> None:
+        self.loop.create_task(self._run_infinite_polling())
+        try:
+            adapter.run_forever_safe(self.loop, callback=self.stop)
+        except (SystemExit, KeyboardInterrupt):  # pragma: no cover
+            # allow graceful shutdown
+            adapter.safe_cancel(self.loop, callback=self.stop)
+
+    async def start_non_blocking_polling(self) -> asyncio.Task[None]:
+        return asyncio.create_task(self._run_infinite_polling())
+
+    async def stop(self) -> List[Transaction]:
+        """
+        Stop polling of all wallets, wait for handlers, that are in progress,
+        and call shutdown hooks, see `PollingExecutor.stop`
+
+        :return: transactions, whose handling was abandoned
+        """
+        if self._polling_task is not None and not self._polling_task.done():
+            self._polling_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._polling_task
+        return self._abandoned_transactions
+
+    async def _run_infinite_polling(self) -> None:
+        self._polling_task = asyncio.current_task()
+        # connector and semaphore must be created inside running event loop
+        self._connector = aiohttp.TCPConnector(limit=self._connections_limit)
+        self._requests_semaphore = asyncio.Semaphore(self._max_concurrent_requests)
+        try:
+            for poller in self._pollers:
+                await _share_connector(poller._wallet, self._connector)
+            await asyncio.gather(*(poller._restore_checkpoint() for poller in self._pollers))
+            if self._checkpoint_writer is not None:
+                self._checkpoint_writer.start()
+
+            await self.welcome()
+            stagger_step = self._pollers[0]._polling_interval.min_interval / len(self._pollers)
+            await asyncio.gather(
+                *(
+                    self._poll_wallet(poller, initial_delay=index * stagger_step)
+                    for index, poller in enumerate(self._pollers)
+                )
+            )
+        finally:
+            await asyncio.shield(self._close())
+
+    async def _poll_wallet(self, poller: PollingExecutor, initial_delay: float) -> None:
+        await asyncio.sleep(initial_delay)
+        while True:
+            try:
+                new_updates_count = await self._try_fetch_new_updates(poller)
+                poller._polling_interval.on_updates(new_updates_count)
+                delay = poller._polling_interval.next_delay()
+            except Exception as ex:
+                poller._polling_interval.on_error(ex)
+                delay = poller._polling_interval.next_delay()
+                logger.error(
+                    'Handle %r while polling wallet %r. Sleeping %.2f seconds',
+                    ex,
+                    poller._wallet,
+                    delay,
+                )
+            await asyncio.sleep(delay)
+
+    async def _try_fetch_new_updates(self, poller: PollingExecutor) -> int:
+        # only requests to API are limited, handlers are executed out of semaphore
+        async with self._requests_semaphore:  # type: ignore
+            try:
+                history = await poller._fetch_history()
+            except _NoUpdatesToExecute:
+                return 0
+        return await poller._process_history(history)
+
+    async def _close(self) -> None:
+        # all wallets are drained concurrently, so they share one deadline
+        await asyncio.gather(*(poller._drain_in_flight() for poller in self._pollers))
+        self._abandoned_transactions = list(
+            itertools.chain.from_iterable(
+                poller._abandoned_transactions for poller in self._pollers
+            )
+        )
+        await asyncio.gather(
+            self.goodbye(),
+            *(poller._wallet.close() for poller in self._pollers),
+            return_exceptions=True,
+        )
+        if self._checkpoint_writer is not None:
+            await self._checkpoint_writer.close()
+        if self._worker_pool is not None:
+            await self._worker_pool.close(drain=False)
+        if self._connector is not None:
+            await self._connector.close()
+
+
+async def _share_connector(
+    wallet: Union[QiwiWallet, QiwiWrapper], connector: aiohttp.BaseConnector
+) -> None:
+    if isinstance(wallet, QiwiWrapper):
+        wallet = wallet._qiwi_wallet
+
+    if wallet._request_service is None:
+        wallet._request_service = await wallet.create_request_service()
+
+    session_holder = _find_session_holder(wallet._request_service)
+    if not isinstance(session_holder, AiohttpSessionHolder):
+        logger.debug('Wallet %r uses custom transport, connection pool is not shared', wallet)
+        return
+    session_holder.update_session_kwargs(connector=connector, connector_owner=False)
+
+
+def _find_session_holder(request_service: Any) -> Optional[AbstractSessionHolder[Any]]:
+    # request service can be wrapped by several decorators (cache, logging, etc.)
+    visited: Set[int] = set()
+    while request_service is not None and id(request_service) not in visited:
+        visited.add(id(request_service))
+        session_holder = getattr(request_service, '_session_holder', None)
+        if isinstance(session_holder, AbstractSessionHolder):
+            return session_holder
+        request_service = getattr(request_service, '_request_service', None)
+    return None
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import logging
+import random
+from typing import Callable, FrozenSet, Optional, cast
+
+logger = logging.getLogger('glQiwiApi.executor')
+
+DEFAULT_BACKOFF_FACTOR = 2.0
+DEFAULT_JITTER = 0.1
+# QIWI API answers with 423 instead of 429 when there are too many requests
+RATE_LIMIT_STATUS_CODES: FrozenSet[int] = frozenset({423, 429})
+
+
+class AdaptivePollingInterval:
+    """
+    Decides how long polling executor should sleep before the next tick.
+
+    While new updates keep arriving interval stays at `min_interval`, so bursts of
+    payments are detected quickly. Every idle tick or failed request multiplies interval
+    by `backoff_factor` up to `max_interval`, so quiet hours cost few API calls.
+    Rate limited requests respect `Retry-After` header if API sent it.
+    Jitter spreads requests of several pollers that were started at the same time.
+    """
+
+    def __init__(
+        self,
+        min_interval: float,
+        max_interval: float,
+        backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+        jitter: float = DEFAULT_JITTER,
+        random_fn: Callable[[], float] = random.random,
+    ) -> None:
+        """
+        :param min_interval: interval, that is used while updates keep arriving
+        :param max_interval: upper bound of interval when idle or after errors
+        :param backoff_factor: multiplier applied to interval after idle tick or error
+        :param jitter: relative amount of randomness, e.g. 0.1 means ±10% of interval
+        :param random_fn: source of randomness in [0, 1)
+        """
+        if min_interval < 0:
+            raise ValueError('min_interval cannot be negative')
+        if max_interval < min_interval:
+            raise ValueError('max_interval cannot be less than min_interval')
+        if backoff_factor < 1:
+            raise ValueError('backoff_factor cannot be less than 1')
+        if not 0 <= jitter < 1:
+            raise ValueError('jitter must be in range [0, 1)')
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self._backoff_factor = backoff_factor
+        self._jitter = jitter
+        self._random_fn = random_fn
+        self._current = min_interval
+
+    @property
+    def current(self) -> float:
+        """Interval without jitter"""
+        return self._current
+
+    def on_updates(self, count: int) -> None:
+        if count > 0:
+            self._current = self.min_interval
+        else:
+            self.on_idle()
+
+    def on_idle(self) -> None:
+        self._back_off()
+
+    def on_error(self, ex: BaseException) -> None:
+        retry_after = _get_retry_after(ex)
+        if retry_after is not None:
+            self._current = min(max(retry_after, self.min_interval), self.max_interval)
+            return
+        self._back_off()
+        if is_rate_limit_error(ex):
+            # without Retry-After we can't know how long limit lasts, so back off twice as fast
+            self._back_off()
+
+    def reset(self) -> None:
+        self._current = self.min_interval
+
+    def next_delay(self) -> float:
+        if not self._jitter:
+            return self._current
+        spread = self._current * self._jitter
+        delay = self._current - spread + 2 * spread * self._random_fn()
+        return min(max(delay, self.min_interval), self.max_interval)
+
+    def _back_off(self) -> None:
+        # minimal interval can be zero, so then interval starts growing from one second
+        base = max(self._current, self.min_interval or 1.0)
+        self._current = min(base * self._backoff_factor, self.max_interval)
+
+
+def is_rate_limit_error(ex: BaseException) -> bool:
+    status_code = _get_status_code(ex)
+    return status_code is not None and status_code in RATE_LIMIT_STATUS_CODES
+
+
+def _get_status_code(ex: BaseException) -> Optional[int]:
+    http_response = getattr(ex, 'http_response', None)
+    if http_response is not None:
+        return cast(Optional[int], http_response.status_code)
+    # aiohttp.ClientResponseError
+    status = getattr(ex, 'status', None)
+    return status if isinstance(status, int) else None
+
+
+def _get_retry_after(ex: BaseException) -> Optional[float]:
+    if not is_rate_limit_error(ex):
+        return None
+    http_response = getattr(ex, 'http_response', None)
+    headers = getattr(http_response, 'headers', None) or getattr(ex, 'headers', None)
+    if not headers:
+        return None
+    for name, value in headers.items():
+        if name.lower() != 'retry-after':
+            continue
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            logger.debug('Retry-After header %r is not a number of seconds', value)
+            return None
+    return None
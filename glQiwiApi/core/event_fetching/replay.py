@@ -0,0 +1,366 @@
+from __future__ import annotations
+
+import asyncio
+import enum
+import logging
+import math
+import os
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import (
+    IO,
+    Any,
+    AsyncIterator,
+    DefaultDict,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+
+from pydantic import BaseModel
+
+from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher
+from glQiwiApi.core.event_fetching.middlewares import (
+    HandlerTiming,
+    NextHandler,
+    TimingMiddleware,
+    current_trace,
+)
+from glQiwiApi.qiwi.clients.p2p.types import BillWebhook
+from glQiwiApi.qiwi.clients.wallet.types import Transaction
+from glQiwiApi.qiwi.clients.wallet.types.webhooks import TransactionWebhook
+from glQiwiApi.types.amount import CurrencyModel
+from glQiwiApi.utils.compat import json
+
+logger = logging.getLogger('glQiwiApi.replay')
+
+DEFAULT_REPLAY_CONCURRENCY = 100
+
+EVENT_TYPES: Dict[str, Type[BaseModel]] = {
+    'transaction': Transaction,
+    'transaction_webhook': TransactionWebhook,
+    'bill_webhook': BillWebhook,
+}
+
+_PathType = Union[str, 'os.PathLike[str]']
+
+
+def dump_event(event: Any) -> Dict[str, Any]:
+    """
+    Convert event to record of capture file. Payload is written in format of QIWI API,
+    so it's parsed back the same way as response of API or request of webhook.
+    """
+    for name, event_cls in EVENT_TYPES.items():
+        if type(event) is event_cls:
+            return {'type': name, 'payload': _to_payload(event)}
+    raise TypeError(f'Events of type {type(event).__name__} can not be captured')
+
+
+def load_event(record: Dict[str, Any]) -> Any:
+    try:
+        event_cls = EVENT_TYPES[record['type']]
+    except KeyError:
+        raise ValueError(f'Unknown type of captured event: {record.get("type")!r}') from None
+    return event_cls.parse_obj(record['payload'])
+
+
+def read_events(path: _PathType) -> Iterator[Any]:
+    """Lazily read events from JSONL capture file, blank lines are skipped"""
+    with open(path, 'rb') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield load_event(json.loads(line))
+            except ValueError as ex:
+                raise ValueError(f'Invalid event at line {line_number} of {path}: {ex}') from ex
+
+
+class EventRecorder:
+    """
+    Captures events, that come to dispatcher from any executor, into JSONL file,
+    so they can be replayed later by `ReplayEngine`.
+    Events of types, that can't be replayed, are skipped.
+
+    >>> recorder = EventRecorder('events.jsonl')
+    >>> recorder.setup(dp)
+    """
+
+    def __init__(self, path: _PathType) -> None:
+        self._path = os.fspath(path)
+        self._file: Optional[IO[bytes]] = None
+
+    def setup(self, dispatcher: BaseDispatcher) -> None:
+        dispatcher.outer_middleware.register(self.middleware)
+
+    async def middleware(self, handler: NextHandler, event: Any, *args: Any) -> Any:
+        self.record(event)
+        return await handler(event, *args)
+
+    def record(self, event: Any) -> None:
+        try:
+            record = dump_event(event)
+        except TypeError as ex:
+            logger.debug('Event is not captured: %s', ex)
+            return None
+        if self._file is None:
+            self._file = open(self._path, 'ab')
+        raw = json.dumps(record)
+        if isinstance(raw, str):
+            # stdlib json is used, when orjson isn't installed
+            raw = raw.encode('utf-8')
+        # file is buffered, so disk is touched only when buffer is full or file is closed
+        self._file.write(raw + b'\n')
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> EventRecorder:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+@dataclass(frozen=True)
+class LatencySummary:
+    """Percentiles of latency in seconds"""
+
+    p50: float = 0.0
+    p90: float = 0.0
+    p99: float = 0.0
+    max: float = 0.0
+
+    @classmethod
+    def from_samples(cls, samples: Sequence[float]) -> LatencySummary:
+        if not samples:
+            return cls()
+        ordered = sorted(samples)
+        return cls(
+            p50=_percentile(ordered, 50),
+            p90=_percentile(ordered, 90),
+            p99=_percentile(ordered, 99),
+            max=ordered[-1],
+        )
+
+
+@dataclass(frozen=True)
+class HandlerReport:
+    calls: int
+    errors: int
+    latency: LatencySummary
+
+
+@dataclass(frozen=True)
+class ReplayReport:
+    """
+    :param events: number of replayed events
+    :param duration: time between the first event and completion of the last one
+    :param latency: time between scheduled start of event and completion of its handling,
+     so it includes time, that event has waited, when replay falls behind target rate
+    :param handlers: statistics of every handler, that has handled at least one event
+    """
+
+    events: int
+    duration: float
+    latency: LatencySummary
+    handlers: Dict[str, HandlerReport] = field(default_factory=dict)
+
+    @property
+    def throughput(self) -> float:
+        """Events per second"""
+        if self.duration == 0:
+            return 0.0
+        return self.events / self.duration
+
+    @property
+    def errors(self) -> int:
+        return sum(report.errors for report in self.handlers.values())
+
+    def format(self) -> str:
+        lines = [
+            f'{self.events} events in {self.duration:.3f} s, {self.throughput:.1f} events/s, '
+            f'{self.errors} errors',
+            _format_latency('events', self.events, self.errors, self.latency),
+        ]
+        for name, report in sorted(self.handlers.items()):
+            lines.append(_format_latency(name, report.calls, report.errors, report.latency))
+        return '\n'.join(lines)
+
+
+class ReplayEngine:
+    """
+    Feeds captured events into dispatcher, so throughput and latency of handlers
+    can be measured offline, e.g. in CI.
+
+    >>> report = await ReplayEngine(dp, HandlerContext(), rate=500).replay_file('events.jsonl')
+    >>> print(report.format())
+    """
+
+    def __init__(
+        self,
+        dispatcher: BaseDispatcher,
+        *args: Any,
+        rate: Optional[float] = None,
+        concurrency: int = DEFAULT_REPLAY_CONCURRENCY,
+    ) -> None:
+        """
+        :param dispatcher: dispatcher with handlers under test
+        :param args: arguments, that are passed on to handlers along with event,
+         e.g. `HandlerContext`
+        :param rate: target number of events per second, None means as fast as possible
+        :param concurrency: number of events, that can be handled simultaneously
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError('Rate must be positive')
+        if concurrency < 1:
+            raise ValueError('Concurrency must be positive')
+        self._dispatcher = dispatcher
+        self._args = args
+        self._rate = rate
+        self._concurrency = concurrency
+
+    async def replay_file(self, path: _PathType) -> ReplayReport:
+        return await self.replay(read_events(path))
+
+    async def replay(self, events: Iterable[Any]) -> ReplayReport:
+        collector = _Collector()
+        timing = TimingMiddleware(on_timing=collector.record_timing)
+        timing.setup(self._dispatcher)
+        self._dispatcher.inner_middleware.register(collector.count_errors)
+        try:
+            return await self._replay(events, collector)
+        finally:
+            self._dispatcher.inner_middleware.unregister(collector.count_errors)
+            self._dispatcher.inner_middleware.unregister(timing.inner)
+            self._dispatcher.outer_middleware.unregister(timing.outer)
+
+    async def _replay(self, events: Iterable[Any], collector: _Collector) -> ReplayReport:
+        semaphore = asyncio.Semaphore(self._concurrency)
+        pending: Set[asyncio.Task[None]] = set()
+        latencies: List[float] = []
+        count = 0
+        started_at = time.perf_counter()
+        async for scheduled_at, event in self._schedule(events, started_at):
+            await semaphore.acquire()
+            task = asyncio.create_task(self._process(event, scheduled_at, latencies))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            task.add_done_callback(lambda _: semaphore.release())
+            count += 1
+        if pending:
+            await asyncio.gather(*pending)
+        return ReplayReport(
+            events=count,
+            duration=time.perf_counter() - started_at,
+            latency=LatencySummary.from_samples(latencies),
+            handlers=collector.build_reports(),
+        )
+
+    async def _schedule(
+        self, events: Iterable[Any], started_at: float
+    ) -> AsyncIterator[Tuple[float, Any]]:
+        for index, event in enumerate(events):
+            if self._rate is None:
+                yield time.perf_counter(), event
+                continue
+            scheduled_at = started_at + index / self._rate
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield scheduled_at, event
+
+    async def _process(self, event: Any, scheduled_at: float, latencies: List[float]) -> None:
+        try:
+            await self._dispatcher.process_event(event, *self._args)
+        except Exception as ex:  # pragma: no cover
+            logger.error('Failed to replay event %r: %r', event, ex)
+        latencies.append(time.perf_counter() - scheduled_at)
+
+
+class _Collector:
+    def __init__(self) -> None:
+        self._latencies: DefaultDict[str, List[float]] = defaultdict(list)
+        self._errors: DefaultDict[str, int] = defaultdict(int)
+
+    def record_timing(self, timing: HandlerTiming) -> None:
+        self._latencies[_handler_name(timing.handler)].append(timing.handler_time)
+
+    async def count_errors(self, handler: NextHandler, event: Any, *args: Any) -> Any:
+        try:
+            return await handler(event, *args)
+        except (Exception, asyncio.CancelledError):
+            # cancellation here means, that handler has exceeded its timeout
+            trace = current_trace.get()
+            if trace is not None:
+                self._errors[_handler_name(trace.handler)] += 1
+            raise
+
+    def build_reports(self) -> Dict[str, HandlerReport]:
+        return {
+            name: HandlerReport(
+                calls=len(latencies),
+                errors=self._errors[name],
+                latency=LatencySummary.from_samples(latencies),
+            )
+            for name, latencies in self._latencies.items()
+        }
+
+
+def _to_payload(value: Any) -> Any:
+    if isinstance(value, CurrencyModel):
+        # API sends numeric ISO code, it's parsed to currency model again
+        if value.iso_format is not None and value.iso_format.isdigit():
+            return int(value.iso_format)
+        return value.code
+    if isinstance(value, BaseModel):
+        fields = value.__fields__
+        return {
+            (fields[name].alias if name in fields else name): _to_payload(item)
+            for name, item in value
+        }
+    if isinstance(value, dict):
+        return {key: _to_payload(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_payload(item) for item in value]
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        # signature of webhook is built from raw values, so 1 must not become 1.0
+        return int(value)
+    return value
+
+
+def _handler_name(handler: Any) -> str:
+    return getattr(handler, '__qualname__', None) or repr(handler)
+
+
+def _percentile(ordered: Sequence[float], percent: float) -> float:
+    # nearest-rank method, so result is always one of observed values
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _format_latency(name: str, calls: int, errors: int, latency: LatencySummary) -> str:
+    return (
+        f'{name}: {calls} calls, {errors} errors, '
+        f'p50 {latency.p50 * 1000:.2f} ms, p90 {latency.p90 * 1000:.2f} ms, '
+        f'p99 {latency.p99 * 1000:.2f} ms, max {latency.max * 1000:.2f} ms'
+    )
@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from dataclasses import dataclass
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence
+
+from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher
+from glQiwiApi.core.event_fetching.executor import HandlerContext
+from glQiwiApi.core.event_fetching.multi_wallet import MultiWalletPollingExecutor
+from glQiwiApi.qiwi.clients.wallet.client import QiwiWallet
+from glQiwiApi.utils.consistent_hashing import ConsistentHashRing
+
+logger = logging.getLogger('glQiwiApi.executor')
+
+DEFAULT_MAX_RESTART_DELAY = 60.0
+DEFAULT_STOP_TIMEOUT = 10.0
+DEFAULT_CHECK_INTERVAL = 1.0
+
+WalletSpec = Mapping[str, Any]
+_DispatcherFactory = Callable[[], BaseDispatcher]
+_ExecutorKwargsFactory = Callable[[], Dict[str, Any]]
+_ShardTarget = Callable[
+    [List[WalletSpec], _DispatcherFactory, Optional[_ExecutorKwargsFactory]], None
+]
+
+
+def run_polling_shard(
+    wallets: List[WalletSpec],
+    make_dispatcher: _DispatcherFactory,
+    make_executor_kwargs: Optional[_ExecutorKwargsFactory] = None,
+) -> None:
+    """
+    Entrypoint of worker process, that polls wallets of one shard
+    with `MultiWalletPollingExecutor` until SIGTERM is received.
+
+    :param wallets: keyword arguments of `QiwiWallet` for every wallet of the shard
+    :param make_dispatcher: creates dispatcher with handlers in the worker process
+    :param make_executor_kwargs: creates extra arguments of `MultiWalletPollingExecutor`,
+     e.g. checkpoint storage, in the worker process
+    """
+    asyncio.run(_poll_shard(wallets, make_dispatcher, make_executor_kwargs))
+
+
+async def _poll_shard(
+    wallets: List[WalletSpec],
+    make_dispatcher: _DispatcherFactory,
+    make_executor_kwargs: Optional[_ExecutorKwargsFactory],
+) -> None:
+    executor_kwargs = make_executor_kwargs() if make_executor_kwargs is not None else {}
+    executor = MultiWalletPollingExecutor(
+        [QiwiWallet(**spec) for spec in wallets],
+        make_dispatcher(),
+        context=HandlerContext(),
+        **executor_kwargs,
+    )
+    task = await executor.start_non_blocking_polling()
+    with contextlib.suppress(NotImplementedError):  # pragma: no cover
+        # cancellation lets executor save checkpoints and call on_shutdown
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+@dataclass
+class _Shard:
+    index: int
+    wallets: List[WalletSpec]
+    process: Optional[BaseProcess] = None
+    started_at: float = 0.0
+    crashes: int = 0
+    restart_at: float = 0.0
+
+
+class ShardedPollingSupervisor:
+    """
+    Spreads wallets over worker processes, so handlers of different wallets
+    don't compete for one event loop and throughput scales with number of cores.
+
+    Wallets are assigned to shards by consistent hashing of their tokens,
+    so when number of processes changes, only shards, whose wallets have moved, are restarted.
+    Crashed workers are restarted with exponential delay.
+
+    Workers are separate processes, so wallets are passed on as keyword arguments of `QiwiWallet`
+    and dispatcher is created in every worker by `make_dispatcher`.
+    Both of them must be picklable, i.e. `make_dispatcher` must be a module-level function.
+    """
+
+    def __init__(
+        self,
+        wallets: Sequence[WalletSpec],
+        make_dispatcher: _DispatcherFactory,
+        processes: Optional[int] = None,
+        make_executor_kwargs: Optional[_ExecutorKwargsFactory] = None,
+        target: _ShardTarget = run_polling_shard,
+        start_method: Optional[str] = 'spawn',
+        max_restart_delay: float = DEFAULT_MAX_RESTART_DELAY,
+        stop_timeout: float = DEFAULT_STOP_TIMEOUT,
+    ) -> None:
+        """
+        :param wallets: keyword arguments of `QiwiWallet` for every wallet,
+         e.g. ``{'api_access_token': '...', 'phone_number': '+...'}``
+        :param make_dispatcher: module-level function, that creates dispatcher with handlers
+        :param processes: number of worker processes, number of CPUs by default
+        :param make_executor_kwargs: module-level function, that creates extra arguments
+         of `MultiWalletPollingExecutor` in the worker process
+        :param target: entrypoint of worker process, `run_polling_shard` by default
+        :param start_method: multiprocessing start method, spawn is used by default,
+         because forking process with running event loop isn't safe
+        :param max_restart_delay: upper bound of delay before restart of crashed worker
+        :param stop_timeout: how long to wait for graceful shutdown of worker before killing it
+        """
+        if not wallets:
+            raise ValueError('At least one wallet must be provided')
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if processes < 1:
+            raise ValueError('Number of processes must be positive')
+        self._wallets = {_shard_key(spec): spec for spec in wallets}
+        self._make_dispatcher = make_dispatcher
+        self._make_executor_kwargs = make_executor_kwargs
+        self._target = target
+        self._mp_context = multiprocessing.get_context(start_method)
+        self._max_restart_delay = max_restart_delay
+        self._stop_timeout = stop_timeout
+        self._processes = processes
+        self._shards: Dict[int, _Shard] = {}
+
+    @property
+    def processes(self) -> int:
+        return self._processes
+
+    @property
+    def assignment(self) -> Dict[int, List[WalletSpec]]:
+        """Wallets of every shard, that has at least one wallet"""
+        ring = ConsistentHashRing(range(self._processes))
+        return {
+            shard: [self._wallets[key] for key in sorted(keys)]
+            for shard, keys in ring.distribute(self._wallets).items()
+        }
+
+    def start(self) -> None:
+        for index, wallets in self.assignment.items():
+            if index not in self._shards:
+                self._shards[index] = _Shard(index, wallets)
+                self._start_shard(self._shards[index])
+
+    def supervise(self) -> None:
+        """Restart workers, that have exited, must be called periodically"""
+        now = time.monotonic()
+        for shard in self._shards.values():
+            if shard.process is None:
+                if now >= shard.restart_at:
+                    self._start_shard(shard)
+                continue
+            if shard.process.is_alive():
+                if now - shard.started_at >= self._max_restart_delay:
+                    # worker works long enough, so next crash isn't a crash loop
+                    shard.crashes = 0
+                continue
+
+            shard.crashes += 1
+            delay = min(2 ** (shard.crashes - 1), self._max_restart_delay)
+            logger.error(
+                'Worker of shard %d has exited with code %s. Restarting in %.2f seconds',
+                shard.index,
+                shard.process.exitcode,
+                delay,
+            )
+            shard.process = None
+            shard.restart_at = now + delay
+
+    def scale(self, processes: int) -> None:
+        """
+        Change number of worker processes.
+        Workers, whose wallets don't change, keep working.
+        """
+        if processes < 1:
+            raise ValueError('Number of processes must be positive')
+        self._processes = processes
+        assignment = self.assignment
+
+        moved_shards = [
+            shard
+            for index, shard in self._shards.items()
+            if _wallet_keys(assignment.get(index, [])) != _wallet_keys(shard.wallets)
+        ]
+        # wallet must not be polled by old and new worker simultaneously
+        self._stop_shards(moved_shards)
+        for shard in moved_shards:
+            del self._shards[shard.index]
+        logger.info('Scaling to %d processes, %d shards are moved', processes, len(moved_shards))
+        self.start()
+
+    def stop(self) -> None:
+        self._stop_shards(list(self._shards.values()))
+        self._shards.clear()
+
+    def run_forever(self, check_interval: float = DEFAULT_CHECK_INTERVAL) -> None:
+        self.start()
+        try:
+            while True:
+                time.sleep(check_interval)
+                self.supervise()
+        except (SystemExit, KeyboardInterrupt):  # pragma: no cover
+            # allow graceful shutdown
+            pass
+        finally:
+            self.stop()
+
+    def _start_shard(self, shard: _Shard) -> None:
+        process = self._mp_context.Process(  # type: ignore[attr-defined]
+            target=self._target,
+            args=(shard.wallets, self._make_dispatcher, self._make_executor_kwargs),
+            name=f'glQiwiApi-shard-{shard.index}',
+            daemon=True,
+        )
+        process.start()
+        shard.process = process
+        shard.started_at = time.monotonic()
+        logger.info(
+            'Worker of shard %d is started with %d wallets', shard.index, len(shard.wallets)
+        )
+
+    def _stop_shards(self, shards: List[_Shard]) -> None:
+        processes = [shard.process for shard in shards if shard.process is not None]
+        for process in processes:
+            process.terminate()
+        deadline = time.monotonic() + self._stop_timeout
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logger.warning('Worker %s has not stopped in time and is killed', process.name)
+                process.kill()
+                process.join()
+        for shard in shards:
+            shard.process = None
+
+
+def _shard_key(spec: WalletSpec) -> str:
+    return hashlib.sha256(spec['api_access_token'].encode('utf-8')).hexdigest()
+
+
+def _wallet_keys(wallets: List[WalletSpec]) -> List[str]:
+    return sorted(_shard_key(spec) for spec in wallets)
@@ -3,10 +3,16 @@ import typing as t
 from aiohttp import web
 
 from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher
-from glQiwiApi.core.event_fetching.webhooks.config import WebhookConfig
+from glQiwiApi.core.event_fetching.event_queue import (
+    BaseEventQueue,
+    EventQueueConsumer,
+    MemoryEventQueue,
+)
+from glQiwiApi.core.event_fetching.webhooks.config import ProcessingConfig, WebhookConfig
 from glQiwiApi.core.event_fetching.webhooks.middlewares.ip import ip_filter_middleware
 from glQiwiApi.core.event_fetching.webhooks.services.collision_detector import (
-    HashBasedCollisionDetector,
+    AbstractCollisionDetector,
+    WindowedCollisionDetector,
 )
 from glQiwiApi.core.event_fetching.webhooks.services.security.ip import IPFilter
 from glQiwiApi.core.event_fetching.webhooks.utils import inject_dependencies
@@ -19,7 +25,11 @@ from glQiwiApi.qiwi.clients.wallet.types.webhooks import TransactionWebhook
 
 
 def configure_app(
-    dispatcher: BaseDispatcher, app: web.Application, webhook_config: WebhookConfig
+    dispatcher: BaseDispatcher,
+    app: web.Application,
+    webhook_config: WebhookConfig,
+    collision_detector: t.Optional[AbstractCollisionDetector[t.Any]] = None,
+    event_queue: t.Optional[BaseEventQueue] = None,
 ) -> web.Application:
     """
     Entirely configures the web app for webhooks.
@@ -27,11 +37,24 @@ def configure_app(
     :param dispatcher: dispatcher, which processing events
     :param app: aiohttp.web.Application
     :param webhook_config:
+    :param collision_detector: detector of already processed events,
+     pass on your own to share it with other sources of events,
+     `WindowedCollisionDetector`, that remembers events for a day, by default
+    :param event_queue: if it's passed on, QIWI gets response as soon as event is put
+     into the queue, events are handled by workers of the app in background,
+     `MemoryEventQueue` is used by default, when `processing.respond_immediately` is set
     """
+    if collision_detector is None:
+        collision_detector = WindowedCollisionDetector()
+    if event_queue is None and webhook_config.processing.respond_immediately:
+        event_queue = MemoryEventQueue(webhook_config.processing.queue_size)
+    if event_queue is not None:
+        _setup_queue_consumer(app, dispatcher, event_queue, webhook_config.processing)
 
     generic_dependencies: t.Dict[str, t.Any] = {
         'dispatcher': dispatcher,
-        'collision_detector': HashBasedCollisionDetector(),
+        'collision_detector': collision_detector,
+        'event_queue': event_queue,
     }
 
     app.router.add_view(
@@ -64,3 +87,25 @@ def configure_app(
         app.middlewares.append(ip_filter_middleware(IPFilter.default()))
 
     return app
+
+
+def _setup_queue_consumer(
+    app: web.Application,
+    dispatcher: BaseDispatcher,
+    event_queue: BaseEventQueue,
+    config: ProcessingConfig,
+) -> None:
+    consumer = EventQueueConsumer(
+        event_queue, dispatcher, concurrency=config.workers, drain_timeout=config.drain_timeout
+    )
+
+    async def run_consumer(_: web.Application) -> t.AsyncIterator[None]:
+        consumer.start()
+        yield
+        # cleanup runs after requests are finished, so nothing is put into closed queue
+        try:
+            await consumer.close()
+        finally:
+            await event_queue.close()
+
+    app.cleanup_ctx.append(run_consumer)
@@ -6,6 +6,8 @@ from typing import Any, Dict, Optional
 
 from aiohttp import web
 
+from glQiwiApi.core.event_fetching.event_queue import DEFAULT_MAX_QUEUE_SIZE
+from glQiwiApi.core.event_fetching.in_flight import DEFAULT_DRAIN_TIMEOUT
 from glQiwiApi.utils.certificates import SSLCertificate
 
 DEFAULT_QIWI_WEBHOOK_PATH = '/webhooks/qiwi/transactions/'
@@ -14,6 +16,8 @@ DEFAULT_QIWI_ROUTE_NAME = 'QIWI_TRANSACTIONS'
 DEFAULT_QIWI_BILLS_WEBHOOK_PATH = '/webhooks/qiwi/bills/'
 DEFAULT_QIWI_BILLS_ROUTE_NAME = 'QIWI_BILLS'
 
+DEFAULT_WEBHOOK_WORKERS = 16
+
 
 @dataclass()
 class ApplicationConfig:
@@ -58,6 +62,21 @@ class SecurityConfig:
     check_ip: bool = True
 
 
+@dataclass()
+class ProcessingConfig:
+    respond_immediately: bool = False
+    'respond to QIWI right after event is queued, handlers are run by background workers'
+
+    queue_size: int = DEFAULT_MAX_QUEUE_SIZE
+    'number of events, that can wait for workers, when queue is full request waits'
+
+    workers: int = DEFAULT_WEBHOOK_WORKERS
+    'number of events, that are handled simultaneously'
+
+    drain_timeout: Optional[float] = DEFAULT_DRAIN_TIMEOUT
+    'how long to wait for queued events on shutdown'
+
+
 @dataclass()
 class HookRegistrationConfig:
     host_or_ip_address: Optional[str] = None
@@ -70,3 +89,4 @@ class WebhookConfig:
     app: ApplicationConfig = field(default_factory=ApplicationConfig)
     routes: RoutesConfig = field(default_factory=RoutesConfig)
     security: SecurityConfig = field(default_factory=SecurityConfig)
+    processing: ProcessingConfig = field(default_factory=ProcessingConfig)
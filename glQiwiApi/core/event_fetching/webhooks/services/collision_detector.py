@@ -1,8 +1,20 @@
+from __future__ import annotations
+
 import abc
-from typing import Any, Generic, Set, TypeVar
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Generic, Hashable, Optional, Set, TypeVar
+
+from glQiwiApi.qiwi.clients.wallet.types.transaction import Transaction
+from glQiwiApi.qiwi.clients.wallet.types.webhooks import TransactionWebhook
 
 T = TypeVar('T')
 
+DEFAULT_RETENTION = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 100_000
+
 
 class UnexpectedCollision(Exception):
     pass
@@ -31,6 +43,13 @@ class AbstractCollisionDetector(abc.ABC, Generic[T]):
             raise UnexpectedCollision()
         self.add_already_processed_event(obj)
 
+    def forget_processed_object(self, obj: T) -> None:
+        """
+        Forget event, that was remembered, but wasn't accepted for processing,
+        so its redelivery isn't taken for duplicate. Detectors, that can't forget events,
+        leave it remembered.
+        """
+
 
 class HashBasedCollisionDetector(AbstractCollisionDetector[T]):
     def __init__(self) -> None:
@@ -41,13 +60,124 @@ class HashBasedCollisionDetector(AbstractCollisionDetector[T]):
             raise UnhashableObjectError(f'Object {obj!r} is unhashable')
         self.already_processed_object_hashes.add(hash(obj))
 
+    def forget_processed_object(self, obj: T) -> None:
+        if not _is_object_unhashable(obj):
+            self.already_processed_object_hashes.discard(hash(obj))
+
     def has_collision(self, obj: T) -> bool:
         if _is_object_unhashable(obj):
             raise UnhashableObjectError(f'Object {obj!r} is unhashable')
-        return any(
-            hash(obj) == processed_hash for processed_hash in self.already_processed_object_hashes
+        return hash(obj) in self.already_processed_object_hashes
+
+
+@dataclass(frozen=True)
+class CollisionDetectorStats:
+    """
+    :param entries: number of remembered events
+    :param expired: number of events, that were forgotten, because retention has passed
+    :param evicted: number of events, that were forgotten to keep `max_entries`
+    :param size_in_bytes: approximate memory used by remembered events
+    """
+
+    entries: int
+    expired: int
+    evicted: int
+    size_in_bytes: int
+
+
+class WindowedCollisionDetector(AbstractCollisionDetector[Any]):
+    """
+    Remembers events only for `retention` seconds and at most `max_entries` of them,
+    so memory doesn't grow under sustained traffic, while redelivery of the same event
+    within the window is still detected.
+
+    Keys are kept in insertion order, so lookup is a hash lookup and forgetting
+    of the oldest events costs O(1) per event.
+    By default `TransactionWebhook` and `Transaction` of the same payment have the same key,
+    so detector can be shared by webhook views and polling.
+    """
+
+    def __init__(
+        self,
+        retention: Optional[float] = DEFAULT_RETENTION,
+        max_entries: Optional[int] = DEFAULT_MAX_ENTRIES,
+        key: Optional[Callable[[Any], Hashable]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        :param retention: how long event is remembered in seconds, None means until it's evicted
+        :param max_entries: if set, the oldest events are forgotten when the limit is exceeded
+        :param key: function, that returns key of event, events with the same key are duplicates,
+         by default transactions are compared by id and other events by hash
+        :param clock: source of time, monotonic clock by default
+        """
+        if retention is not None and retention <= 0:
+            raise ValueError('Retention must be positive')
+        if max_entries is not None and max_entries <= 0:
+            raise ValueError('max_entries must be a positive number')
+        self._retention = retention
+        self._max_entries = max_entries
+        self._key = key or _make_event_key
+        self._clock = clock
+        self._remembered_at: OrderedDict[Hashable, float] = OrderedDict()
+        self._expired = 0
+        self._evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._remembered_at)
+
+    def has_collision(self, obj: Any) -> bool:
+        self._forget_expired()
+        return self._key(obj) in self._remembered_at
+
+    def add_already_processed_event(self, obj: Any) -> None:
+        key = self._key(obj)
+        self._remembered_at[key] = self._clock()
+        # event, that is remembered again, must be forgotten after the newest occurrence
+        self._remembered_at.move_to_end(key)
+        if self._max_entries is not None:
+            while len(self._remembered_at) > self._max_entries:
+                self._remembered_at.popitem(last=False)
+                self._evicted += 1
+
+    def forget_processed_object(self, obj: Any) -> None:
+        self._remembered_at.pop(self._key(obj), None)
+
+    def stats(self) -> CollisionDetectorStats:
+        """Memory usage is measured on every call, so it's O(n)"""
+        self._forget_expired()
+        size_in_bytes = sys.getsizeof(self._remembered_at) + sum(
+            _deep_sizeof(key) + sys.getsizeof(remembered_at)
+            for key, remembered_at in self._remembered_at.items()
+        )
+        return CollisionDetectorStats(
+            entries=len(self._remembered_at),
+            expired=self._expired,
+            evicted=self._evicted,
+            size_in_bytes=size_in_bytes,
         )
 
+    def _forget_expired(self) -> None:
+        if self._retention is None:
+            return None
+        deadline = self._clock() - self._retention
+        while self._remembered_at:
+            oldest_key, remembered_at = next(iter(self._remembered_at.items()))
+            if remembered_at > deadline:
+                break
+            del self._remembered_at[oldest_key]
+            self._expired += 1
+
+
+def _make_event_key(obj: Any) -> Hashable:
+    if isinstance(obj, TransactionWebhook) and obj.payment is not None:
+        return 'transaction', str(obj.payment.txn_id)
+    if isinstance(obj, Transaction):
+        return 'transaction', str(obj.id)
+    if _is_object_unhashable(obj):
+        raise UnhashableObjectError(f'Object {obj!r} is unhashable')
+    return 'hash', hash(obj)
+
 
 def _is_object_unhashable(obj: Any) -> bool:
     try:
@@ -55,3 +185,9 @@ def _is_object_unhashable(obj: Any) -> bool:
         return False
     except TypeError:
         return True
+
+
+def _deep_sizeof(obj: Any) -> int:
+    if isinstance(obj, tuple):
+        return sys.getsizeof(obj) + sum(_deep_sizeof(item) for item in obj)
+    return sys.getsizeof(obj)
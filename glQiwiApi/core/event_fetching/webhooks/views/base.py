@@ -1,12 +1,13 @@
 import abc
 import logging
 from typing import TYPE_CHECKING as MYPY
-from typing import Any, Generic, Type, TypeVar
+from typing import Any, Generic, Optional, Type, TypeVar
 
 from aiohttp import web
 from aiohttp.web_request import Request
 
 from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher
+from glQiwiApi.core.event_fetching.event_queue import BaseEventQueue
 from glQiwiApi.core.event_fetching.webhooks.dto import WebhookAPIError
 from glQiwiApi.core.event_fetching.webhooks.services.collision_detector import (
     AbstractCollisionDetector,
@@ -36,12 +37,14 @@ class BaseWebhookView(web.View, Generic[Event]):
         collision_detector: AbstractCollisionDetector[Any],
         event_cls: Type[Event],
         encryption_key: str,
+        event_queue: Optional[BaseEventQueue] = None,
     ) -> None:
         super().__init__(request)
         self._dispatcher = dispatcher
         self._collision_detector = collision_detector
         self._event_cls = event_cls
         self._encryption_key = encryption_key
+        self._event_queue = event_queue
 
     @abc.abstractmethod
     async def ok_response(self) -> web.Response:
@@ -52,6 +55,8 @@ class BaseWebhookView(web.View, Generic[Event]):
 
     async def post(self) -> web.Response:
         event = await self._parse_raw_request()
+        # forged event must not be remembered, otherwise the real one would be ignored
+        self._validate_event_signature(event)
 
         try:
             self._collision_detector.remember_processed_object(event)
@@ -59,8 +64,12 @@ class BaseWebhookView(web.View, Generic[Event]):
             logger.debug('Detect collision on event %s', event)
             return await self.ok_response()
 
-        self._validate_event_signature(event)
-        await self.process_event(event)
+        try:
+            await self.process_event(event)
+        except BaseException:
+            # QIWI delivers event again, when it doesn't get response, it must not be ignored
+            self._collision_detector.forget_processed_object(event)
+            raise
         return await self.ok_response()
 
     async def _parse_raw_request(self) -> Event:
@@ -84,4 +93,7 @@ class BaseWebhookView(web.View, Generic[Event]):
         raise NotImplementedError
 
     async def process_event(self, event: Event) -> None:
+        if self._event_queue is not None:
+            # handlers are run by consumer of the queue, so response isn't delayed by them
+            return await self._event_queue.put(event)
         await self._dispatcher.process_event(event)
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Hashable, List, Optional, Set, Tuple, cast
+
+logger = logging.getLogger('glQiwiApi.executor')
+
+DEFAULT_QUEUE_SIZE = 100
+
+_Job = Callable[[], Awaitable[Any]]
+_QueueItem = Tuple[_Job, 'asyncio.Future[Any]']
+
+# releases worker, that executes current job, see `release_worker`
+_worker_release: ContextVar[Optional[Callable[[], None]]] = ContextVar(
+    'worker_release', default=None
+)
+
+
+def release_worker() -> None:
+    """
+    Let worker of `WorkerPool`, that executes current job, take the next job,
+    while current job waits for something, that doesn't need a worker, e.g. for its batch.
+    Released job is still awaited by `join`. Outside of worker pool it does nothing.
+    """
+    release = _worker_release.get()
+    if release is not None:
+        release()
+
+
+class WorkerPool:
+    """
+    Fixed number of workers, that execute jobs from bounded queue.
+
+    `submit` waits while the queue is full, so producer (e.g. polling) is paused until
+    workers catch up instead of spawning unbounded number of tasks.
+    Jobs without key are taken from one shared queue by any free worker, so a fast job
+    never waits behind a slow one, while other workers are idle.
+    Jobs with the same key are always executed by the same worker one after another,
+    so they are processed in order of submission, while jobs with different keys run in parallel.
+    Job can give its worker back by `release_worker`, then the next job of the same key
+    may start before the released one is done.
+    """
+
+    def __init__(self, workers: int, queue_size: int = DEFAULT_QUEUE_SIZE) -> None:
+        """
+        :param workers: number of jobs, that can be executed concurrently
+        :param queue_size: number of jobs, that can wait for a free worker
+        """
+        if workers < 1:
+            raise ValueError('Number of workers must be positive')
+        if queue_size < 1:
+            raise ValueError('Queue size must be positive')
+        self._workers_count = workers
+        self._queue_size = queue_size
+        self._shared_queue: Deque[_QueueItem] = collections.deque()
+        # keyed jobs are bound to worker, so jobs with the same key don't overtake each other
+        self._keyed_queues: List[Deque[_QueueItem]] = []
+        self._waiting = 0
+        self._unfinished = 0
+        self._changed: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task[None]] = []
+        # jobs, that have released their workers
+        self._released: Set[asyncio.Task[None]] = set()
+
+    @property
+    def is_started(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        if self.is_started:
+            return None
+        self._changed = asyncio.Condition()
+        self._keyed_queues = [collections.deque() for _ in range(self._workers_count)]
+        self._workers = [asyncio.create_task(self._work(i)) for i in range(self._workers_count)]
+
+    async def submit(self, job: _Job, key: Optional[Hashable] = None) -> asyncio.Future[Any]:
+        """
+        Put job into the queue and return future of its result.
+        Waits while the queue is full.
+
+        :param job: coroutine function without arguments
+        :param key: jobs with the same key are executed sequentially in order of submission
+        """
+        self.start()
+        changed = cast(asyncio.Condition, self._changed)
+        future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+        async with changed:
+            await changed.wait_for(lambda: self._waiting < self._queue_size)
+            if key is None:
+                self._shared_queue.append((job, future))
+            else:
+                self._keyed_queues[hash(key) % self._workers_count].append((job, future))
+            self._waiting += 1
+            self._unfinished += 1
+            changed.notify_all()
+        return future
+
+    async def join(self) -> None:
+        """Wait until all submitted jobs are done"""
+        if not self.is_started:
+            return None
+        changed = cast(asyncio.Condition, self._changed)
+        async with changed:
+            await changed.wait_for(lambda: self._unfinished == 0)
+
+    async def close(self, drain: bool = True) -> None:
+        """
+        Stop workers
+
+        :param drain: wait for submitted jobs, otherwise they're cancelled
+        """
+        if not self.is_started:
+            return None
+        if drain:
+            await self.join()
+        for task in [*self._workers, *self._released]:
+            task.cancel()
+        for task in [*self._workers, *self._released]:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        for queue in [self._shared_queue, *self._keyed_queues]:
+            for _, future in queue:
+                future.cancel()
+        self._workers = []
+        self._released.clear()
+        self._keyed_queues = []
+        self._shared_queue.clear()
+        self._waiting = self._unfinished = 0
+
+    async def _work(self, index: int) -> None:
+        changed = cast(asyncio.Condition, self._changed)
+        keyed_queue = self._keyed_queues[index]
+        while True:
+            async with changed:
+                await changed.wait_for(lambda: bool(keyed_queue or self._shared_queue))
+                job, future = (keyed_queue or self._shared_queue).popleft()
+                self._waiting -= 1
+                # place in the queue is free now
+                changed.notify_all()
+            if future.cancelled():
+                # job was abandoned while it was waiting in the queue
+                await self._finish()
+                continue
+            released = asyncio.get_running_loop().create_future()
+            execution = asyncio.ensure_future(self._execute(job, future, released))
+            try:
+                await asyncio.wait([execution, released], return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                execution.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await execution
+                raise
+            if execution.done():
+                await self._finish()
+                continue
+            finishing = asyncio.ensure_future(self._finish_released(execution))
+            self._released.add(finishing)
+            finishing.add_done_callback(self._released.discard)
+
+    async def _finish_released(self, execution: asyncio.Future[None]) -> None:
+        try:
+            await execution
+        finally:
+            await self._finish()
+
+    async def _finish(self) -> None:
+        changed = cast(asyncio.Condition, self._changed)
+        async with changed:
+            self._unfinished -= 1
+            changed.notify_all()
+
+    @staticmethod
+    async def _execute(
+        job: _Job, future: asyncio.Future[Any], released: asyncio.Future[None]
+    ) -> None:
+        def release() -> None:
+            if not released.done():
+                released.set_result(None)
+
+        # job runs in its own task, so the variable is seen only by this job
+        _worker_release.set(release)
+        try:
+            result = await job()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as ex:
+            if not future.cancelled():
+                future.set_exception(ex)
+        else:
+            if not future.cancelled():
+                future.set_result(result)
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from glQiwiApi.core.event_fetching.dispatcher import BaseDispatcher
+from glQiwiApi.core.event_fetching.executor import (
+    DEFAULT_MAX_TIMEOUT,
+    DEFAULT_TIMEOUT,
+    WALLET_CTX_KEY,
+    BaseExecutor,
+    HandlerContext,
+    _EventHandlerType,
+    _parse_timeout,
+)
+from glQiwiApi.core.event_fetching.polling_interval import AdaptivePollingInterval
+from glQiwiApi.utils.pagination import DEFAULT_READ_AHEAD, iterate_pages
+from glQiwiApi.utils.synchronous import adapter
+from glQiwiApi.yoo_money.client import YooMoneyAPI
+from glQiwiApi.yoo_money.methods.operation_history import MAX_HISTORY_LIMIT
+from glQiwiApi.yoo_money.types import Operation
+
+logger = logging.getLogger('glQiwiApi.executor')
+
+
+class YooMoneyPollingExecutor(BaseExecutor):
+    """
+    Polls YooMoney operation history and feeds `YooMoneyDispatcher.operation_handler`.
+
+    Only operations since the latest seen one are requested, all pages of a burst
+    are fetched following `next_record`. Operation ids aren't ordered, so ids of operations
+    at the window start are remembered to not dispatch them twice.
+    """
+
+    def __init__(
+        self,
+        api: YooMoneyAPI,
+        dispatcher: BaseDispatcher,
+        context: HandlerContext,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        timeout: Union[float, int] = DEFAULT_TIMEOUT,
+        max_timeout: Union[float, int] = DEFAULT_MAX_TIMEOUT,
+        polling_interval: Optional[AdaptivePollingInterval] = None,
+        skip_updates: bool = False,
+        operation_types: Optional[Iterable[str]] = None,
+        history_read_ahead: int = DEFAULT_READ_AHEAD,
+        on_startup: Optional[_EventHandlerType] = None,
+        on_shutdown: Optional[_EventHandlerType] = None,
+    ) -> None:
+        """
+        :param api: YooMoney API client
+        :param timeout: interval between requests while new operations keep arriving
+        :param max_timeout: interval that polling backs off to when idle or on errors
+        :param polling_interval: custom scheduler of intervals, overrides `timeout`
+         and `max_timeout`
+        :param skip_updates: don't dispatch operations, that were made before the first request
+        :param operation_types: types of operations to poll, e.g. ``['deposition']``
+        :param history_read_ahead: number of history pages, that can be fetched in background
+        """
+        super().__init__(
+            dispatcher,
+            loop=loop,
+            on_startup=on_startup,
+            on_shutdown=on_shutdown,
+            context=context,
+        )
+        if polling_interval is None:
+            min_timeout = _parse_timeout(timeout)
+            polling_interval = AdaptivePollingInterval(
+                min_interval=min_timeout,
+                max_interval=max(_parse_timeout(max_timeout), min_timeout),
+            )
+        self._polling_interval = polling_interval
+        self._api = api
+        self.skip_updates = skip_updates
+        self.get_updates_from = datetime.now(timezone.utc)
+        if operation_types is not None:
+            # every request is made with the same types, so generator can't be passed through
+            operation_types = tuple(operation_types)
+        self._operation_types = operation_types
+        self._history_read_ahead = history_read_ahead
+        # ids of operations, that were made not earlier than `get_updates_from`
+        self._seen_operations: Dict[str, datetime] = {}
+
+        self._context[WALLET_CTX_KEY] = self._api
+
+    def start_polling(self) -> None:
+        try:
+            self.loop.create_task(self._run_infinite_polling())
+            adapter.run_forever_safe(self.loop)
+        except (SystemExit, KeyboardInterrupt):  # pragma: no cover
+            # allow graceful shutdown
+            pass
+
+    async def start_non_blocking_polling(self) -> asyncio.Task[None]:
+        return asyncio.create_task(self._run_infinite_polling())
+
+    async def _run_infinite_polling(self) -> None:
+        try:
+            await self.welcome()
+            while True:
+                try:
+                    new_updates_count = await self._try_fetch_new_updates()
+                    self._polling_interval.on_updates(new_updates_count)
+                    delay = self._polling_interval.next_delay()
+                except Exception as ex:
+                    self._polling_interval.on_error(ex)
+                    delay = self._polling_interval.next_delay()
+                    logger.error('Handle %r. Sleeping %.2f seconds', ex, delay)
+                await asyncio.sleep(delay)
+        finally:
+            await asyncio.shield(asyncio.gather(self.goodbye(), self._api.close()))
+
+    async def _try_fetch_new_updates(self) -> int:
+        """Returns count of new operations, that were dispatched"""
+        operations = await self._fetch_new_operations()
+        if self.skip_updates:
+            self.skip_updates = False
+            return 0
+        await asyncio.gather(
+            *(self._dispatcher.process_event(operation, self._context) for operation in operations)
+        )
+        return len(operations)
+
+    async def _fetch_new_operations(self) -> List[Operation]:
+        operations: Dict[str, Operation] = {}
+        async for page in iterate_pages(
+            functools.partial(self._fetch_history_page, start_date=self.get_updates_from),
+            read_ahead=self._history_read_ahead,
+        ):
+            for operation in page:
+                if operation.id not in self._seen_operations:
+                    operations[operation.id] = operation
+
+        new_operations = sorted(operations.values(), key=lambda op: op.operation_date)
+        if new_operations:
+            self._advance_window(new_operations)
+        return new_operations
+
+    async def _fetch_history_page(
+        self, start_record: Optional[int], start_date: datetime
+    ) -> Tuple[List[Operation], Optional[int]]:
+        history = await self._api.operation_history(
+            operation_types=self._operation_types,
+            start_date=start_date,
+            start_record=start_record,
+            records=MAX_HISTORY_LIMIT,
+        )
+        return history.operations, history.next_record
+
+    def _advance_window(self, new_operations: List[Operation]) -> None:
+        for operation in new_operations:
+            self._seen_operations[operation.id] = operation.operation_date
+        # history is requested since the latest operation inclusively,
+        # so only ids of operations made at that moment are needed to skip duplicates
+        self.get_updates_from = max(self.get_updates_from, new_operations[-1].operation_date)
+        self._seen_operations = {
+            operation_id: operation_date
+            for operation_id, operation_date in self._seen_operations.items()
+            if operation_date >= self.get_updates_from
+        }
@@ -1,17 +1,35 @@
+import asyncio
+import dataclasses
 import logging
-from typing import Any, Dict, Optional, TypeVar, cast
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Type, TypeVar, cast
 
 from aiohttp.typedefs import LooseCookies
 
 from glQiwiApi.core.abc.api_method import APIMethod
-from glQiwiApi.core.cache.cached_types import CachedAPIRequest, Payload
+from glQiwiApi.core.cache.cached_types import (
+    CachedAPIError,
+    CachedAPIRequest,
+    NegativeCachingPolicy,
+    Payload,
+)
+from glQiwiApi.core.cache.constants import CACHED_METHOD_KEY_PREFIX, NEGATIVE_CACHE_KEY_PREFIX
 from glQiwiApi.core.cache.storage import CacheStorage
+from glQiwiApi.core.cache.utils import make_request_fingerprint
 from glQiwiApi.core.session.holder import AbstractSessionHolder, AiohttpSessionHolder, HTTPResponse
 from glQiwiApi.utils.compat import Protocol
 from glQiwiApi.utils.payload import make_payload
 
 T = TypeVar('T')
 
+logger = logging.getLogger('glQiwiApi.request_service')
+
+# raw response of API method is reported to this listener, so that cache decorator
+# can keep it, while the call goes through the whole chain of wrapped request services
+_response_listener: ContextVar[Optional[Callable[[HTTPResponse], None]]] = ContextVar(
+    '_response_listener', default=None
+)
+
 
 class RequestServiceProto(Protocol):
     async def execute_api_method(self, method: APIMethod[T], **url_kw: Any) -> T:
@@ -66,6 +84,9 @@ class RequestService:
             headers=request.headers,
             json=request.json_payload,
         )
+        listener = _response_listener.get()
+        if listener is not None:
+            listener(raw_http_response)
         return method.parse_http_response(raw_http_response)
 
     async def get_json_content(
@@ -155,12 +176,90 @@ class RequestServiceCacheDecorator(RequestServiceProto):
         self,
         request_service: RequestServiceProto,
         cache_storage: CacheStorage,
+        negative_caching_policy: Optional[NegativeCachingPolicy] = None,
+        cacheable_methods: Iterable[Type[APIMethod[Any]]] = (),
     ) -> None:
+        """
+        :param request_service:
+        :param cache_storage:
+        :param negative_caching_policy: if passed, permanent errors (e.g. 404) of API methods
+         are cached for a short time and re-raised without reaching API
+        :param cacheable_methods: types of API methods, which responses are served from cache
+         storage. Methods that were passed on to `prefetch` become cacheable as well.
+        """
         self._cache = cache_storage
         self._request_service = request_service
+        self._negative_caching_policy = negative_caching_policy
+        self._cacheable_methods: Set[Type[APIMethod[Any]]] = set(cacheable_methods)
 
     async def execute_api_method(self, method: APIMethod[T], **url_kw: Any) -> T:
-        return await self._request_service.execute_api_method(method, **url_kw)
+        is_cacheable = type(method) in self._cacheable_methods
+        if not is_cacheable and self._negative_caching_policy is None:
+            return await self._request_service.execute_api_method(method, **url_kw)
+
+        request = method.build_request(**url_kw)
+        label = method.__class__.__name__
+
+        response_key = make_request_fingerprint(request, CACHED_METHOD_KEY_PREFIX, label)
+        if is_cacheable:
+            cached_response = await self._cache.retrieve(response_key)
+            if isinstance(cached_response, HTTPResponse):
+                # parsing may patch response object, so cached one is kept untouched
+                return method.parse_http_response(dataclasses.replace(cached_response))
+
+        error_key = make_request_fingerprint(request, NEGATIVE_CACHE_KEY_PREFIX, label)
+        if self._negative_caching_policy is not None:
+            cached_error = await self._cache.retrieve(error_key)
+            if isinstance(cached_error, CachedAPIError):
+                raise cached_error.to_exception()
+
+        try:
+            if is_cacheable:
+                return await self._fetch_and_cache(method, response_key, **url_kw)
+            return await self._request_service.execute_api_method(method, **url_kw)
+        except Exception as ex:
+            policy = self._negative_caching_policy
+            if policy is not None and policy.should_cache(ex):
+                await self._cache.update(**{error_key: policy.wrap(ex)})
+            raise
+
+    async def prefetch(self, *methods: APIMethod[Any], **url_kw: Any) -> None:
+        """
+        Warm up cache by executing API methods concurrently, so that subsequent calls
+        of these methods are served from cache storage. Failed methods are only logged,
+        because warm-up must not prevent application from starting.
+
+        Responses expire according to invalidation strategy of cache storage, so storage
+        without strategy (or with infinite cache time) serves them until it's cleared.
+
+        :param methods: API methods to execute
+        :param url_kw: values for url placeholders, e.g. phone_number for wallet methods
+        """
+        self._cacheable_methods.update(type(method) for method in methods)
+        results = await asyncio.gather(
+            *(self.execute_api_method(method, **url_kw) for method in methods),
+            return_exceptions=True,
+        )
+        for method, result in zip(methods, results):
+            if isinstance(result, Exception):
+                logger.warning('Failed to prefetch %s: %r', method.__class__.__name__, result)
+
+    async def _fetch_and_cache(self, method: APIMethod[T], key: str, **url_kw: Any) -> T:
+        # method is executed by wrapped request service, so its decorators aren't skipped
+        responses: List[HTTPResponse] = []
+        token = _response_listener.set(responses.append)
+        try:
+            result = await self._request_service.execute_api_method(method, **url_kw)
+        finally:
+            _response_listener.reset(token)
+        if not responses:
+            logger.debug('Raw response of %s is not reported, so it is not cached', key)
+            return result
+        response = responses[-1]
+        await self._cache.update(
+            **{key: dataclasses.replace(response, headers=dict(response.headers))}
+        )
+        return result
 
     async def get_json_content(
         self,
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from contextlib import suppress
 from datetime import datetime
-from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 from glQiwiApi.core.abc.base_api_client import BaseAPIClient, RequestServiceFactoryType
 from glQiwiApi.core.request_service import RequestService, RequestServiceProto
@@ -51,6 +51,7 @@ from glQiwiApi.qiwi.clients.wallet.methods.webhook.send_test_notification import
 )
 from glQiwiApi.types.amount import AmountWithCurrency
 from glQiwiApi.types.arbitrary import File
+from glQiwiApi.utils.pagination import DEFAULT_READ_AHEAD, iterate_items
 from glQiwiApi.utils.validators import PhoneNumber, String
 
 from ...exceptions import QiwiAPIError
@@ -260,6 +261,57 @@ class QiwiWallet(BaseAPIClient):
             phone_number=self.phone_number_without_plus_sign,
         )
 
+    async def iter_history(
+        self,
+        rows: int = MAX_HISTORY_LIMIT,
+        transaction_type: TransactionType = TransactionType.ALL,
+        sources: Optional[List[Source]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        read_ahead: int = DEFAULT_READ_AHEAD,
+    ) -> AsyncIterator[Transaction]:
+        """
+        [ NON API METHOD ]
+
+        Iterate over the whole history following next_txn_id/next_txn_date cursors.
+        Next page is requested in background while you process the current one.
+
+        >>> async for transaction in wallet.iter_history(start_date=..., end_date=...):
+        ...     print(transaction.id)
+
+        :param rows: number of transactions in one page
+        :param transaction_type: The type of operations in the report for selection.
+        :param sources: List of payment sources, for filter
+        :param start_date: The starting date for searching for payments.
+         Used only in conjunction with end_date.
+        :param end_date: the end date of the search for payments.
+         Used only in conjunction with start_date.
+        :param read_ahead: number of pages that can be fetched ahead of processing, 0 disables it
+        """
+
+        async def fetch_page(
+            cursor: Optional[Tuple[int, datetime]]
+        ) -> Tuple[List[Transaction], Optional[Tuple[int, datetime]]]:
+            next_txn_id, next_txn_date = cursor or (None, None)
+            history = await self.history(
+                rows=rows,
+                transaction_type=transaction_type,
+                sources=sources,
+                start_date=start_date,
+                end_date=end_date,
+                next_txn_id=next_txn_id,
+                next_txn_date=next_txn_date,
+            )
+            if history.next_transaction_id is None or history.next_transaction_date is None:
+                return history.transactions, None
+            return history.transactions, (
+                history.next_transaction_id,
+                history.next_transaction_date,
+            )
+
+        async for transaction in iterate_items(fetch_page, read_ahead):
+            yield transaction
+
     async def check_whether_transaction_exists(
         self, check_fn: Callable[[Transaction], bool], rows_num: int = MAX_HISTORY_LIMIT
     ) -> bool:
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import bisect
+import hashlib
+from typing import Dict, Generic, Hashable, Iterable, List, Tuple, TypeVar
+
+Node = TypeVar('Node', bound=Hashable)
+
+DEFAULT_REPLICAS = 100
+
+
+class ConsistentHashRing(Generic[Node]):
+    """
+    Maps keys to nodes so that adding or removing a node moves
+    only about 1/N of keys, the rest of keys stay on their nodes.
+    """
+
+    def __init__(self, nodes: Iterable[Node], replicas: int = DEFAULT_REPLICAS) -> None:
+        """
+        :param nodes: nodes to place on the ring, their str() must be unique
+        :param replicas: number of virtual points of every node,
+         more points give more even distribution
+        """
+        if replicas < 1:
+            raise ValueError('Number of replicas must be positive')
+        self._replicas = replicas
+        self._points: List[Tuple[int, Node]] = []
+        for node in nodes:
+            self.add_node(node)
+
+    def __len__(self) -> int:
+        return len(self._points) // self._replicas
+
+    def add_node(self, node: Node) -> None:
+        for replica in range(self._replicas):
+            bisect.insort(self._points, (_hash(f'{node}#{replica}'), node))
+
+    def remove_node(self, node: Node) -> None:
+        self._points = [point for point in self._points if point[1] != node]
+
+    def get_node(self, key: str) -> Node:
+        if not self._points:
+            raise LookupError('Ring has no nodes')
+        index = bisect.bisect(self._points, (_hash(key),))
+        return self._points[index % len(self._points)][1]
+
+    def distribute(self, keys: Iterable[str]) -> Dict[Node, List[str]]:
+        distribution: Dict[Node, List[str]] = {}
+        for key in keys:
+            distribution.setdefault(self.get_node(key), []).append(key)
+        return distribution
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
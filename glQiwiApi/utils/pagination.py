@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from typing import AsyncIterator, Awaitable, Callable, Generic, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+Cursor = TypeVar('Cursor')
+
+# takes cursor of the page (None for the first one) and returns items with cursor of the next page
+PageFetcher = Callable[[Optional[Cursor]], Awaitable[Tuple[List[T], Optional[Cursor]]]]
+
+DEFAULT_READ_AHEAD = 1
+
+
+class _Page(Generic[T]):
+    __slots__ = ('items', 'error')
+
+    def __init__(self, items: List[T], error: Optional[BaseException] = None) -> None:
+        self.items = items
+        self.error = error
+
+
+async def iterate_pages(
+    fetch_page: PageFetcher[Cursor, T], read_ahead: int = DEFAULT_READ_AHEAD
+) -> AsyncIterator[List[T]]:
+    """
+    Follow cursors and yield pages one by one.
+
+    Cursor of the next page is known only when previous page arrived, so requests
+    are still sequential, but with `read_ahead` > 0 they are done in background task
+    that keeps up to `read_ahead` pages buffered while consumer processes the current one.
+    Thus, long scans are bound by processing rather than by network round-trips.
+
+    :param fetch_page: coroutine function that takes cursor and returns items and next cursor
+    :param read_ahead: number of pages that can be fetched ahead of consumer,
+     0 disables background fetching
+    """
+    if read_ahead < 0:
+        raise ValueError('read_ahead cannot be negative')
+
+    if read_ahead == 0:
+        cursor: Optional[Cursor] = None
+        while True:
+            items, cursor = await fetch_page(cursor)
+            if items:
+                yield items
+            if not items or cursor is None:
+                return
+
+    pages: asyncio.Queue[Optional[_Page[T]]] = asyncio.Queue()
+    # page is fetched only when there is a free slot, slot is freed when consumer takes a page
+    free_slots = asyncio.Semaphore(read_ahead)
+
+    async def produce() -> None:
+        cursor: Optional[Cursor] = None
+        try:
+            while True:
+                await free_slots.acquire()
+                items, cursor = await fetch_page(cursor)
+                if items:
+                    pages.put_nowait(_Page(items))
+                if not items or cursor is None:
+                    break
+        except Exception as ex:
+            pages.put_nowait(_Page([], error=ex))
+            return
+        pages.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            page = await pages.get()
+            free_slots.release()
+            if page is None:
+                return
+            if page.error is not None:
+                raise page.error
+            yield page.items
+    finally:
+        producer.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await producer
+
+
+async def iterate_items(
+    fetch_page: PageFetcher[Cursor, T], read_ahead: int = DEFAULT_READ_AHEAD
+) -> AsyncIterator[T]:
+    async for page in iterate_pages(fetch_page, read_ahead):
+        for item in page:
+            yield item
@@ -7,11 +7,12 @@ from __future__ import annotations
 import asyncio
 import typing
 from datetime import datetime
-from typing import Any, Dict, Iterable, List, Optional, Union
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
 
 from glQiwiApi.core.abc.base_api_client import BaseAPIClient, RequestServiceFactoryType
 from glQiwiApi.core.request_service import RequestService, RequestServiceProto
 from glQiwiApi.core.session import AiohttpSessionHolder
+from glQiwiApi.utils.pagination import DEFAULT_READ_AHEAD, iterate_items
 from glQiwiApi.utils.payload import make_payload
 from glQiwiApi.utils.validators import String
 from glQiwiApi.yoo_money.methods.acccept_incoming_transfer import AcceptIncomingTransfer
@@ -19,7 +20,7 @@ from glQiwiApi.yoo_money.methods.build_auth_url import BuildAuthURL
 from glQiwiApi.yoo_money.methods.get_access_token import GetAccessToken
 from glQiwiApi.yoo_money.methods.make_cellular_payment import MakeCellularPayment
 from glQiwiApi.yoo_money.methods.operation_details import OperationDetailsMethod
-from glQiwiApi.yoo_money.methods.operation_history import OperationHistoryMethod
+from glQiwiApi.yoo_money.methods.operation_history import MAX_HISTORY_LIMIT, OperationHistoryMethod
 from glQiwiApi.yoo_money.methods.process_payment import ProcessPayment
 from glQiwiApi.yoo_money.methods.reject_incoming_transfer import RejectIncomingTransfer
 from glQiwiApi.yoo_money.methods.request_payment import RequestPayment
@@ -28,6 +29,7 @@ from glQiwiApi.yoo_money.methods.revoke_api_token import RevokeAPIToken
 from glQiwiApi.yoo_money.types import (
     AccountInfo,
     IncomingTransaction,
+    Operation,
     OperationDetails,
     OperationHistory,
     Payment,
@@ -279,6 +281,51 @@ class YooMoneyAPI(BaseAPIClient):
             )
         )
 
+    async def iter_operations(
+        self,
+        operation_types: Optional[Iterable[str]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        records: int = MAX_HISTORY_LIMIT,
+        label: Optional[Union[str, int]] = None,
+        in_detail: bool = False,
+        read_ahead: int = DEFAULT_READ_AHEAD,
+    ) -> AsyncIterator[Operation]:
+        """
+        [ NON API METHOD ]
+
+        Iterate over the whole operation history following next_record cursor.
+        Next page is requested in background while you process the current one.
+
+        :param operation_types: Operation type
+        :param start_date: Show operations from the moment in time
+        :param end_date: Output operations up to the point in time
+        :param records: The number of records in one page, from 1 to 100
+        :param label: Selection of payments by tag value.
+        :param in_detail:
+        :param read_ahead: number of pages that can be fetched ahead of processing, 0 disables it
+        """
+        if operation_types is not None:
+            # the same types are sent with every page, so iterator must not be exhausted
+            operation_types = tuple(operation_types)
+
+        async def fetch_page(
+            start_record: Optional[int],
+        ) -> Tuple[List[Operation], Optional[int]]:
+            history = await self.operation_history(
+                operation_types=operation_types,
+                start_date=start_date,
+                end_date=end_date,
+                start_record=start_record,
+                records=records,
+                label=label,
+                in_detail=in_detail,
+            )
+            return history.operations, history.next_record
+
+        async for operation in iterate_items(fetch_page, read_ahead):
+            yield operation
+
     async def operation_details(self, operation_id: Union[int, str]) -> OperationDetails:
         """
         Allows you to get detailed information about the operation from the history.
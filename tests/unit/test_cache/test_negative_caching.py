@@ -0,0 +1,74 @@
+from typing import Any
+
+import pytest
+
+from glQiwiApi.core.abc.api_method import APIMethod
+from glQiwiApi.core.cache import InMemoryCacheStorage, NegativeCachingPolicy
+from glQiwiApi.core.request_service import RequestServiceCacheDecorator
+from glQiwiApi.core.session.holder import HTTPResponse
+from glQiwiApi.qiwi.clients.p2p.methods.get_bill_by_id import GetBillByID
+from glQiwiApi.qiwi.exceptions import ObjectNotFoundError, QiwiAPIError
+
+pytestmark = pytest.mark.asyncio
+
+
+class RequestServiceStub:
+    def __init__(self, status_code: int) -> None:
+        self.calls = 0
+        self._status_code = status_code
+
+    async def execute_api_method(self, method: APIMethod[Any], **url_kw: Any) -> Any:
+        self.calls += 1
+        response = HTTPResponse(
+            status_code=self._status_code,
+            body=b'{"errorCode": "api.invoice.not.found"}',
+            headers={},
+            content_type='application/json',
+        )
+        QiwiAPIError(response).raise_exception_matching_error_code()
+
+
+@pytest.mark.parametrize('ttl', [30, 0])
+async def test_not_found_error_is_cached(ttl: float):
+    stub = RequestServiceStub(status_code=404)
+    request_service = RequestServiceCacheDecorator(
+        stub,  # type: ignore
+        InMemoryCacheStorage(),
+        negative_caching_policy=NegativeCachingPolicy(ttl=ttl),
+    )
+
+    for _ in range(3):
+        with pytest.raises(ObjectNotFoundError):
+            await request_service.execute_api_method(GetBillByID(bill_id='unknown'))
+
+    assert stub.calls == (1 if ttl else 3)
+
+
+async def test_other_errors_are_not_cached():
+    stub = RequestServiceStub(status_code=500)
+    request_service = RequestServiceCacheDecorator(
+        stub,  # type: ignore
+        InMemoryCacheStorage(),
+        negative_caching_policy=NegativeCachingPolicy(),
+    )
+
+    for _ in range(2):
+        with pytest.raises(QiwiAPIError):
+            await request_service.execute_api_method(GetBillByID(bill_id='unknown'))
+
+    assert stub.calls == 2
+
+
+async def test_different_requests_have_different_keys():
+    stub = RequestServiceStub(status_code=404)
+    request_service = RequestServiceCacheDecorator(
+        stub,  # type: ignore
+        InMemoryCacheStorage(),
+        negative_caching_policy=NegativeCachingPolicy(),
+    )
+
+    for bill_id in ('first', 'second'):
+        with pytest.raises(ObjectNotFoundError):
+            await request_service.execute_api_method(GetBillByID(bill_id=bill_id))
+
+    assert stub.calls == 2
@@ -0,0 +1,153 @@
+import asyncio
+import stat
+from pathlib import Path
+from typing import Any, Optional
+
+import pytest
+
+from glQiwiApi.core.cache import (
+    CacheInvalidationByTimerStrategy,
+    InMemoryCacheStorage,
+    SQLiteCacheStorage,
+)
+from glQiwiApi.core.cache.cached_types import CachedAPIRequest, Payload
+from glQiwiApi.core.cache.snapshot import encode_snapshot, run_periodic_snapshots
+from glQiwiApi.core.request_service import (
+    RequestService,
+    RequestServiceCacheDecorator,
+    RequestServiceLoggingDecorator,
+)
+from glQiwiApi.core.session.holder import HTTPResponse
+from glQiwiApi.qiwi.clients.wallet.methods.get_cross_rates import GetCrossRates
+
+pytestmark = pytest.mark.asyncio
+
+CROSS_RATES_RESPONSE = HTTPResponse(
+    status_code=200,
+    body=b'{"result": [{"from": "643", "to": "840", "rate": 0.013}]}',
+    headers={'Content-Type': 'application/json'},
+    content_type='application/json',
+)
+
+
+class RequestServiceStub(RequestService):
+    def __init__(self) -> None:
+        super().__init__()
+        self.calls = 0
+
+    async def send_request(self, url: str, method: str, **kwargs: Any) -> HTTPResponse:
+        self.calls += 1
+        return CROSS_RATES_RESPONSE
+
+
+async def test_restore_in_memory_storage_snapshot(tmp_path: Path):
+    storage = InMemoryCacheStorage()
+    await storage.update(x={'hello': 'world'}, response=CROSS_RATES_RESPONSE)
+    await storage.dump_snapshot(tmp_path / 'snapshot.json')
+
+    restored_storage = InMemoryCacheStorage()
+    assert await restored_storage.restore_snapshot(tmp_path / 'snapshot.json') == 2
+    assert await restored_storage.retrieve('x') == {'hello': 'world'}
+    assert await restored_storage.retrieve('response') == CROSS_RATES_RESPONSE
+
+
+async def test_request_headers_are_not_saved(tmp_path: Path):
+    storage = InMemoryCacheStorage()
+    payload = Payload(headers={'Authorization': 'Bearer secret'}, params={'rows': 50})
+    await storage.update(url=CachedAPIRequest(payload=payload, response={}, method='GET'))
+    await storage.dump_snapshot(tmp_path / 'snapshot.json')
+
+    assert 'secret' not in (tmp_path / 'snapshot.json').read_text()
+    assert stat.S_IMODE((tmp_path / 'snapshot.json').stat().st_mode) == 0o600
+
+    restored_storage = InMemoryCacheStorage()
+    headers = {'Authorization': 'Bearer new'}
+    await restored_storage.restore_snapshot(tmp_path / 'snapshot.json', request_headers=headers)
+    restored = await restored_storage.retrieve('url')
+    assert restored.payload.headers == headers
+    assert restored.payload.params == {'rows': 50}
+
+
+async def test_restore_sqlite_storage_snapshot(tmp_path: Path):
+    storage = SQLiteCacheStorage(tmp_path / 'first.sqlite3')
+    restored_storage = SQLiteCacheStorage(tmp_path / 'second.sqlite3')
+    try:
+        await storage.update(x=[1, 2, 3])
+        await storage.dump_snapshot(tmp_path / 'snapshot.json')
+        assert await restored_storage.restore_snapshot(tmp_path / 'snapshot.json') == 1
+        assert await restored_storage.retrieve('x') == [1, 2, 3]
+    finally:
+        await storage.close()
+        await restored_storage.close()
+
+
+async def test_expired_entries_are_not_restored(tmp_path: Path):
+    (tmp_path / 'snapshot.json').write_bytes(encode_snapshot([('old', 1, 59.95), ('new', 2, 0)]))
+    storage = InMemoryCacheStorage(CacheInvalidationByTimerStrategy(cache_time_in_seconds=60))
+
+    await asyncio.sleep(0.1)
+
+    assert await storage.restore_snapshot(tmp_path / 'snapshot.json') == 1
+    assert await storage.retrieve('old') is None
+    assert await storage.retrieve('new') == 2
+
+
+async def test_restore_missing_snapshot(tmp_path: Path):
+    assert await InMemoryCacheStorage().restore_snapshot(tmp_path / 'missing.json') == 0
+
+
+async def test_snapshot_is_dumped_on_cancellation(tmp_path: Path):
+    storage = InMemoryCacheStorage()
+    await storage.update(x=1)
+    task = asyncio.create_task(run_periodic_snapshots(storage, tmp_path / 'snapshot.json', 60))
+    await asyncio.sleep(0)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert (tmp_path / 'snapshot.json').exists()
+
+
+@pytest.mark.parametrize('restore', [False, True])
+async def test_prefetched_methods_are_served_from_cache(tmp_path: Path, restore: bool):
+    stub = RequestServiceStub()
+    storage = InMemoryCacheStorage()
+    request_service = RequestServiceCacheDecorator(stub, storage)  # type: ignore
+    await request_service.prefetch(GetCrossRates())
+
+    if restore:
+        await storage.dump_snapshot(tmp_path / 'snapshot.json')
+        storage = InMemoryCacheStorage()
+        await storage.restore_snapshot(tmp_path / 'snapshot.json')
+        request_service = RequestServiceCacheDecorator(
+            stub, storage, cacheable_methods=[GetCrossRates]  # type: ignore
+        )
+
+    for _ in range(3):
+        rates = await request_service.execute_api_method(GetCrossRates())
+        assert rates[0].rate == 0.013
+
+    assert stub.calls == 1
+
+
+async def test_prefetch_goes_through_wrapped_request_service(caplog: pytest.LogCaptureFixture):
+    stub = RequestServiceStub()
+    request_service = RequestServiceCacheDecorator(
+        RequestServiceLoggingDecorator(stub), InMemoryCacheStorage()
+    )
+    with caplog.at_level('DEBUG', logger='glQiwiApi.request_service'):
+        await request_service.prefetch(GetCrossRates())
+        await request_service.execute_api_method(GetCrossRates())
+
+    assert 'GetCrossRates was executed successfully' in caplog.text
+    assert stub.calls == 1
+
+
+async def test_failed_prefetch_does_not_raise(caplog: pytest.LogCaptureFixture):
+    class FailingStub(RequestService):
+        async def send_request(self, *args: Any, **kwargs: Any) -> Optional[HTTPResponse]:
+            raise ConnectionError()
+
+    stub = FailingStub()
+    request_service = RequestServiceCacheDecorator(stub, InMemoryCacheStorage())  # type: ignore
+    await request_service.prefetch(GetCrossRates())
+    assert 'Failed to prefetch GetCrossRates' in caplog.text
@@ -0,0 +1,67 @@
+import asyncio
+from pathlib import Path
+from typing import AsyncIterator
+
+import pytest
+import pytest_asyncio
+
+from glQiwiApi.core.cache import CacheInvalidationByTimerStrategy, SQLiteCacheStorage
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture(name='storage')
+async def storage_fixture(tmp_path: Path) -> AsyncIterator[SQLiteCacheStorage]:
+    storage = SQLiteCacheStorage(tmp_path / 'cache.sqlite3')
+    yield storage
+    await storage.close()
+
+
+async def test_update_and_retrieve(storage: SQLiteCacheStorage):
+    await storage.update(x={'hello': 'world'})
+    assert await storage.retrieve('x') == {'hello': 'world'}
+    assert await storage.retrieve('y') is None
+
+
+async def test_storage_is_shared_between_instances(tmp_path: Path):
+    first = SQLiteCacheStorage(tmp_path / 'cache.sqlite3')
+    second = SQLiteCacheStorage(tmp_path / 'cache.sqlite3')
+    try:
+        await first.update(x=5)
+        assert await second.retrieve('x') == 5
+        await second.delete('x')
+        assert await first.retrieve('x') is None
+    finally:
+        await first.close()
+        await second.close()
+
+
+async def test_expired_entry_is_evicted(tmp_path: Path):
+    storage = SQLiteCacheStorage(
+        tmp_path / 'cache.sqlite3',
+        invalidate_strategy=CacheInvalidationByTimerStrategy(cache_time_in_seconds=0.1),
+    )
+    try:
+        await storage.update(x=5)
+        await asyncio.sleep(0.1)
+        assert await storage.retrieve('x') is None
+        assert await storage.retrieve_all() == []
+    finally:
+        await storage.close()
+
+
+async def test_oldest_entries_are_evicted_when_size_is_exceeded(tmp_path: Path):
+    storage = SQLiteCacheStorage(tmp_path / 'cache.sqlite3', max_entries=2)
+    try:
+        for key in ('a', 'b', 'c'):
+            await storage.update(**{key: key})
+        assert await storage.retrieve('a') is None
+        assert sorted(await storage.retrieve_all()) == ['b', 'c']
+    finally:
+        await storage.close()
+
+
+async def test_clear(storage: SQLiteCacheStorage):
+    await storage.update(x=1, y=2)
+    await storage.clear()
+    assert await storage.retrieve_all() == []
@@ -0,0 +1,81 @@
+import asyncio
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+
+from glQiwiApi.core.cache import (
+    CacheInvalidationByTimerStrategy,
+    CacheStats,
+    InMemoryCacheStorage,
+    SQLiteCacheStorage,
+)
+from glQiwiApi.core.cache.stats import default_key_label
+
+pytestmark = pytest.mark.asyncio
+
+
+class SinkStub:
+    def __init__(self) -> None:
+        self.increments: List[Tuple[str, str]] = []
+        self.gauges: List[Tuple[str, float]] = []
+
+    def increment(self, metric: str, label: str, value: int = 1) -> None:
+        self.increments.append((metric, label))
+
+    def gauge(self, metric: str, value: float) -> None:
+        self.gauges.append((metric, value))
+
+
+async def test_in_memory_storage_counts_hits_misses_and_expirations():
+    sink = SinkStub()
+    storage = InMemoryCacheStorage(
+        CacheInvalidationByTimerStrategy(cache_time_in_seconds=0.1), stats=CacheStats(sink)
+    )
+    await storage.update(x=5)
+
+    assert await storage.retrieve('x') == 5
+    assert await storage.retrieve('y') is None
+    await asyncio.sleep(0.1)
+    assert await storage.retrieve('x') is None
+
+    stats = await storage.get_stats()
+    assert stats.counters['x'].hits == 1
+    assert stats.counters['x'].misses == 1
+    assert stats.counters['x'].expirations == 1
+    assert stats.counters['y'].misses == 1
+    assert stats.total.hit_ratio == pytest.approx(1 / 3)
+    assert stats.entries == 0
+    assert ('hits', 'x') in sink.increments
+    assert ('entries', 0) in sink.gauges
+
+
+async def test_retrieve_all_does_not_return_coroutines():
+    storage = InMemoryCacheStorage()
+    await storage.update(x=5, y=6)
+    assert sorted(await storage.retrieve_all()) == [5, 6]
+
+
+async def test_sqlite_storage_counts_evictions_and_measures_size(tmp_path: Path):
+    storage = SQLiteCacheStorage(tmp_path / 'cache.sqlite3', max_entries=1)
+    try:
+        await storage.update(a='a')
+        await storage.update(b='b')
+
+        stats = await storage.get_stats()
+        assert stats.counters['a'].evictions == 1
+        assert stats.entries == 1
+        assert stats.size_in_bytes > 0
+    finally:
+        await storage.close()
+
+
+def test_endpoints_are_grouped_by_route():
+    first = 'https://edge.qiwi.com/payment-history/v2/persons/79001112233/payments?rows=50'
+    second = 'https://edge.qiwi.com/payment-history/v2/persons/79004445566/payments?rows=10'
+
+    assert default_key_label(first) == default_key_label(second)
+    route = 'https://edge.qiwi.com/payment-history/v2/persons/{id}/payments'
+    assert default_key_label(first) == route
+    assert default_key_label('method:GetBalance:abc123') == 'method:GetBalance'
+    assert default_key_label('x1') == 'x1'
@@ -0,0 +1,178 @@
+import asyncio
+import functools
+import time
+from typing import Dict, List
+
+import async_timeout
+import pytest
+
+from glQiwiApi.core.event_fetching.dispatcher import BatchEventHandler, QiwiDispatcher
+from glQiwiApi.core.event_fetching.executor import HandlerContext
+from glQiwiApi.core.event_fetching.worker_pool import WorkerPool
+from glQiwiApi.qiwi.clients.wallet.types import Transaction
+
+
+def make_transactions(transaction: Transaction, count: int) -> List[Transaction]:
+    return [transaction.copy(update={'id': i}) for i in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_batch_is_flushed_when_it_is_full(transaction: Transaction):
+    dp = QiwiDispatcher()
+    batches: List[List[int]] = []
+
+    @dp.transaction_handler.batch(max_batch_size=3, max_latency=10)
+    async def save_transactions(txns: List[Transaction], ctx: HandlerContext):
+        batches.append([txn.id for txn in txns])
+
+    context = HandlerContext()
+    async with async_timeout.timeout(1):
+        await asyncio.gather(
+            *(dp.process_event(txn, context) for txn in make_transactions(transaction, 6))
+        )
+
+    assert batches == [[0, 1, 2], [3, 4, 5]]
+
+
+@pytest.mark.asyncio
+async def test_incomplete_batch_is_flushed_after_max_latency(transaction: Transaction):
+    dp = QiwiDispatcher()
+    batches: List[List[int]] = []
+
+    @dp.transaction_handler.batch(max_batch_size=100, max_latency=0.02)
+    async def save_transactions(txns: List[Transaction]):
+        batches.append([txn.id for txn in txns])
+
+    started_at = time.monotonic()
+    await asyncio.gather(*(dp.process_event(txn) for txn in make_transactions(transaction, 2)))
+
+    assert batches == [[0, 1]]
+    assert time.monotonic() - started_at >= 0.02
+
+
+@pytest.mark.asyncio
+async def test_filters_are_applied_to_every_event(transaction: Transaction):
+    dp = QiwiDispatcher()
+    batches: List[List[int]] = []
+    handled_one_by_one: List[int] = []
+
+    @dp.transaction_handler.batch(lambda txn: txn.id % 2 == 0, max_latency=0.01)
+    async def save_transactions(txns: List[Transaction]):
+        batches.append([txn.id for txn in txns])
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction):
+        handled_one_by_one.append(txn.id)
+
+    await asyncio.gather(*(dp.process_event(txn) for txn in make_transactions(transaction, 4)))
+
+    assert batches == [[0, 2]]
+    assert handled_one_by_one == [1, 3]
+
+
+@pytest.mark.asyncio
+async def test_failures_of_items_are_passed_to_exception_handler(transaction: Transaction):
+    dp = QiwiDispatcher()
+    errors: List[str] = []
+
+    @dp.transaction_handler.batch(max_batch_size=3)
+    async def save_transactions(txns: List[Transaction]) -> Dict[int, Exception]:
+        return {1: ValueError(f'duplicate {txns[1].id}')}
+
+    @dp.exception_handler()
+    async def handle_exception(exception: Exception):
+        errors.append(str(exception))
+
+    await asyncio.gather(*(dp.process_event(txn) for txn in make_transactions(transaction, 3)))
+
+    assert errors == ['duplicate 1']
+
+
+@pytest.mark.asyncio
+async def test_failure_of_batch_is_passed_to_exception_handler_for_every_event(
+    transaction: Transaction,
+):
+    dp = QiwiDispatcher()
+    errors: List[Exception] = []
+
+    @dp.transaction_handler.batch(max_batch_size=2)
+    async def save_transactions(txns: List[Transaction]):
+        raise RuntimeError('database is down')
+
+    @dp.exception_handler()
+    async def handle_exception(exception: Exception):
+        errors.append(exception)
+
+    await asyncio.gather(*(dp.process_event(txn) for txn in make_transactions(transaction, 2)))
+
+    assert [str(error) for error in errors] == ['database is down'] * 2
+
+
+@pytest.mark.asyncio
+async def test_events_with_different_arguments_are_not_mixed(transaction: Transaction):
+    dp = QiwiDispatcher()
+    batches: List[List[int]] = []
+
+    @dp.transaction_handler.batch(max_batch_size=2, max_latency=0.01)
+    async def save_transactions(txns: List[Transaction], ctx: HandlerContext):
+        batches.append(sorted(txn.id for txn in txns))
+
+    first_context, second_context = HandlerContext(), HandlerContext()
+    txns = make_transactions(transaction, 4)
+    await asyncio.gather(
+        dp.process_event(txns[0], first_context),
+        dp.process_event(txns[1], second_context),
+        dp.process_event(txns[2], first_context),
+        dp.process_event(txns[3], second_context),
+    )
+
+    assert sorted(batches) == [[0, 2], [1, 3]]
+
+
+@pytest.mark.asyncio
+async def test_flush_passes_on_pending_events(transaction: Transaction):
+    batches: List[List[int]] = []
+
+    async def save_transactions(txns: List[Transaction]):
+        batches.append([txn.id for txn in txns])
+
+    handler: BatchEventHandler[Transaction] = BatchEventHandler(save_transactions, max_latency=10)
+    pending = asyncio.create_task(handler.execute(transaction))
+    await asyncio.sleep(0)
+
+    await handler.flush()
+    await pending
+
+    assert batches == [[transaction.id]]
+
+
+@pytest.mark.asyncio
+async def test_batch_is_not_limited_by_number_of_workers(transaction: Transaction):
+    dp = QiwiDispatcher()
+    batches: List[List[int]] = []
+
+    @dp.transaction_handler.batch(max_batch_size=100, max_latency=0.05)
+    async def save_transactions(txns: List[Transaction]):
+        batches.append([txn.id for txn in txns])
+
+    pool = WorkerPool(workers=4)
+    async with async_timeout.timeout(1):
+        results = [
+            await pool.submit(functools.partial(dp.process_event, txn))
+            for txn in make_transactions(transaction, 20)
+        ]
+        await asyncio.gather(*results)
+        await pool.join()
+    await pool.close()
+
+    assert batches == [list(range(20))]
+
+
+def test_invalid_batch_options():
+    async def handler(events: list) -> None:
+        pass
+
+    with pytest.raises(ValueError):
+        BatchEventHandler(handler, max_batch_size=0)
+    with pytest.raises(ValueError):
+        BatchEventHandler(handler, max_latency=-1)
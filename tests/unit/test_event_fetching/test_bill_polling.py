@@ -0,0 +1,228 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+import async_timeout
+import pytest
+
+from glQiwiApi.core.event_fetching.bill_polling import BillPollingExecutor
+from glQiwiApi.core.event_fetching.dispatcher import QiwiDispatcher
+from glQiwiApi.core.event_fetching.executor import HandlerContext
+from glQiwiApi.qiwi.clients.p2p.client import QiwiP2PClient
+from glQiwiApi.qiwi.clients.p2p.types import Bill, BillWebhook
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_bill(bill_id: str, status: str = 'WAITING', expire_in: float = 3600) -> Bill:
+    now = datetime.now(timezone.utc)
+    return Bill.parse_obj(
+        {
+            'amount': {'currency': 'RUB', 'value': '1.00'},
+            'status': {'value': status},
+            'siteId': 'site',
+            'billId': bill_id,
+            'creationDateTime': now,
+            'expirationDateTime': now + timedelta(seconds=expire_in),
+            'payUrl': 'https://oplata.qiwi.com/form/?invoice_uid=' + '0' * 36,
+        }
+    )
+
+
+class P2PClientStub(QiwiP2PClient):
+    def __init__(self, bills: Dict[str, Bill]):
+        super().__init__('secret')
+        self.bills = bills
+        self.requested: List[str] = []
+
+    async def get_bill_by_id(self, bill_id: str) -> Bill:
+        self.requested.append(bill_id)
+        return self.bills[bill_id]
+
+
+async def run_executor(executor: BillPollingExecutor, until: asyncio.Event) -> None:
+    task = await executor.start_non_blocking_polling()
+    try:
+        async with async_timeout.timeout(5):
+            await until.wait()
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+
+async def test_status_change_is_dispatched_as_bill_webhook() -> None:
+    bill = make_bill('first')
+    client = P2PClientStub({'first': bill})
+    dp = QiwiDispatcher()
+    handled = asyncio.Event()
+    webhooks: List[BillWebhook] = []
+
+    @dp.bill_handler()
+    async def handle_bill(webhook: BillWebhook, ctx: HandlerContext):
+        assert ctx.p2p_client is client
+        webhooks.append(webhook)
+        handled.set()
+
+    executor = BillPollingExecutor(client, dp, HandlerContext(), min_interval=0.01)
+    executor.track(bill)
+    client.bills['first'] = make_bill('first', status='PAID')
+
+    await run_executor(executor, handled)
+
+    assert [w.bill.status.value for w in webhooks] == ['PAID']
+    assert webhooks[0].bill.id == 'first'
+    assert executor.pending_bills == []
+
+
+async def test_bill_tracked_by_id_is_dispatched_only_when_status_changes() -> None:
+    client = P2PClientStub({'first': make_bill('first')})
+    dp = QiwiDispatcher()
+    handled = asyncio.Event()
+    webhooks: List[BillWebhook] = []
+
+    @dp.bill_handler()
+    async def handle_bill(webhook: BillWebhook, ctx: HandlerContext) -> None:
+        webhooks.append(webhook)
+        handled.set()
+
+    executor = BillPollingExecutor(client, dp, HandlerContext(), min_interval=0.01)
+    executor.track('first')
+
+    async def pay_after_first_check() -> None:
+        while not client.requested:
+            await asyncio.sleep(0.01)
+        client.bills['first'] = make_bill('first', status='PAID')
+
+    payment = asyncio.create_task(pay_after_first_check())
+    await run_executor(executor, handled)
+    await payment
+
+    assert [w.bill.status.value for w in webhooks] == ['PAID']
+
+
+async def test_failed_checks_are_backed_off() -> None:
+    class FailingClient(P2PClientStub):
+        async def get_bill_by_id(self, bill_id: str) -> Bill:
+            self.requested.append(bill_id)
+            raise ConnectionError()
+
+    client = FailingClient({})
+    executor = BillPollingExecutor(client, QiwiDispatcher(), HandlerContext(), min_interval=0.05)
+    executor.track('first')
+
+    task = await executor.start_non_blocking_polling()
+    await asyncio.sleep(0.3)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # checks at 0, 0.1 and 0.3 seconds rather than a request per event loop iteration
+    assert 2 <= len(client.requested) <= 3
+    assert executor._bills['first'].failures == len(client.requested)
+
+
+async def test_expired_bill_is_dropped_after_last_check() -> None:
+    bill = make_bill('expiring', expire_in=0.05)
+    client = P2PClientStub({'expiring': bill})
+    executor = BillPollingExecutor(client, QiwiDispatcher(), HandlerContext(), min_interval=1)
+    dropped = asyncio.Event()
+
+    async def wait_until_dropped() -> None:
+        while executor.pending_bills:
+            await asyncio.sleep(0.01)
+        dropped.set()
+
+    executor.track(bill)
+    watcher = asyncio.create_task(wait_until_dropped())
+    await run_executor(executor, dropped)
+    await watcher
+
+    # bill is checked at expiration instead of waiting for min_interval
+    assert client.requested == ['expiring']
+
+
+async def test_fresh_bills_are_checked_more_often_than_old_ones() -> None:
+    client = P2PClientStub({})
+    executor = BillPollingExecutor(
+        client, QiwiDispatcher(), HandlerContext(), min_interval=5, max_interval=300
+    )
+    executor.track(make_bill('fresh'))
+    executor.track(make_bill('old'))
+    old_bill = executor._bills['old']
+    old_bill.tracked_at -= 1000
+
+    executor._schedule_check(old_bill, old_bill.tracked_at + 1000)
+    executor._schedule_check(executor._bills['fresh'], executor._bills['fresh'].tracked_at)
+    fresh_bill = executor._bills['fresh']
+    assert fresh_bill.next_check_at - fresh_bill.tracked_at == pytest.approx(5)
+    assert old_bill.next_check_at - (old_bill.tracked_at + 1000) == pytest.approx(100)
+
+
+async def test_untracked_bill_is_not_checked() -> None:
+    client = P2PClientStub({'first': make_bill('first')})
+    executor = BillPollingExecutor(client, QiwiDispatcher(), HandlerContext(), min_interval=0.01)
+    executor.track('first')
+    executor.untrack('first')
+
+    assert executor._pop_due_bills(float('inf')) == []
+
+
+async def test_blocking_handler_does_not_stop_checks_of_other_bills() -> None:
+    client = P2PClientStub({'slow': make_bill('slow', status='PAID'), 'fast': make_bill('fast')})
+    dp = QiwiDispatcher()
+    fast_handled = asyncio.Event()
+
+    @dp.bill_handler()
+    async def handle_bill(webhook: BillWebhook, ctx: HandlerContext) -> None:
+        if webhook.bill.id == 'slow':
+            await asyncio.Event().wait()
+        fast_handled.set()
+
+    executor = BillPollingExecutor(
+        client, dp, HandlerContext(), min_interval=0.01, drain_timeout=0.01
+    )
+    executor.track('slow')
+    executor.track('fast')
+
+    async def pay_after_slow_is_handled() -> None:
+        while len(executor._in_flight) == 0:
+            await asyncio.sleep(0.01)
+        client.bills['fast'] = make_bill('fast', status='PAID')
+
+    payment = asyncio.create_task(pay_after_slow_is_handled())
+    await run_executor(executor, fast_handled)
+    await payment
+
+    assert client.requested.count('fast') > 1
+
+
+async def test_slow_request_does_not_delay_checks_of_other_bills() -> None:
+    class SlowClient(P2PClientStub):
+        async def get_bill_by_id(self, bill_id: str) -> Bill:
+            if bill_id == 'slow':
+                await asyncio.Event().wait()
+            return await super().get_bill_by_id(bill_id)
+
+    client = SlowClient({'fast': make_bill('fast')})
+    dp = QiwiDispatcher()
+    handled = asyncio.Event()
+
+    @dp.bill_handler()
+    async def handle_bill(webhook: BillWebhook, ctx: HandlerContext) -> None:
+        handled.set()
+
+    executor = BillPollingExecutor(client, dp, HandlerContext(), min_interval=0.01)
+    executor.track('slow')
+    executor.track('fast')
+
+    async def pay_after_first_check() -> None:
+        while not client.requested:
+            await asyncio.sleep(0.01)
+        client.bills['fast'] = make_bill('fast', status='PAID')
+
+    payment = asyncio.create_task(pay_after_first_check())
+    await run_executor(executor, handled)
+    await payment
+
+    assert set(client.requested) == {'fast'}
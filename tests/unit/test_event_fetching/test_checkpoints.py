@@ -0,0 +1,111 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Optional
+
+import pytest
+
+from glQiwiApi.core.event_fetching.checkpoints import (
+    BaseCheckpointStorage,
+    Checkpoint,
+    CheckpointWriter,
+    FileCheckpointStorage,
+    SQLiteCheckpointStorage,
+)
+
+pytestmark = pytest.mark.asyncio
+
+MOSCOW_TZ = timezone(timedelta(hours=3))
+
+
+@pytest.fixture(params=['file', 'sqlite'])
+def storage(request, tmp_path: Path) -> BaseCheckpointStorage:
+    if request.param == 'file':
+        return FileCheckpointStorage(tmp_path / 'checkpoints.json')
+    return SQLiteCheckpointStorage(tmp_path / 'checkpoints.sqlite')
+
+
+async def test_checkpoints_are_saved_and_loaded(storage: BaseCheckpointStorage) -> None:
+    first = Checkpoint(offset=10, updates_from=datetime(2022, 1, 1, 12, tzinfo=MOSCOW_TZ))
+    second = Checkpoint(offset=20, updates_from=datetime(2022, 1, 2, 12, tzinfo=MOSCOW_TZ))
+
+    await storage.save({'first': first})
+    await storage.save({'first': second, 'second': first})
+
+    assert await storage.load('first') == second
+    assert await storage.load('second') == first
+    assert await storage.load('unknown') is None
+    await storage.close()
+
+
+async def test_checkpoints_survive_reopening(tmp_path: Path) -> None:
+    checkpoint = Checkpoint(offset=1, updates_from=datetime(2022, 1, 1, tzinfo=MOSCOW_TZ))
+    storage = SQLiteCheckpointStorage(tmp_path / 'checkpoints.sqlite')
+    await storage.save({'wallet': checkpoint})
+    await storage.close()
+
+    storage = SQLiteCheckpointStorage(tmp_path / 'checkpoints.sqlite')
+    assert await storage.load('wallet') == checkpoint
+    await storage.close()
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='file locking is not supported on Windows')
+async def test_file_is_shared_by_several_storages(tmp_path: Path) -> None:
+    # every storage writes from its own thread, like shards in separate processes do
+    storages = [FileCheckpointStorage(tmp_path / 'checkpoints.json') for _ in range(8)]
+    now = datetime.now(MOSCOW_TZ)
+
+    async def save_many(key: str, storage: FileCheckpointStorage) -> None:
+        for offset in range(20):
+            await storage.save({key: Checkpoint(offset, now)})
+
+    await asyncio.gather(*(save_many(f'shard-{i}', s) for i, s in enumerate(storages)))
+
+    for i in range(len(storages)):
+        assert await storages[0].load(f'shard-{i}') == Checkpoint(19, now)
+
+
+class StorageSpy(BaseCheckpointStorage):
+    def __init__(self, fail: bool = False) -> None:
+        self.saved = []
+        self.fail = fail
+
+    async def load(self, key: str) -> Optional[Checkpoint]:
+        return None
+
+    async def save(self, checkpoints: Dict[str, Checkpoint]) -> None:
+        if self.fail:
+            raise OSError()
+        self.saved.append(checkpoints)
+
+
+async def test_writer_saves_only_latest_checkpoint_of_every_key() -> None:
+    storage = StorageSpy()
+    writer = CheckpointWriter(storage, flush_interval=0.01)
+    writer.start()
+    now = datetime.now(MOSCOW_TZ)
+
+    for offset in range(100):
+        writer.record('wallet', Checkpoint(offset, now))
+    await asyncio.sleep(0.05)
+
+    assert storage.saved == [{'wallet': Checkpoint(99, now)}]
+
+    writer.record('wallet', Checkpoint(100, now))
+    await writer.close()
+    assert storage.saved[-1] == {'wallet': Checkpoint(100, now)}
+
+
+async def test_writer_keeps_checkpoints_if_save_failed() -> None:
+    storage = StorageSpy(fail=True)
+    writer = CheckpointWriter(storage)
+    now = datetime.now(MOSCOW_TZ)
+    writer.record('wallet', Checkpoint(1, now))
+
+    with pytest.raises(OSError):
+        await writer.flush()
+
+    storage.fail = False
+    await writer.flush()
+    assert storage.saved == [{'wallet': Checkpoint(1, now)}]
@@ -0,0 +1,200 @@
+import asyncio
+from typing import Any, List, Sequence
+
+import pytest
+
+from glQiwiApi.core.event_fetching.dispatcher import (
+    BaseDispatcher,
+    EventHandler,
+    HandlerCollection,
+    HandlerTimeoutError,
+    QiwiDispatcher,
+)
+from glQiwiApi.core.event_fetching.filters import EqualsFilter, RangeFilter
+from glQiwiApi.qiwi.clients.wallet.types import Transaction
+
+pytestmark = pytest.mark.asyncio
+
+
+class TransactionSubclass(Transaction):
+    pass
+
+
+class RecordingCollection(HandlerCollection[Any]):
+    def __init__(self, *event_types: Any) -> None:
+        super().__init__(*event_types)
+        self.notified: List[Any] = []
+
+    async def notify(self, event: Any, *args: Any) -> None:
+        self.notified.append(event)
+        await super().notify(event, *args)
+
+
+class RecordingDispatcher(BaseDispatcher):
+    def __init__(self) -> None:
+        super().__init__()
+        self.transaction_handler = RecordingCollection(Transaction)
+        self.str_handler = RecordingCollection(str)
+
+    @property
+    def __all_handlers__(self) -> Sequence[HandlerCollection[Any]]:
+        return self.transaction_handler, self.str_handler
+
+
+async def test_event_is_routed_only_to_collections_of_its_type(transaction: Transaction):
+    dp = RecordingDispatcher()
+
+    await dp.process_event(transaction)
+
+    assert dp.transaction_handler.notified == [transaction]
+    assert dp.str_handler.notified == []
+
+
+async def test_subclass_is_routed_to_collection_of_base_class(transaction: Transaction):
+    dp = RecordingDispatcher()
+    event = TransactionSubclass.construct(**transaction.__dict__)
+
+    await dp.process_event(event)
+
+    assert dp.transaction_handler.notified == [event]
+    assert dp._routes[TransactionSubclass] == (dp.transaction_handler,)
+
+
+async def test_event_without_handlers_is_ignored():
+    dp = RecordingDispatcher()
+
+    await dp.process_event(1)
+
+    assert dp._routes[int] == ()
+
+
+async def test_routes_are_invalidated_on_collection_change():
+    dp = RecordingDispatcher()
+    await dp.process_event('event')
+
+    dp.str_handler = RecordingCollection(str)
+    await dp.process_event('event')
+
+    assert dp.str_handler.notified == ['event']
+
+
+async def test_exception_of_handler_is_passed_to_exception_handler(transaction: Transaction):
+    dp = QiwiDispatcher()
+    handled_errors: List[Exception] = []
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction):
+        raise RuntimeError('oops')
+
+    @dp.exception_handler()
+    async def handle_exception(exception: Exception):
+        handled_errors.append(exception)
+
+    await dp.process_event(transaction)
+
+    assert [str(error) for error in handled_errors] == ['oops']
+
+
+async def test_first_matching_handler_is_executed(transaction: Transaction):
+    dp = QiwiDispatcher()
+    handled: List[str] = []
+
+    @dp.transaction_handler(lambda txn: txn.comment == 'unknown')
+    async def handle_unknown(txn: Transaction):
+        handled.append('unknown')
+
+    @dp.transaction_handler(EqualsFilter('id', transaction.id))
+    async def handle_by_id(txn: Transaction):
+        handled.append('by_id')
+
+    @dp.transaction_handler()
+    async def handle_any(txn: Transaction):
+        handled.append('any')
+
+    await dp.process_event(transaction)
+
+    assert handled == ['by_id']
+
+
+async def test_handlers_with_declarative_filters_are_indexed(transaction: Transaction):
+    dp = QiwiDispatcher()
+    handled: List[int] = []
+
+    for order_id in range(1000):
+
+        @dp.transaction_handler(EqualsFilter('comment', f'order-{order_id}'))
+        async def handle_order(txn: Transaction, order_id: int = order_id):
+            handled.append(order_id)
+
+    @dp.transaction_handler(RangeFilter('sum.amount', 0, transaction.sum.amount))
+    async def handle_by_amount(txn: Transaction):
+        handled.append(-1)
+
+    await dp.process_event(transaction.copy(update={'comment': 'order-777'}))
+    await dp.process_event(transaction.copy(update={'comment': 'unknown'}))
+
+    assert handled == [777, -1]
+
+
+async def test_handler_concurrency_is_limited(transaction: Transaction):
+    dp = QiwiDispatcher()
+    running = 0
+    max_running = 0
+
+    @dp.transaction_handler(max_concurrency=2)
+    async def slow_handler(txn: Transaction):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    await asyncio.gather(*(dp.process_event(transaction) for _ in range(10)))
+
+    assert max_running == 2
+
+
+async def test_handler_timeout_is_passed_to_exception_handler(transaction: Transaction):
+    dp = QiwiDispatcher()
+    errors: List[Exception] = []
+    timed_out: List[Any] = []
+
+    async def on_timeout(txn: Transaction, ctx: dict):
+        timed_out.append((txn, ctx))
+
+    @dp.transaction_handler(timeout=0.01, on_timeout=on_timeout)
+    async def slow_handler(txn: Transaction, ctx: dict):
+        await asyncio.sleep(10)
+
+    @dp.exception_handler()
+    async def handle_exception(exception: Exception, ctx: dict):
+        errors.append(exception)
+
+    await dp.process_event(transaction, {})
+
+    assert timed_out == [(transaction, {})]
+    assert len(errors) == 1
+    assert isinstance(errors[0], HandlerTimeoutError)
+    assert errors[0].handler is slow_handler
+
+
+async def test_fast_handler_is_not_affected_by_timeout(transaction: Transaction):
+    dp = QiwiDispatcher()
+    handled: List[int] = []
+
+    @dp.transaction_handler(timeout=1)
+    async def fast_handler(txn: Transaction):
+        handled.append(txn.id)
+
+    await dp.process_event(transaction)
+
+    assert handled == [transaction.id]
+
+
+@pytest.mark.parametrize('options', [{'max_concurrency': 0}, {'timeout': 0}, {'timeout': -1}])
+def test_invalid_handler_options(options: dict):
+    async def handler(event: Any) -> None:
+        pass
+
+    with pytest.raises(ValueError):
+        EventHandler(handler, **options)
@@ -0,0 +1,217 @@
+import asyncio
+from pathlib import Path
+from typing import Any, List
+
+import async_timeout
+import pytest
+
+from glQiwiApi.core.event_fetching.dispatcher import QiwiDispatcher
+from glQiwiApi.core.event_fetching.event_queue import (
+    BaseEventQueue,
+    EventQueueConsumer,
+    MemoryEventQueue,
+    SQLiteEventQueue,
+)
+from glQiwiApi.core.event_fetching.executor import HandlerContext
+from glQiwiApi.qiwi.clients.wallet.types import Transaction
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def queue(request, tmp_path: Path) -> BaseEventQueue:
+    if request.param == 'memory':
+        return MemoryEventQueue(maxsize=10)
+    return SQLiteEventQueue(tmp_path / 'events.sqlite', maxsize=10)
+
+
+@pytest.mark.asyncio
+async def test_events_are_delivered_in_order(queue: BaseEventQueue) -> None:
+    for event in ['first', 'second', 'third']:
+        await queue.put(event)
+
+    deliveries = [await queue.get() for _ in range(3)]
+
+    assert [delivery.event for delivery in deliveries] == ['first', 'second', 'third']
+    assert len(queue) == 3
+    for delivery in deliveries:
+        await queue.ack(delivery)
+    assert len(queue) == 0
+    async with async_timeout.timeout(1):
+        await queue.join()
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_put_waits_while_queue_is_full(queue: BaseEventQueue) -> None:
+    for i in range(10):
+        await queue.put(i)
+
+    blocked_put = asyncio.create_task(queue.put(10))
+    await asyncio.sleep(0.05)
+    assert not blocked_put.done()
+
+    # delivered but not acknowledged event still takes place in the queue
+    delivery = await queue.get()
+    await asyncio.sleep(0.05)
+    assert not blocked_put.done()
+
+    await queue.ack(delivery)
+    async with async_timeout.timeout(1):
+        await blocked_put
+    assert len(queue) == 10
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_get_waits_for_event(queue: BaseEventQueue) -> None:
+    getting = asyncio.create_task(queue.get())
+    await asyncio.sleep(0.01)
+    assert not getting.done()
+
+    await queue.put('event')
+
+    async with async_timeout.timeout(1):
+        assert (await getting).event == 'event'
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_unacknowledged_events_are_delivered_after_restart(
+    tmp_path: Path, transaction: Transaction
+) -> None:
+    queue = SQLiteEventQueue(tmp_path / 'events.sqlite')
+    first = transaction.copy(update={'id': 1})
+    second = transaction.copy(update={'id': 2})
+    await queue.put(first)
+    await queue.put(second)
+    await queue.ack(await queue.get())
+    await queue.get()  # crash before acknowledgement
+    await queue.close()
+
+    queue = SQLiteEventQueue(tmp_path / 'events.sqlite')
+    async with async_timeout.timeout(1):
+        delivery = await queue.get()
+
+    assert delivery.event == second
+    assert len(queue) == 1
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_get_does_not_lose_event(tmp_path: Path) -> None:
+    queue = SQLiteEventQueue(tmp_path / 'events.sqlite')
+    getting = asyncio.create_task(queue.get())
+    await asyncio.sleep(0.01)
+    getting.cancel()
+    await queue.put('event')
+
+    async with async_timeout.timeout(1):
+        assert (await queue.get()).event == 'event'
+    await queue.close()
+
+
+@pytest.mark.parametrize('maxsize', [0, -1])
+def test_size_of_queue_must_be_positive(tmp_path: Path, maxsize: int) -> None:
+    with pytest.raises(ValueError):
+        MemoryEventQueue(maxsize)
+    with pytest.raises(ValueError):
+        SQLiteEventQueue(tmp_path / 'events.sqlite', maxsize=maxsize)
+
+
+@pytest.mark.asyncio
+async def test_consumer_handles_events_with_limited_concurrency(
+    queue: BaseEventQueue, transaction: Transaction
+) -> None:
+    dp = QiwiDispatcher()
+    context = HandlerContext()
+    running = 0
+    max_running = 0
+    handled: List[Any] = []
+
+    @dp.transaction_handler()
+    async def handle(event: Any, ctx: HandlerContext) -> None:
+        nonlocal running, max_running
+        assert ctx is context
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        handled.append(event)
+        running -= 1
+
+    consumer = EventQueueConsumer(queue, dp, context, concurrency=2)
+    consumer.start()
+    for i in range(6):
+        await queue.put(transaction.copy(update={'id': i}))
+
+    async with async_timeout.timeout(5):
+        assert await consumer.close() == []
+
+    assert sorted(event.id for event in handled) == list(range(6))
+    assert max_running == 2
+    assert len(queue) == 0
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_consumer_acknowledges_event_when_handler_fails(
+    queue: BaseEventQueue, transaction: Transaction
+) -> None:
+    dp = QiwiDispatcher()
+    errors: List[Exception] = []
+
+    @dp.transaction_handler()
+    async def handle(event: Any) -> None:
+        raise RuntimeError('boom')
+
+    @dp.exception_handler()
+    async def handle_exception(exception: Exception, *args: Any) -> None:
+        errors.append(exception)
+
+    consumer = EventQueueConsumer(queue, dp)
+    consumer.start()
+    await queue.put(transaction)
+
+    async with async_timeout.timeout(5):
+        await queue.join()
+        await consumer.close()
+
+    assert len(errors) == 1
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_events_stay_in_durable_queue_on_close(
+    tmp_path: Path, transaction: Transaction
+) -> None:
+    queue = SQLiteEventQueue(tmp_path / 'events.sqlite')
+    dp = QiwiDispatcher()
+    started = asyncio.Event()
+
+    @dp.transaction_handler()
+    async def handle(event: Any) -> None:
+        started.set()
+        await asyncio.sleep(10)
+
+    consumer = EventQueueConsumer(queue, dp, drain_timeout=0.05)
+    consumer.start()
+    await queue.put(transaction)
+
+    async with async_timeout.timeout(5):
+        await started.wait()
+        abandoned = await consumer.close()
+    await queue.close()
+
+    assert abandoned == [transaction]
+    queue = SQLiteEventQueue(tmp_path / 'events.sqlite')
+    async with async_timeout.timeout(1):
+        assert (await queue.get()).event == transaction
+    await queue.close()
+
+
+def test_only_sqlite_queue_is_durable(tmp_path: Path) -> None:
+    assert not MemoryEventQueue().is_durable
+    assert SQLiteEventQueue(tmp_path / 'events.sqlite').is_durable
+
+
+def test_concurrency_must_be_positive() -> None:
+    with pytest.raises(ValueError):
+        EventQueueConsumer(MemoryEventQueue(), QiwiDispatcher(), concurrency=0)
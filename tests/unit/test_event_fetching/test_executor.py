@@ -1,18 +1,23 @@
 import asyncio
-from datetime import datetime
+import contextlib
+from datetime import datetime, timedelta
 from typing import List, NoReturn, Optional
 
 import async_timeout
 import pytest
 
 from glQiwiApi import QiwiWallet
+from glQiwiApi.core.event_fetching.checkpoints import FileCheckpointStorage
 from glQiwiApi.core.event_fetching.dispatcher import QiwiDispatcher
+from glQiwiApi.core.event_fetching.event_queue import MemoryEventQueue, SQLiteEventQueue
 from glQiwiApi.core.event_fetching.executor import (
     ExecutorEvent,
     HandlerContext,
+    PollingExecutor,
     start_non_blocking_qiwi_api_polling,
 )
 from glQiwiApi.qiwi.clients.wallet.types import History, Source, Transaction, TransactionType
+from glQiwiApi.utils.date_conversion import localize_datetime_according_to_moscow_timezone
 from glQiwiApi.yoo_money.methods.operation_history import MAX_HISTORY_LIMIT
 
 
@@ -45,6 +50,29 @@ class TestExecutorEvent:
         with pytest.raises(RuntimeError):
             await event.fire()
 
+    @pytest.mark.asyncio
+    async def test_fire_calls_all_handlers_even_if_one_fails(self):
+        context = HandlerContext()
+        called: List[str] = []
+
+        async def failing_handler(ctx: HandlerContext) -> NoReturn:
+            called.append('failing')
+            raise RuntimeError()
+
+        async def async_handler(ctx: HandlerContext) -> None:
+            called.append('async')
+
+        def sync_handler(ctx: HandlerContext) -> None:
+            called.append('sync')
+
+        event = ExecutorEvent(context, init_handlers=[failing_handler, async_handler])
+        event += sync_handler
+
+        with pytest.raises(RuntimeError):
+            await event.fire()
+
+        assert called == ['failing', 'async', 'sync']
+
 
 class WalletStub(QiwiWallet):
     def __init__(self, fake_transaction: Transaction, api_access_token: str = ''):
@@ -84,9 +112,325 @@ async def test_start_non_blocking_qiwi_api_polling(transaction: Transaction) ->
         handle_on_startup.set()
 
     async with async_timeout.timeout(5):
-        await start_non_blocking_qiwi_api_polling(wallet, dp, context=c, on_startup=on_startup)
+        task = await start_non_blocking_qiwi_api_polling(
+            wallet, dp, context=c, on_startup=on_startup
+        )
         await handle_on_startup.wait()
         await handled_transaction_event.wait()
 
     assert handled_transaction_event.is_set()
     assert handle_on_startup.is_set()
+
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+class PaginatedWalletStub(QiwiWallet):
+    def __init__(self, transactions: List[Transaction]):
+        super().__init__('')
+        # API returns transactions from the latest to the earliest
+        self._transactions = sorted(transactions, key=lambda txn: txn.id, reverse=True)
+        self.requests: List[dict] = []
+
+    async def history(
+        self,
+        rows: int = MAX_HISTORY_LIMIT,
+        transaction_type: TransactionType = TransactionType.ALL,
+        sources: Optional[List[Source]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        next_txn_date: Optional[datetime] = None,
+        next_txn_id: Optional[int] = None,
+    ) -> History:
+        self.requests.append({'start_date': start_date, 'next_txn_id': next_txn_id})
+        transactions = [
+            txn
+            for txn in self._transactions
+            if start_date <= txn.date and (next_txn_id is None or txn.id <= next_txn_id)
+        ]
+        page, rest = transactions[:rows], transactions[rows:]
+        if not rest:
+            return History(data=page)
+        return History(data=page, nextTxnId=rest[0].id, nextTxnDate=rest[0].date)
+
+
+@pytest.mark.asyncio
+async def test_burst_of_transactions_is_fetched_in_one_tick(transaction: Transaction) -> None:
+    started_at = localize_datetime_according_to_moscow_timezone(datetime.now())
+    transactions = [
+        transaction.copy(update={'id': i, 'date': started_at + timedelta(seconds=i)})
+        for i in range(1, 121)
+    ]
+    wallet = PaginatedWalletStub(transactions)
+    dp = QiwiDispatcher()
+    handled: List[int] = []
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction, _: HandlerContext):
+        handled.append(txn.id)
+
+    executor = PollingExecutor(wallet, dp, context=HandlerContext())
+    executor.get_updates_from = started_at
+
+    assert await executor._try_fetch_new_updates() == 120
+    assert sorted(handled) == list(range(1, 121))
+    assert [r['next_txn_id'] for r in wallet.requests] == [None, 70, 20]
+
+    # window is moved to the latest transaction, so already handled ones aren't downloaded again
+    assert executor.get_updates_from == transactions[-1].date
+    assert await executor._try_fetch_new_updates() == 0
+    assert wallet.requests[-1] == {'start_date': transactions[-1].date, 'next_txn_id': None}
+    assert len(handled) == 120
+
+
+@pytest.mark.asyncio
+async def test_polling_resumes_from_checkpoint(transaction: Transaction, tmp_path) -> None:
+    started_at = localize_datetime_according_to_moscow_timezone(datetime.now())
+    transactions = [
+        transaction.copy(update={'id': i, 'date': started_at + timedelta(seconds=i)})
+        for i in range(1, 4)
+    ]
+    wallet = PaginatedWalletStub(transactions[:2])
+    storage = FileCheckpointStorage(tmp_path / 'checkpoints.json')
+
+    executor = PollingExecutor(
+        wallet, QiwiDispatcher(), HandlerContext(), checkpoint_storage=storage
+    )
+    executor.get_updates_from = started_at
+    await executor._try_fetch_new_updates()
+    await executor._close_checkpoints()
+
+    restarted_wallet = PaginatedWalletStub(transactions)
+    handled: List[int] = []
+    dp = QiwiDispatcher()
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction, _: HandlerContext):
+        handled.append(txn.id)
+
+    executor = PollingExecutor(restarted_wallet, dp, HandlerContext(), checkpoint_storage=storage)
+    await executor._restore_checkpoint()
+
+    assert await executor._try_fetch_new_updates() == 1
+    assert handled == [3]
+    assert restarted_wallet.requests == [{'start_date': transactions[1].date, 'next_txn_id': None}]
+
+
+@pytest.mark.asyncio
+async def test_transactions_are_handled_by_fixed_number_of_workers(
+    transaction: Transaction,
+) -> None:
+    started_at = localize_datetime_according_to_moscow_timezone(datetime.now())
+    transactions = [
+        transaction.copy(
+            update={'id': i, 'date': started_at + timedelta(seconds=i), 'to_account': str(i % 2)}
+        )
+        for i in range(1, 21)
+    ]
+    dp = QiwiDispatcher()
+    running = 0
+    max_running = 0
+    handled_by_account = {'0': [], '1': []}
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction, _: HandlerContext):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.001)
+        handled_by_account[txn.to_account].append(txn.id)
+        running -= 1
+
+    executor = PollingExecutor(
+        PaginatedWalletStub(transactions),
+        dp,
+        HandlerContext(),
+        workers=4,
+        queue_size=2,
+        ordering_key=lambda txn: int(txn.to_account),
+    )
+    executor.get_updates_from = started_at
+
+    assert await executor._try_fetch_new_updates() == 20
+    await executor._close_worker_pool()
+
+    assert max_running == 2  # only two distinct accounts
+    assert handled_by_account == {'0': list(range(2, 21, 2)), '1': list(range(1, 21, 2))}
+
+
+def test_ordering_key_requires_workers(transaction: Transaction) -> None:
+    with pytest.raises(ValueError):
+        PollingExecutor(
+            PaginatedWalletStub([transaction]),
+            QiwiDispatcher(),
+            HandlerContext(),
+            ordering_key=lambda txn: txn.to_account,
+        )
+
+
+@pytest.mark.asyncio
+async def test_stop_waits_for_handlers_in_progress(transaction: Transaction, tmp_path) -> None:
+    started_at = localize_datetime_according_to_moscow_timezone(datetime.now())
+    txn = transaction.copy(update={'id': 1, 'date': started_at})
+    storage = FileCheckpointStorage(tmp_path / 'checkpoints.json')
+    dp = QiwiDispatcher()
+    handler_started = asyncio.Event()
+    release_handler = asyncio.Event()
+    handled: List[int] = []
+    shutdown_hooks: List[str] = []
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction, _: HandlerContext):
+        handler_started.set()
+        await release_handler.wait()
+        handled.append(txn.id)
+
+    executor = PollingExecutor(
+        PaginatedWalletStub([txn]),
+        dp,
+        HandlerContext(),
+        checkpoint_storage=storage,
+        on_shutdown=lambda ctx: shutdown_hooks.append('first'),
+    )
+    executor._on_shutdown += lambda ctx: shutdown_hooks.append('second')
+    executor.get_updates_from = started_at
+
+    async with async_timeout.timeout(5):
+        await executor.start_non_blocking_polling()
+        await handler_started.wait()
+        stopping = asyncio.create_task(executor.stop())
+        await asyncio.sleep(0.01)
+        assert not stopping.done()
+
+        release_handler.set()
+        assert await stopping == []
+
+    assert handled == [1]
+    assert shutdown_hooks == ['first', 'second']
+    checkpoint = await FileCheckpointStorage(tmp_path / 'checkpoints.json').load(
+        executor._checkpoint_key
+    )
+    assert checkpoint is not None and checkpoint.offset == 1
+
+
+@pytest.mark.asyncio
+async def test_handlers_are_abandoned_after_drain_timeout(
+    transaction: Transaction, tmp_path
+) -> None:
+    started_at = localize_datetime_according_to_moscow_timezone(datetime.now())
+    txn = transaction.copy(update={'id': 1, 'date': started_at})
+    storage = FileCheckpointStorage(tmp_path / 'checkpoints.json')
+    dp = QiwiDispatcher()
+    handler_started = asyncio.Event()
+    handler_cancelled = asyncio.Event()
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction, _: HandlerContext):
+        handler_started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            handler_cancelled.set()
+            raise
+
+    executor = PollingExecutor(
+        PaginatedWalletStub([txn]),
+        dp,
+        HandlerContext(),
+        checkpoint_storage=storage,
+        drain_timeout=0.01,
+    )
+    executor.get_updates_from = started_at
+
+    async with async_timeout.timeout(5):
+        await executor.start_non_blocking_polling()
+        await handler_started.wait()
+        abandoned = await executor.stop()
+
+    assert [txn.id for txn in abandoned] == [1]
+    assert handler_cancelled.is_set()
+    # abandoned transaction will be fetched again after restart
+    assert await storage.load(executor._checkpoint_key) is None
+
+
+@pytest.mark.asyncio
+async def test_checkpoint_is_not_moved_past_events_abandoned_in_memory_queue(
+    transaction: Transaction, tmp_path
+) -> None:
+    started_at = localize_datetime_according_to_moscow_timezone(datetime.now())
+    txn = transaction.copy(update={'id': 1, 'date': started_at})
+    storage = FileCheckpointStorage(tmp_path / 'checkpoints.json')
+    dp = QiwiDispatcher()
+    handler_started = asyncio.Event()
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction, _: HandlerContext):
+        handler_started.set()
+        await asyncio.sleep(10)
+
+    executor = PollingExecutor(
+        PaginatedWalletStub([txn]),
+        dp,
+        HandlerContext(),
+        checkpoint_storage=storage,
+        event_queue=MemoryEventQueue(),
+        drain_timeout=0.01,
+    )
+    executor.get_updates_from = started_at
+
+    async with async_timeout.timeout(5):
+        await executor.start_non_blocking_polling()
+        await handler_started.wait()
+        abandoned = await executor.stop()
+
+    assert [txn.id for txn in abandoned] == [1]
+    # memory queue loses abandoned transaction, so it must be fetched again after restart
+    assert await storage.load(executor._checkpoint_key) is None
+
+
+@pytest.mark.asyncio
+async def test_transactions_are_put_into_event_queue(transaction: Transaction, tmp_path) -> None:
+    started_at = localize_datetime_according_to_moscow_timezone(datetime.now())
+    transactions = [
+        transaction.copy(update={'id': i, 'date': started_at + timedelta(seconds=i)})
+        for i in range(1, 4)
+    ]
+    dp = QiwiDispatcher()
+    release_handlers = asyncio.Event()
+    handled: List[int] = []
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction, _: HandlerContext):
+        await release_handlers.wait()
+        handled.append(txn.id)
+
+    queue = SQLiteEventQueue(tmp_path / 'events.sqlite')
+    executor = PollingExecutor(
+        PaginatedWalletStub(transactions), dp, HandlerContext(), event_queue=queue, workers=2
+    )
+    executor.get_updates_from = started_at
+
+    async with async_timeout.timeout(5):
+        await executor.start_non_blocking_polling()
+        # polling isn't blocked by handlers, transactions wait in the queue
+        while executor.offset != 3:
+            await asyncio.sleep(0.01)
+        assert handled == []
+
+        release_handlers.set()
+        assert await executor.stop() == []
+
+    assert sorted(handled) == [1, 2, 3]
+
+
+def test_ordering_key_can_not_be_used_with_event_queue(transaction: Transaction) -> None:
+    with pytest.raises(ValueError):
+        PollingExecutor(
+            PaginatedWalletStub([transaction]),
+            QiwiDispatcher(),
+            HandlerContext(),
+            workers=2,
+            ordering_key=lambda txn: txn.to_account,
+            event_queue=MemoryEventQueue(),
+        )
@@ -0,0 +1,75 @@
+from typing import List
+
+import pytest
+
+from glQiwiApi.core.event_fetching.dispatcher import EventHandler
+from glQiwiApi.core.event_fetching.filters import (
+    AndFilter,
+    BaseFilter,
+    ExceptionFilter,
+    LambdaBasedFilter,
+    NotFilter,
+    compile_filters,
+)
+
+
+class AsyncFilter(BaseFilter[int]):
+    def __init__(self, calls: List[int]) -> None:
+        self.calls = calls
+
+    async def check(self, update: int) -> bool:
+        self.calls.append(update)
+        return update > 0
+
+
+def test_sync_filters_are_compiled_into_one_predicate():
+    chain = AndFilter(
+        LambdaBasedFilter(lambda x: x > 0),
+        AndFilter(~LambdaBasedFilter(lambda x: x == 5), LambdaBasedFilter(lambda x: x < 10)),
+    )
+
+    steps = compile_filters([chain, LambdaBasedFilter(lambda x: x % 2 == 0)])
+
+    assert len(steps) == 1
+    predicate = steps[0]
+    assert [x for x in range(-2, 13) if predicate(x)] == [2, 4, 6, 8]
+
+
+def test_async_filters_are_not_compiled():
+    async def is_positive(x: int) -> bool:
+        return x > 0
+
+    async_filter = AsyncFilter([])
+    lambda_filter = LambdaBasedFilter(is_positive)
+
+    assert async_filter.compile() is None
+    assert lambda_filter.compile() is None
+    assert AndFilter(LambdaBasedFilter(bool), async_filter).compile() is None
+    assert NotFilter(async_filter).compile() is None
+
+    steps = compile_filters([LambdaBasedFilter(bool), async_filter, LambdaBasedFilter(bool)])
+    assert steps[1] is async_filter
+    assert not isinstance(steps[0], BaseFilter) and not isinstance(steps[2], BaseFilter)
+
+
+def test_exception_filter_is_compiled():
+    predicate = ExceptionFilter(ValueError).compile()
+
+    assert predicate(ValueError()) and not predicate(KeyError())
+
+
+@pytest.mark.asyncio
+async def test_async_filter_is_not_awaited_if_sync_filter_fails():
+    calls: List[int] = []
+    handled: List[int] = []
+
+    async def handler(event: int) -> None:
+        handled.append(event)
+
+    event_handler = EventHandler(handler, LambdaBasedFilter(lambda x: x != 2), AsyncFilter(calls))
+
+    for event in (-1, 1, 2):
+        await event_handler.check_then_execute(event)
+
+    assert calls == [-1, 1]
+    assert handled == [1]
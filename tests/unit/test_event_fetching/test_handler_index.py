@@ -0,0 +1,115 @@
+import operator
+from types import SimpleNamespace
+
+import pytest
+
+from glQiwiApi.core.event_fetching.filters import EqualsFilter, LambdaBasedFilter, RangeFilter
+from glQiwiApi.core.event_fetching.handler_index import HandlerIndex
+
+
+def make_event(comment=None, amount=None):
+    return SimpleNamespace(comment=comment, sum=SimpleNamespace(amount=amount))
+
+
+def test_handlers_are_found_by_equality():
+    index: HandlerIndex[str] = HandlerIndex()
+    for i in range(1000):
+        index.add(f'order-{i}', [EqualsFilter('comment', f'order-{i}')])
+
+    assert index.candidates(make_event(comment='order-500')) == ['order-500']
+    assert index.candidates(make_event(comment='unknown')) == []
+
+
+def test_handlers_are_found_by_range():
+    index: HandlerIndex[str] = HandlerIndex()
+    index.add('small', [RangeFilter('sum.amount', 0, 100)])
+    index.add('wide', [RangeFilter('sum.amount', 0, 10_000)])
+    index.add('medium', [RangeFilter('sum.amount', 100, 500)])
+    index.add('large', [RangeFilter('sum.amount', 1000, 5000)])
+
+    assert index.candidates(make_event(amount=100)) == ['small', 'wide', 'medium']
+    assert index.candidates(make_event(amount=700)) == ['wide']
+    assert index.candidates(make_event(amount=20_000)) == []
+    assert index.candidates(make_event(amount=-1)) == []
+
+
+class CountingAmount(int):
+    comparisons = 0
+
+    def _compare(self, other, operator_):
+        CountingAmount.comparisons += 1
+        return operator_(int(self), other)
+
+    def __lt__(self, other):
+        return self._compare(other, operator.lt)
+
+    def __le__(self, other):
+        return self._compare(other, operator.le)
+
+    def __gt__(self, other):
+        return self._compare(other, operator.gt)
+
+    def __ge__(self, other):
+        return self._compare(other, operator.ge)
+
+    def __eq__(self, other):
+        return self._compare(other, operator.eq)
+
+    __hash__ = int.__hash__
+
+
+def test_wide_interval_does_not_slow_down_search():
+    index: HandlerIndex[str] = HandlerIndex()
+    index.add('wide', [RangeFilter('sum.amount', 0, 1_000_000)])
+    for i in range(1, 1000):
+        index.add(f'narrow-{i}', [RangeFilter('sum.amount', i * 10, i * 10 + 5)])
+
+    CountingAmount.comparisons = 0
+    assert index.candidates(make_event(amount=CountingAmount(9993))) == ['wide', 'narrow-999']
+    assert index.candidates(make_event(amount=CountingAmount(9997))) == ['wide']
+    # walking back through every interval, that starts before the amount, takes thousands
+    assert CountingAmount.comparisons < 200
+
+
+def test_candidates_are_returned_in_order_of_registration():
+    index: HandlerIndex[str] = HandlerIndex()
+    index.add('by_amount', [RangeFilter('sum.amount', 0, 100)])
+    index.add('any', [LambdaBasedFilter(bool)])
+    index.add('by_comment', [LambdaBasedFilter(bool), EqualsFilter('comment', 'order')])
+    index.add('without_filters', [])
+
+    assert index.candidates(make_event(comment='order', amount=50)) == [
+        'by_amount',
+        'any',
+        'by_comment',
+        'without_filters',
+    ]
+
+
+def test_removed_handlers_are_not_found():
+    index: HandlerIndex[str] = HandlerIndex()
+    equals_filters = [EqualsFilter('comment', 'order')]
+    range_filters = [RangeFilter('sum.amount', 0, 100)]
+    index.add('by_comment', equals_filters)
+    index.add('by_amount', range_filters)
+    index.add('any', [])
+
+    index.remove('by_comment', equals_filters)
+    index.remove('by_amount', range_filters)
+
+    assert not index.is_indexed
+    assert index.candidates(make_event(comment='order', amount=50)) == ['any']
+
+
+def test_unhashable_and_missing_values_are_skipped():
+    index: HandlerIndex[str] = HandlerIndex()
+    index.add('by_comment', [EqualsFilter('comment', 'order')])
+    index.add('by_amount', [RangeFilter('sum.amount', 0, 100)])
+
+    assert index.candidates(make_event(comment=['order'], amount='text')) == []
+    assert index.candidates(object()) == []
+
+
+def test_range_filter_bounds_are_validated():
+    with pytest.raises(ValueError):
+        RangeFilter('sum.amount', 10, 1)
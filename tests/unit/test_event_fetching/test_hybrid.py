@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from glQiwiApi import QiwiWallet
+from glQiwiApi.core.event_fetching.dispatcher import QiwiDispatcher
+from glQiwiApi.core.event_fetching.executor import HandlerContext
+from glQiwiApi.core.event_fetching.hybrid import HybridExecutor, ReconciliationPollingExecutor
+from glQiwiApi.core.event_fetching.webhooks.config import EncryptionConfig, WebhookConfig
+from glQiwiApi.core.event_fetching.webhooks.services.collision_detector import (
+    WindowedCollisionDetector,
+)
+from glQiwiApi.qiwi.clients.wallet.types import History, Transaction, TransactionWebhook
+from glQiwiApi.utils.date_conversion import localize_datetime_according_to_moscow_timezone
+
+
+class WalletStub(QiwiWallet):
+    def __init__(self, transactions: List[Transaction]):
+        super().__init__('')
+        self.transactions = transactions
+
+    async def history(self, *args, **kwargs) -> History:
+        return History(data=self.transactions)
+
+
+@pytest.mark.asyncio
+async def test_reconciliation_dispatches_only_missed_transactions(
+    transaction: Transaction, test_webhook: TransactionWebhook
+) -> None:
+    now = localize_datetime_according_to_moscow_timezone(datetime.now())
+    delivered = transaction.copy(update={'id': int(test_webhook.payment.txn_id), 'date': now})
+    missed = transaction.copy(update={'id': delivered.id + 1, 'date': now + timedelta(seconds=1)})
+    collision_detector = WindowedCollisionDetector()
+    collision_detector.remember_processed_object(test_webhook)
+
+    dp = QiwiDispatcher()
+    handled: List[int] = []
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction, _: HandlerContext):
+        handled.append(txn.id)
+
+    executor = ReconciliationPollingExecutor(
+        WalletStub([delivered, missed]),
+        dp,
+        HandlerContext(),
+        collision_detector=collision_detector,
+    )
+    executor.get_updates_from = now
+
+    await executor._try_fetch_new_updates()
+
+    assert handled == [missed.id]
+    assert executor.offset == missed.id
+    # webhook of the transaction, that was found by polling, is not dispatched again
+    late_webhook = test_webhook.copy(
+        update={'payment': test_webhook.payment.copy(update={'txn_id': str(missed.id)})}
+    )
+    assert collision_detector.has_collision(late_webhook)
+
+
+@pytest.mark.asyncio
+async def test_reconciliation_runs_with_web_application(transaction: Transaction) -> None:
+    now = localize_datetime_according_to_moscow_timezone(datetime.now())
+    dp = QiwiDispatcher()
+    handled = asyncio.Event()
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction, _: HandlerContext):
+        handled.set()
+
+    executor = HybridExecutor(
+        WalletStub([transaction.copy(update={'date': now})]),
+        dp,
+        HandlerContext(),
+        reconciliation_interval=0.01,
+    )
+    executor._reconciliation_executor.get_updates_from = now
+    app = executor._configure_app(
+        web.Application(),
+        WebhookConfig(encryption=EncryptionConfig(secret_p2p_key='', base64_encryption_key='')),
+    )
+    assert len(app.router.routes()) == 2
+
+    async with TestServer(app):
+        await asyncio.wait_for(handled.wait(), timeout=5)
+        assert executor._reconciliation_task is not None
+
+    assert executor._reconciliation_task is None
+
+
+def test_webhooks_and_reconciliation_share_windowed_collision_detector() -> None:
+    executor = HybridExecutor(WalletStub([]), QiwiDispatcher(), HandlerContext())
+
+    assert isinstance(executor._collision_detector, WindowedCollisionDetector)
+    assert executor._reconciliation_executor._collision_detector is executor._collision_detector
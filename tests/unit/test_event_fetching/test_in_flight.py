@@ -0,0 +1,46 @@
+import asyncio
+
+import pytest
+
+from glQiwiApi.core.event_fetching.in_flight import InFlightTracker
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_finished_events_are_not_tracked():
+    tracker: InFlightTracker[str] = InFlightTracker()
+
+    await tracker.add(asyncio.create_task(asyncio.sleep(0)), 'event')
+
+    assert len(tracker) == 0
+
+
+async def test_drain_waits_for_events_in_progress():
+    tracker: InFlightTracker[str] = InFlightTracker()
+    done = []
+
+    async def handle() -> None:
+        await asyncio.sleep(0.01)
+        done.append('event')
+
+    tracker.add(asyncio.create_task(handle()), 'event')
+
+    assert await tracker.drain(timeout=1) == []
+    assert done == ['event']
+
+
+async def test_events_are_abandoned_after_timeout():
+    tracker: InFlightTracker[str] = InFlightTracker()
+    fast = tracker.add(asyncio.create_task(asyncio.sleep(0)), 'fast')
+    slow = tracker.add(asyncio.create_task(asyncio.sleep(10)), 'slow')
+    queued = tracker.add(asyncio.get_running_loop().create_future(), 'queued')
+
+    assert await tracker.drain(timeout=0.01) == ['slow', 'queued']
+    assert fast.done() and not fast.cancelled()
+    assert slow.cancelled()
+    assert queued.cancelled()
+    assert len(tracker) == 0
+
+
+async def test_drain_without_events():
+    assert await InFlightTracker().drain(timeout=0) == []
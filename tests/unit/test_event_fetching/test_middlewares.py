@@ -0,0 +1,144 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from glQiwiApi.core.event_fetching.dispatcher import QiwiDispatcher
+from glQiwiApi.core.event_fetching.executor import HandlerContext
+from glQiwiApi.core.event_fetching.middlewares import (
+    HandlerTiming,
+    MiddlewareManager,
+    TimingMiddleware,
+)
+from glQiwiApi.qiwi.clients.wallet.types import Transaction
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_recording_middleware(name: str, calls: List[str]):
+    async def middleware(handler, event: Any, *args: Any) -> Any:
+        calls.append(f'{name}:before')
+        result = await handler(event, *args)
+        calls.append(f'{name}:after')
+        return result
+
+    return middleware
+
+
+async def test_chain_is_composed_in_order_of_registration():
+    calls: List[str] = []
+    manager = MiddlewareManager()
+    manager.register(make_recording_middleware('first', calls))
+    manager.register(make_recording_middleware('second', calls))
+
+    async def handler(event: str) -> str:
+        calls.append(event)
+        return 'result'
+
+    assert await manager.wrap(handler)('event') == 'result'
+    assert calls == ['first:before', 'second:before', 'event', 'second:after', 'first:after']
+
+
+async def test_outer_middleware_is_called_once_per_event_and_inner_once_per_handler(
+    transaction: Transaction,
+):
+    dp = QiwiDispatcher()
+    calls: List[str] = []
+    dp.outer_middleware.register(make_recording_middleware('outer', calls))
+    dp.inner_middleware.register(make_recording_middleware('inner', calls))
+
+    @dp.transaction_handler(lambda txn: False)
+    async def rejected_handler(txn: Transaction, ctx: HandlerContext):
+        calls.append('rejected')
+
+    @dp.transaction_handler()
+    async def handler(txn: Transaction, ctx: HandlerContext):
+        calls.append('handler')
+
+    await dp.process_event(transaction, HandlerContext())
+
+    assert calls == ['outer:before', 'inner:before', 'handler', 'inner:after', 'outer:after']
+
+
+async def test_middleware_registered_later_is_applied(transaction: Transaction):
+    dp = QiwiDispatcher()
+    calls: List[str] = []
+
+    @dp.transaction_handler()
+    async def handler(txn: Transaction):
+        calls.append('handler')
+
+    await dp.process_event(transaction)
+
+    @dp.inner_middleware
+    async def skip_all(handler, event: Any, *args: Any) -> None:
+        calls.append('skipped')
+
+    await dp.process_event(transaction)
+
+    assert calls == ['handler', 'skipped']
+
+
+async def test_exception_of_outer_middleware_is_passed_to_exception_handler(
+    transaction: Transaction,
+):
+    dp = QiwiDispatcher()
+    errors: List[Exception] = []
+
+    @dp.outer_middleware
+    async def failing_middleware(handler, event: Any, *args: Any) -> None:
+        raise RuntimeError('oops')
+
+    @dp.exception_handler()
+    async def handle_exception(exception: Exception):
+        errors.append(exception)
+
+    await dp.process_event(transaction)
+
+    assert [str(error) for error in errors] == ['oops']
+
+
+async def test_inner_middleware_does_not_wrap_exception_handler(transaction: Transaction):
+    dp = QiwiDispatcher()
+    calls: List[str] = []
+    dp.inner_middleware.register(make_recording_middleware('inner', calls))
+
+    @dp.transaction_handler()
+    async def handler(txn: Transaction):
+        raise RuntimeError('oops')
+
+    @dp.exception_handler()
+    async def handle_exception(exception: Exception, *args: Any):
+        calls.append('exception_handler')
+
+    await dp.process_event(transaction)
+
+    assert calls == ['inner:before', 'exception_handler']
+
+
+async def test_timing_middleware(transaction: Transaction):
+    dp = QiwiDispatcher()
+    timings: List[HandlerTiming] = []
+    TimingMiddleware(on_timing=timings.append).setup(dp)
+
+    @dp.outer_middleware
+    async def slow_middleware(handler, event: Any, *args: Any) -> Any:
+        await asyncio.sleep(0.02)
+        return await handler(event, *args)
+
+    @dp.transaction_handler(lambda txn: False)
+    async def rejected_handler(txn: Transaction):
+        pass
+
+    @dp.transaction_handler(lambda txn: True)
+    async def slow_handler(txn: Transaction):
+        await asyncio.sleep(0.02)
+
+    await dp.process_event(transaction)
+
+    assert len(timings) == 1
+    timing = timings[0]
+    assert timing.handler is slow_handler
+    assert timing.queue_wait >= 0.015
+    assert 0 < timing.filter_time < 0.01
+    assert timing.handler_time >= 0.015
@@ -0,0 +1,85 @@
+import asyncio
+from typing import List
+
+import async_timeout
+import pytest
+
+from glQiwiApi import QiwiWallet
+from glQiwiApi.core.event_fetching.dispatcher import QiwiDispatcher
+from glQiwiApi.core.event_fetching.executor import HandlerContext
+from glQiwiApi.core.event_fetching.multi_wallet import MultiWalletPollingExecutor
+from glQiwiApi.qiwi.clients.wallet.types import History, Transaction
+
+pytestmark = pytest.mark.asyncio
+
+
+class WalletStub(QiwiWallet):
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, transactions: List[Transaction]):
+        super().__init__('')
+        self._transactions = transactions
+
+    async def history(self, *args, **kwargs) -> History:
+        WalletStub.in_flight += 1
+        WalletStub.max_in_flight = max(WalletStub.max_in_flight, WalletStub.in_flight)
+        await asyncio.sleep(0.01)
+        WalletStub.in_flight -= 1
+        return History(data=self._transactions)
+
+
+async def test_every_wallet_is_polled_with_own_context(transaction: Transaction) -> None:
+    wallets = [WalletStub([transaction.copy(update={'id': 100 + i})]) for i in range(6)]
+    dp = QiwiDispatcher()
+    handled = {}
+    all_handled = asyncio.Event()
+
+    @dp.transaction_handler()
+    async def handle_transaction(txn: Transaction, ctx: HandlerContext):
+        assert ctx['api_key'] == 'my_api_key'
+        handled[txn.id] = ctx.wallet
+        if len(handled) == len(wallets):
+            all_handled.set()
+
+    executor = MultiWalletPollingExecutor(
+        wallets,
+        dp,
+        context=HandlerContext({'api_key': 'my_api_key'}),
+        timeout=0.06,
+        max_concurrent_requests=2,
+    )
+
+    task = await executor.start_non_blocking_polling()
+    try:
+        async with async_timeout.timeout(5):
+            await all_handled.wait()
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    assert handled == {100 + i: wallet for i, wallet in enumerate(wallets)}
+    assert WalletStub.max_in_flight <= 2
+
+
+async def test_wallets_share_connection_pool(transaction: Transaction) -> None:
+    wallets = [WalletStub([transaction]), WalletStub([transaction])]
+    executor = MultiWalletPollingExecutor(wallets, QiwiDispatcher(), context=HandlerContext())
+
+    task = await executor.start_non_blocking_polling()
+    await asyncio.sleep(0)
+    connectors = [
+        wallet._request_service._session_holder._session_kwargs['connector'] for wallet in wallets
+    ]
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert connectors[0] is connectors[1] is executor._connector
+    assert executor._connector.closed
+
+
+def test_wallets_are_required() -> None:
+    with pytest.raises(ValueError):
+        MultiWalletPollingExecutor([], QiwiDispatcher(), context=HandlerContext())
@@ -0,0 +1,87 @@
+import pytest
+
+from glQiwiApi.core.event_fetching.polling_interval import AdaptivePollingInterval
+from glQiwiApi.core.session.holder import HTTPResponse
+from glQiwiApi.qiwi.exceptions import QiwiAPIError
+
+
+def make_api_error(status_code: int, headers=None) -> QiwiAPIError:
+    return QiwiAPIError(
+        HTTPResponse(
+            status_code=status_code,
+            body=b'{}',
+            headers=headers or {},
+            content_type='application/json',
+        )
+    )
+
+
+def test_interval_backs_off_exponentially_when_idle():
+    interval = AdaptivePollingInterval(min_interval=5, max_interval=40, jitter=0)
+
+    delays = []
+    for _ in range(5):
+        interval.on_updates(0)
+        delays.append(interval.next_delay())
+
+    assert delays == [10, 20, 40, 40, 40]
+
+
+def test_interval_is_reset_when_new_updates_arrive():
+    interval = AdaptivePollingInterval(min_interval=5, max_interval=40, jitter=0)
+    interval.on_idle()
+    interval.on_idle()
+
+    interval.on_updates(3)
+
+    assert interval.next_delay() == 5
+
+
+def test_rate_limit_backs_off_faster_than_other_errors():
+    interval = AdaptivePollingInterval(min_interval=2, max_interval=100, jitter=0)
+    interval.on_error(RuntimeError())
+    assert interval.current == 4
+
+    interval.on_error(make_api_error(429))
+    assert interval.current == 16
+
+
+def test_retry_after_header_is_respected():
+    interval = AdaptivePollingInterval(min_interval=2, max_interval=100, jitter=0)
+
+    interval.on_error(make_api_error(423, headers={'Retry-After': '30'}))
+
+    assert interval.current == 30
+
+
+@pytest.mark.parametrize('random_value,expected_delay', [(0.0, 9.0), (0.5, 10.0), (0.999, 10.998)])
+def test_jitter_is_bounded(random_value: float, expected_delay: float):
+    interval = AdaptivePollingInterval(
+        min_interval=5, max_interval=40, jitter=0.1, random_fn=lambda: random_value
+    )
+    interval.on_idle()
+
+    assert interval.next_delay() == pytest.approx(expected_delay)
+
+
+def test_jitter_does_not_exceed_max_interval():
+    interval = AdaptivePollingInterval(
+        min_interval=5, max_interval=10, jitter=0.5, random_fn=lambda: 0.99
+    )
+    interval.on_idle()
+
+    assert interval.next_delay() == 10
+
+
+@pytest.mark.parametrize(
+    'kwargs',
+    [
+        {'min_interval': -1, 'max_interval': 5},
+        {'min_interval': 5, 'max_interval': 1},
+        {'min_interval': 1, 'max_interval': 5, 'backoff_factor': 0.5},
+        {'min_interval': 1, 'max_interval': 5, 'jitter': 1},
+    ],
+)
+def test_invalid_configuration(kwargs):
+    with pytest.raises(ValueError):
+        AdaptivePollingInterval(**kwargs)
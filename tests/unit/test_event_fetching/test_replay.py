@@ -0,0 +1,150 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from glQiwiApi.core.event_fetching.dispatcher import QiwiDispatcher
+from glQiwiApi.core.event_fetching.executor import HandlerContext
+from glQiwiApi.core.event_fetching.replay import (
+    EventRecorder,
+    LatencySummary,
+    ReplayEngine,
+    dump_event,
+    load_event,
+    read_events,
+)
+from glQiwiApi.qiwi.clients.p2p.types import BillWebhook
+from glQiwiApi.qiwi.clients.wallet.types import Transaction
+from glQiwiApi.qiwi.clients.wallet.types.webhooks import TransactionWebhook
+
+
+@pytest.fixture(name='bill_webhook')
+def bill_webhook_fixture() -> BillWebhook:
+    now = datetime.now(timezone.utc)
+    return BillWebhook.parse_obj(
+        {
+            'version': '1',
+            'bill': {
+                'amount': {'currency': 'RUB', 'value': '1.00'},
+                'status': {'value': 'PAID', 'changedDateTime': now},
+                'siteId': 'site',
+                'billId': 'bill',
+                'creationDateTime': now,
+                'expirationDateTime': now + timedelta(hours=1),
+            },
+        }
+    )
+
+
+def test_captured_events_are_parsed_back(
+    transaction: Transaction, test_webhook: TransactionWebhook, bill_webhook: BillWebhook
+) -> None:
+    for event in [transaction, test_webhook, bill_webhook]:
+        assert load_event(dump_event(event)) == event
+
+
+def test_signature_of_captured_webhook_is_preserved(test_webhook: TransactionWebhook) -> None:
+    assert load_event(dump_event(test_webhook)).signature == test_webhook.signature
+
+
+def test_unknown_events_can_not_be_captured() -> None:
+    with pytest.raises(TypeError):
+        dump_event(object())
+    with pytest.raises(ValueError):
+        load_event({'type': 'unknown', 'payload': {}})
+
+
+@pytest.mark.asyncio
+async def test_recorder_captures_dispatched_events(
+    transaction: Transaction, bill_webhook: BillWebhook, tmp_path: Path
+) -> None:
+    dp = QiwiDispatcher()
+    handled: List[Any] = []
+
+    @dp.transaction_handler()
+    async def handle_transaction(event: Transaction) -> None:
+        handled.append(event)
+
+    with EventRecorder(tmp_path / 'events.jsonl') as recorder:
+        recorder.setup(dp)
+        await dp.process_event(transaction)
+        await dp.process_event(bill_webhook)
+        await dp.process_event('not an event')
+
+    assert handled == [transaction]
+    assert list(read_events(tmp_path / 'events.jsonl')) == [transaction, bill_webhook]
+
+
+def test_invalid_line_of_capture_file(tmp_path: Path) -> None:
+    path = tmp_path / 'events.jsonl'
+    path.write_text('\n{"type": "unknown", "payload": {}}\n')
+
+    with pytest.raises(ValueError, match='line 2'):
+        list(read_events(path))
+
+
+@pytest.mark.asyncio
+async def test_report_of_replay(transaction: Transaction) -> None:
+    dp = QiwiDispatcher()
+    context = HandlerContext()
+
+    @dp.transaction_handler(lambda txn: txn.id % 2 == 0)
+    async def handle_even(txn: Transaction, ctx: HandlerContext) -> None:
+        assert ctx is context
+        await asyncio.sleep(0.001)
+
+    @dp.transaction_handler()
+    async def handle_odd(txn: Transaction, ctx: HandlerContext) -> None:
+        raise RuntimeError('boom')
+
+    @dp.exception_handler()
+    async def handle_exception(exception: Exception, *args: Any) -> None:
+        pass
+
+    events = [transaction.copy(update={'id': i}) for i in range(10)]
+    report = await ReplayEngine(dp, context, concurrency=3).replay(events)
+
+    assert report.events == 10
+    assert report.errors == 5
+    assert report.throughput > 0
+    even = report.handlers['test_report_of_replay.<locals>.handle_even']
+    odd = report.handlers['test_report_of_replay.<locals>.handle_odd']
+    assert (even.calls, even.errors) == (5, 0)
+    assert (odd.calls, odd.errors) == (5, 5)
+    assert even.latency.p50 >= 0.001
+    assert report.latency.max >= even.latency.max
+    assert 'handle_even' in report.format()
+    # replay doesn't leave its middlewares in dispatcher
+    assert len(dp.outer_middleware) == 0
+    assert len(dp.transaction_handler.middleware) == 0
+
+
+@pytest.mark.asyncio
+async def test_replay_keeps_target_rate(transaction: Transaction, tmp_path: Path) -> None:
+    dp = QiwiDispatcher()
+    path = tmp_path / 'events.jsonl'
+    with EventRecorder(path) as recorder:
+        for i in range(5):
+            recorder.record(transaction.copy(update={'id': i}))
+
+    report = await ReplayEngine(dp, rate=100).replay_file(path)
+
+    assert report.events == 5
+    assert report.duration >= 0.04
+    assert report.handlers == {}
+
+
+def test_latency_percentiles() -> None:
+    summary = LatencySummary.from_samples([float(i) for i in range(100, 0, -1)])
+
+    assert summary == LatencySummary(p50=50.0, p90=90.0, p99=99.0, max=100.0)
+    assert LatencySummary.from_samples([]) == LatencySummary()
+
+
+def test_rate_and_concurrency_must_be_positive() -> None:
+    with pytest.raises(ValueError):
+        ReplayEngine(QiwiDispatcher(), rate=0)
+    with pytest.raises(ValueError):
+        ReplayEngine(QiwiDispatcher(), concurrency=0)
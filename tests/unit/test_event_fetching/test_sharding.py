@@ -0,0 +1,117 @@
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+from glQiwiApi.core.event_fetching.dispatcher import QiwiDispatcher
+from glQiwiApi.core.event_fetching.sharding import ShardedPollingSupervisor
+
+WALLETS = [
+    {'api_access_token': f'token-{i}', 'phone_number': f'+7900000{i:04}'} for i in range(40)
+]
+
+
+def sleep_forever(*args: Any) -> None:
+    while True:
+        time.sleep(1)
+
+
+def crash(*args: Any) -> None:
+    raise SystemExit(1)
+
+
+def make_supervisor(
+    processes: int, target=sleep_forever, **kwargs: Any
+) -> ShardedPollingSupervisor:
+    return ShardedPollingSupervisor(
+        WALLETS,
+        QiwiDispatcher,
+        processes=processes,
+        target=target,
+        start_method='fork',
+        stop_timeout=1,
+        **kwargs,
+    )
+
+
+def tokens(assignment: Dict[int, List[Dict[str, str]]]) -> Dict[str, int]:
+    return {
+        spec['api_access_token']: shard for shard, specs in assignment.items() for spec in specs
+    }
+
+
+def wait_until(predicate, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_every_wallet_is_assigned_to_one_shard():
+    supervisor = make_supervisor(processes=4)
+
+    assignment = supervisor.assignment
+
+    assert sorted(assignment) == [0, 1, 2, 3]
+    assert sorted(tokens(assignment)) == sorted(spec['api_access_token'] for spec in WALLETS)
+
+
+def test_workers_are_started_for_every_shard():
+    supervisor = make_supervisor(processes=3)
+    supervisor.start()
+    try:
+        processes = [shard.process for shard in supervisor._shards.values()]
+        assert len(processes) == 3
+        assert all(process.is_alive() for process in processes)
+    finally:
+        supervisor.stop()
+
+    assert not any(process.is_alive() for process in processes)
+    assert supervisor._shards == {}
+
+
+def test_crashed_worker_is_restarted_with_delay():
+    supervisor = make_supervisor(processes=1, target=crash, max_restart_delay=0.2)
+    supervisor.start()
+    try:
+        shard = supervisor._shards[0]
+        first_process = shard.process
+        wait_until(lambda: not first_process.is_alive())
+
+        supervisor.supervise()
+        assert shard.process is None
+        assert shard.crashes == 1
+
+        wait_until(lambda: time.monotonic() >= shard.restart_at)
+        supervisor.supervise()
+        assert shard.process is not None
+        assert shard.process is not first_process
+    finally:
+        supervisor.stop()
+
+
+def test_scale_restarts_only_moved_shards():
+    supervisor = make_supervisor(processes=3)
+    supervisor.start()
+    try:
+        before = tokens(supervisor.assignment)
+        processes_before = {index: shard.process for index, shard in supervisor._shards.items()}
+
+        supervisor.scale(4)
+
+        after = tokens(supervisor.assignment)
+        moved = [token for token in before if before[token] != after[token]]
+        assert moved
+        assert all(after[token] == 3 for token in moved)
+        assert sorted(supervisor._shards) == [0, 1, 2, 3]
+        for index, process in processes_before.items():
+            shard_process = supervisor._shards[index].process
+            assert (shard_process is process) == process.is_alive()
+    finally:
+        supervisor.stop()
+
+
+@pytest.mark.parametrize('processes', [0, -1])
+def test_invalid_number_of_processes(processes: int):
+    with pytest.raises(ValueError):
+        make_supervisor(processes=processes)
@@ -0,0 +1,148 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, List
+
+import async_timeout
+import pytest
+from aiohttp.pytest_plugin import AiohttpClient
+from aiohttp.test_utils import TestClient
+from aiohttp.web_app import Application
+
+from glQiwiApi.core.event_fetching.dispatcher import QiwiDispatcher
+from glQiwiApi.core.event_fetching.event_queue import MemoryEventQueue, SQLiteEventQueue
+from glQiwiApi.core.event_fetching.webhooks.app import configure_app
+from glQiwiApi.core.event_fetching.webhooks.config import (
+    EncryptionConfig,
+    ProcessingConfig,
+    SecurityConfig,
+    WebhookConfig,
+)
+from glQiwiApi.qiwi.clients.wallet.types import TransactionWebhook
+from tests.unit.test_event_fetching.mocks import WebhookTestData
+
+pytestmark = pytest.mark.asyncio
+
+WEBHOOK_PATH = '/webhooks/qiwi/transactions/'
+
+
+def make_config(test_data: WebhookTestData, respond_immediately: bool = True) -> WebhookConfig:
+    return WebhookConfig(
+        encryption=EncryptionConfig(
+            secret_p2p_key='', base64_encryption_key=test_data.base64_key_to_compare_hash
+        ),
+        security=SecurityConfig(check_ip=False),
+        processing=ProcessingConfig(respond_immediately=respond_immediately, workers=2),
+    )
+
+
+async def test_response_does_not_wait_for_handler(
+    aiohttp_client: AiohttpClient, test_data: WebhookTestData
+) -> None:
+    dp = QiwiDispatcher()
+    release_handler = asyncio.Event()
+    handled: List[TransactionWebhook] = []
+
+    @dp.transaction_handler()
+    async def handle_webhook(webhook: TransactionWebhook) -> None:
+        await release_handler.wait()
+        handled.append(webhook)
+
+    app = configure_app(dp, Application(), make_config(test_data))
+    client: TestClient = await aiohttp_client(app)
+
+    async with async_timeout.timeout(5):
+        response = await client.post(WEBHOOK_PATH, json=test_data.transaction_webhook_json)
+        assert response.status == 200
+        assert await response.text() == 'ok'
+        assert handled == []
+
+        release_handler.set()
+        while not handled:
+            await asyncio.sleep(0.01)
+
+
+async def test_queued_events_are_handled_on_shutdown(
+    aiohttp_client: AiohttpClient, test_data: WebhookTestData, tmp_path: Path
+) -> None:
+    dp = QiwiDispatcher()
+    handled: List[TransactionWebhook] = []
+
+    @dp.transaction_handler()
+    async def handle_webhook(webhook: TransactionWebhook) -> None:
+        await asyncio.sleep(0.05)
+        handled.append(webhook)
+
+    queue = SQLiteEventQueue(tmp_path / 'events.sqlite')
+    app = configure_app(
+        dp, Application(), make_config(test_data, respond_immediately=False), event_queue=queue
+    )
+    client: TestClient = await aiohttp_client(app)
+
+    async with async_timeout.timeout(5):
+        response = await client.post(WEBHOOK_PATH, json=test_data.transaction_webhook_json)
+        assert response.status == 200
+        await client.close()
+
+    assert len(handled) == 1
+    assert len(queue) == 0
+
+
+async def test_event_with_invalid_signature_is_not_remembered(
+    aiohttp_client: AiohttpClient, test_data: WebhookTestData
+) -> None:
+    dp = QiwiDispatcher()
+    handled = asyncio.Event()
+
+    @dp.transaction_handler()
+    async def handle_webhook(webhook: TransactionWebhook) -> None:
+        handled.set()
+
+    app = configure_app(dp, Application(), make_config(test_data))
+    client: TestClient = await aiohttp_client(app)
+    forged = json.dumps({**json.loads(test_data.transaction_webhook_json), 'hash': 'fake hash'})
+
+    async with async_timeout.timeout(5):
+        response = await client.post(WEBHOOK_PATH, json=forged)
+        assert response.status == 400
+
+        response = await client.post(WEBHOOK_PATH, json=test_data.transaction_webhook_json)
+        assert response.status == 200
+        await handled.wait()
+
+
+class FailingOnceEventQueue(MemoryEventQueue):
+    def __init__(self) -> None:
+        super().__init__()
+        self.failed = False
+
+    async def put(self, event: Any) -> None:
+        if not self.failed:
+            self.failed = True
+            raise RuntimeError('queue is unavailable')
+        await super().put(event)
+
+
+async def test_event_is_forgotten_when_it_is_not_enqueued(
+    aiohttp_client: AiohttpClient, test_data: WebhookTestData
+) -> None:
+    dp = QiwiDispatcher()
+    handled = asyncio.Event()
+
+    @dp.transaction_handler()
+    async def handle_webhook(webhook: TransactionWebhook) -> None:
+        handled.set()
+
+    app = configure_app(
+        dp, Application(), make_config(test_data), event_queue=FailingOnceEventQueue()
+    )
+    client: TestClient = await aiohttp_client(app)
+
+    async with async_timeout.timeout(5):
+        response = await client.post(WEBHOOK_PATH, json=test_data.transaction_webhook_json)
+        assert response.status == 500
+
+        # redelivery by QIWI is not taken for duplicate
+        response = await client.post(WEBHOOK_PATH, json=test_data.transaction_webhook_json)
+        assert response.status == 200
+        await handled.wait()
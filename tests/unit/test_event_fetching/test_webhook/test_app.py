@@ -1,13 +1,26 @@
+import asyncio
+from typing import List
+
 from aiohttp import web
 from aiohttp.pytest_plugin import AiohttpClient
 from aiohttp.test_utils import TestClient
 from aiohttp.web_app import Application
 from aiohttp.web_request import Request
 
+from glQiwiApi import QiwiWallet
 from glQiwiApi.core.event_fetching import IPFilter, QiwiDispatcher
+from glQiwiApi.core.event_fetching.executor import HandlerContext, WebhookExecutor
 from glQiwiApi.core.event_fetching.webhooks.app import configure_app
-from glQiwiApi.core.event_fetching.webhooks.config import EncryptionConfig, WebhookConfig
+from glQiwiApi.core.event_fetching.webhooks.config import (
+    EncryptionConfig,
+    SecurityConfig,
+    WebhookConfig,
+)
 from glQiwiApi.core.event_fetching.webhooks.middlewares.ip import ip_filter_middleware
+from glQiwiApi.core.event_fetching.webhooks.services.collision_detector import (
+    WindowedCollisionDetector,
+)
+from glQiwiApi.qiwi.clients.wallet.types import TransactionWebhook
 from tests.unit.test_event_fetching.mocks import WebhookTestData
 
 
@@ -49,3 +62,38 @@ class TestAiohttpServer:
             '/webhook', headers={'X-Forwarded-For': '79.142.16.2,91.213.51.238'}
         )
         assert resp.status == 200
+
+    async def test_executor_passes_collision_detector_on_to_views(
+        self, aiohttp_client: AiohttpClient, test_data: WebhookTestData
+    ):
+        dp = QiwiDispatcher()
+        handled: List[TransactionWebhook] = []
+
+        @dp.transaction_handler()
+        async def handle_webhook(webhook: TransactionWebhook):
+            handled.append(webhook)
+
+        detector = WindowedCollisionDetector()
+        detector.remember_processed_object(
+            TransactionWebhook.parse_raw(test_data.transaction_webhook_json)
+        )
+        executor = WebhookExecutor(
+            QiwiWallet(''), dp, HandlerContext(), collision_detector=detector
+        )
+        app = executor._configure_app(
+            Application(),
+            WebhookConfig(
+                encryption=EncryptionConfig(
+                    secret_p2p_key='', base64_encryption_key=test_data.base64_key_to_compare_hash
+                ),
+                security=SecurityConfig(check_ip=False),
+            ),
+        )
+        client: TestClient = await aiohttp_client(app)
+
+        resp = await client.post(
+            '/webhooks/qiwi/transactions/', json=test_data.transaction_webhook_json
+        )
+        assert resp.status == 200
+        await asyncio.sleep(0)
+        assert handled == []
@@ -0,0 +1,102 @@
+from typing import List
+
+import pytest
+
+from glQiwiApi.core.event_fetching.webhooks.services.collision_detector import (
+    UnexpectedCollision,
+    UnhashableObjectError,
+    WindowedCollisionDetector,
+)
+from glQiwiApi.qiwi.clients.wallet.types import Transaction, TransactionWebhook
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_duplicate_is_detected_within_retention(test_webhook: TransactionWebhook) -> None:
+    clock = FakeClock()
+    detector = WindowedCollisionDetector(retention=60, clock=clock)
+    detector.remember_processed_object(test_webhook)
+
+    clock.now = 59
+    with pytest.raises(UnexpectedCollision):
+        detector.remember_processed_object(test_webhook)
+
+
+def test_event_is_forgotten_after_retention(test_webhook: TransactionWebhook) -> None:
+    clock = FakeClock()
+    detector = WindowedCollisionDetector(retention=60, clock=clock)
+    detector.remember_processed_object(test_webhook)
+
+    clock.now = 60
+    assert not detector.has_collision(test_webhook)
+    assert len(detector) == 0
+    assert detector.stats().expired == 1
+
+
+def test_forgotten_event_is_not_duplicate(test_webhook: TransactionWebhook) -> None:
+    detector = WindowedCollisionDetector()
+    detector.remember_processed_object(test_webhook)
+
+    detector.forget_processed_object(test_webhook)
+    detector.forget_processed_object(test_webhook)
+
+    assert not detector.has_collision(test_webhook)
+    assert len(detector) == 0
+
+
+def test_oldest_events_are_evicted(transaction: Transaction) -> None:
+    detector = WindowedCollisionDetector(retention=None, max_entries=2)
+    transactions: List[Transaction] = [transaction.copy(update={'id': i}) for i in range(3)]
+    for txn in transactions:
+        detector.remember_processed_object(txn)
+
+    assert not detector.has_collision(transactions[0])
+    assert detector.has_collision(transactions[1])
+    assert detector.has_collision(transactions[2])
+    stats = detector.stats()
+    assert (stats.entries, stats.evicted, stats.expired) == (2, 1, 0)
+    assert stats.size_in_bytes > 0
+
+
+def test_remembering_again_moves_event_to_the_end(transaction: Transaction) -> None:
+    clock = FakeClock()
+    detector = WindowedCollisionDetector(retention=60, clock=clock)
+    first = transaction.copy(update={'id': 1})
+    second = transaction.copy(update={'id': 2})
+    detector.add_already_processed_event(first)
+    clock.now = 10
+    detector.add_already_processed_event(second)
+    clock.now = 30
+    detector.add_already_processed_event(first)
+
+    clock.now = 75
+    assert not detector.has_collision(second)
+    assert detector.has_collision(first)
+
+
+def test_webhook_and_transaction_of_the_same_payment_collide(
+    test_webhook: TransactionWebhook, transaction: Transaction
+) -> None:
+    detector = WindowedCollisionDetector()
+    detector.remember_processed_object(test_webhook)
+
+    assert detector.has_collision(
+        transaction.copy(update={'id': int(test_webhook.payment.txn_id)})
+    )
+
+
+def test_fail_if_object_is_unhashable() -> None:
+    with pytest.raises(UnhashableObjectError):
+        WindowedCollisionDetector().remember_processed_object([])
+
+
+@pytest.mark.parametrize('kwargs', [{'retention': 0}, {'max_entries': 0}])
+def test_limits_must_be_positive(kwargs) -> None:
+    with pytest.raises(ValueError):
+        WindowedCollisionDetector(**kwargs)
@@ -0,0 +1,141 @@
+import asyncio
+from typing import List
+
+import async_timeout
+import pytest
+
+from glQiwiApi.core.event_fetching.worker_pool import WorkerPool, release_worker
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_number_of_concurrent_jobs_is_limited() -> None:
+    pool = WorkerPool(workers=3, queue_size=100)
+    running = 0
+    max_running = 0
+
+    async def job() -> int:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.001)
+        running -= 1
+        return 1
+
+    futures = [await pool.submit(job) for _ in range(30)]
+
+    assert sum(await asyncio.gather(*futures)) == 30
+    assert max_running == 3
+    await pool.close()
+
+
+async def test_submit_waits_while_queue_is_full() -> None:
+    pool = WorkerPool(workers=1, queue_size=1)
+    release = asyncio.Event()
+
+    async def job() -> None:
+        await release.wait()
+
+    await pool.submit(job)
+    await asyncio.sleep(0)  # worker takes the first job
+    await pool.submit(job)  # second one waits in the queue
+
+    blocked_submit = asyncio.create_task(pool.submit(job))
+    await asyncio.sleep(0.01)
+    assert not blocked_submit.done()
+
+    release.set()
+    await blocked_submit
+    await pool.close()
+
+
+async def test_free_worker_takes_job_while_other_one_is_busy() -> None:
+    pool = WorkerPool(workers=2, queue_size=100)
+    release = asyncio.Event()
+
+    async def fast_job() -> None:
+        await asyncio.sleep(0)
+
+    slow_job = await pool.submit(release.wait)
+    fast_jobs = [await pool.submit(fast_job) for _ in range(10)]
+
+    # all fast jobs are executed by the second worker, none of them waits for the slow one
+    await asyncio.wait_for(asyncio.gather(*fast_jobs), timeout=1)
+    assert not slow_job.done()
+
+    release.set()
+    await pool.close()
+
+
+async def test_released_worker_takes_next_job() -> None:
+    pool = WorkerPool(workers=1)
+    release_job = asyncio.Event()
+
+    async def released_job() -> str:
+        release_worker()
+        await release_job.wait()
+        return 'released'
+
+    async def job() -> str:
+        return 'next'
+
+    released = await pool.submit(released_job)
+    following = await pool.submit(job)
+
+    async with async_timeout.timeout(1):
+        assert await following == 'next'
+        assert not released.done()
+        joining = asyncio.create_task(pool.join())
+        await asyncio.sleep(0.01)
+        # released job is still in progress
+        assert not joining.done()
+
+        release_job.set()
+        assert await released == 'released'
+        await joining
+    await pool.close()
+
+
+async def test_jobs_with_the_same_key_are_executed_in_order() -> None:
+    pool = WorkerPool(workers=4, queue_size=100)
+    executed: List[str] = []
+
+    def make_job(key: str, index: int, delay: float):
+        async def job() -> None:
+            await asyncio.sleep(delay)
+            executed.append(f'{key}{index}')
+
+        return job
+
+    futures = []
+    for index in range(5):
+        # later jobs are faster, so without ordering they would overtake earlier ones
+        futures.append(await pool.submit(make_job('a', index, 0.005 - index * 0.001), key='a'))
+        futures.append(await pool.submit(make_job('b', index, 0.005 - index * 0.001), key='b'))
+    await asyncio.gather(*futures)
+
+    assert [e for e in executed if e.startswith('a')] == [f'a{i}' for i in range(5)]
+    assert [e for e in executed if e.startswith('b')] == [f'b{i}' for i in range(5)]
+    await pool.close()
+
+
+async def test_exception_is_propagated_to_future() -> None:
+    pool = WorkerPool(workers=1)
+
+    async def job() -> None:
+        raise RuntimeError()
+
+    future = await pool.submit(job)
+    with pytest.raises(RuntimeError):
+        await future
+    await pool.close()
+
+
+async def test_close_without_drain_cancels_jobs() -> None:
+    pool = WorkerPool(workers=1)
+    future = await pool.submit(asyncio.Event().wait)
+    await asyncio.sleep(0)
+
+    await pool.close(drain=False)
+
+    assert future.cancelled()
@@ -0,0 +1,134 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Union
+
+import async_timeout
+import pytest
+
+from glQiwiApi.core.event_fetching.dispatcher import YooMoneyDispatcher
+from glQiwiApi.core.event_fetching.executor import HandlerContext
+from glQiwiApi.core.event_fetching.yoo_money_polling import YooMoneyPollingExecutor
+from glQiwiApi.yoo_money.client import YooMoneyAPI
+from glQiwiApi.yoo_money.types import Operation, OperationHistory
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_operation(operation_id: str, operation_date: datetime) -> Operation:
+    return Operation.parse_obj(
+        {
+            'operation_id': operation_id,
+            'status': 'success',
+            'datetime': operation_date,
+            'title': 'deposit',
+            'direction': 'in',
+            'amount': 10,
+            'type': 'deposition',
+        }
+    )
+
+
+class YooMoneyAPIStub(YooMoneyAPI):
+    def __init__(self, operations: List[Operation], page_size: int = 2):
+        super().__init__('')
+        self.operations = operations
+        self.page_size = page_size
+        self.requests: List[dict] = []
+
+    async def operation_history(
+        self,
+        operation_types: Optional[Iterable[str]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        start_record: Optional[int] = None,
+        records: int = 30,
+        label: Optional[Union[str, int]] = None,
+        in_detail: bool = False,
+    ) -> OperationHistory:
+        self.requests.append(
+            {
+                'start_date': start_date,
+                'start_record': start_record,
+                'operation_types': operation_types and tuple(operation_types),
+            }
+        )
+        matching = sorted(
+            (op for op in self.operations if op.operation_date >= start_date),
+            key=lambda op: op.operation_date,
+            reverse=True,
+        )
+        start_record = start_record or 0
+        next_record = start_record + self.page_size
+        page = matching[start_record:next_record]
+        return OperationHistory(
+            operations=page, next_record=next_record if next_record < len(matching) else None
+        )
+
+
+async def test_new_operations_are_dispatched_once() -> None:
+    now = datetime.now(timezone.utc)
+    operations = [make_operation(str(i), now + timedelta(seconds=i // 2)) for i in range(5)]
+    api = YooMoneyAPIStub(operations)
+    dp = YooMoneyDispatcher()
+    handled: List[str] = []
+
+    @dp.operation_handler()
+    async def handle_operation(operation: Operation, ctx: HandlerContext):
+        assert ctx.wallet is api
+        handled.append(operation.id)
+
+    executor = YooMoneyPollingExecutor(api, dp, HandlerContext())
+    executor.get_updates_from = now
+
+    assert await executor._try_fetch_new_updates() == 5
+    assert sorted(handled) == ['0', '1', '2', '3', '4']
+    assert [r['start_record'] for r in api.requests] == [None, 2, 4]
+
+    # operation made at the same moment as the latest handled one
+    api.operations.append(make_operation('5', operations[-1].operation_date))
+    assert await executor._try_fetch_new_updates() == 1
+    assert handled[-1] == '5'
+    assert api.requests[-1]['start_date'] == operations[-1].operation_date
+    assert await executor._try_fetch_new_updates() == 0
+
+
+async def test_operation_types_are_requested_every_time() -> None:
+    now = datetime.now(timezone.utc)
+    api = YooMoneyAPIStub([make_operation(str(i), now) for i in range(3)])
+    operation_types = (t for t in ['deposition', 'payment'])
+    executor = YooMoneyPollingExecutor(
+        api, YooMoneyDispatcher(), HandlerContext(), operation_types=operation_types
+    )
+    executor.get_updates_from = now
+
+    await executor._try_fetch_new_updates()
+    await executor._try_fetch_new_updates()
+
+    # history is requested in two pages every time
+    assert [r['operation_types'] for r in api.requests] == [('deposition', 'payment')] * 4
+
+
+async def test_skip_updates() -> None:
+    now = datetime.now(timezone.utc)
+    api = YooMoneyAPIStub([make_operation('old', now)])
+    dp = YooMoneyDispatcher()
+    handled = asyncio.Event()
+
+    @dp.operation_handler()
+    async def handle_operation(operation: Operation, _: HandlerContext):
+        assert operation.id == 'new'
+        handled.set()
+
+    executor = YooMoneyPollingExecutor(api, dp, HandlerContext(), timeout=0.01, skip_updates=True)
+    executor.get_updates_from = now
+    task = await executor.start_non_blocking_polling()
+    await asyncio.sleep(0.02)
+    api.operations.append(make_operation('new', now + timedelta(seconds=1)))
+
+    try:
+        async with async_timeout.timeout(5):
+            await handled.wait()
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
@@ -0,0 +1,56 @@
+import pytest
+
+from glQiwiApi.utils.consistent_hashing import ConsistentHashRing
+
+KEYS = [f'wallet-{i}' for i in range(1000)]
+
+
+def test_keys_are_distributed_between_all_nodes_evenly():
+    ring = ConsistentHashRing(range(4))
+
+    distribution = ring.distribute(KEYS)
+
+    assert sorted(distribution) == [0, 1, 2, 3]
+    assert all(150 < len(keys) < 350 for keys in distribution.values())
+
+
+def test_same_key_is_always_mapped_to_the_same_node():
+    assert ConsistentHashRing(range(4)).get_node('wallet') == ConsistentHashRing(
+        range(4)
+    ).get_node('wallet')
+
+
+def test_only_keys_of_new_node_are_moved_on_adding_node():
+    ring = ConsistentHashRing(range(4))
+    before = {key: ring.get_node(key) for key in KEYS}
+
+    ring.add_node(4)
+    after = {key: ring.get_node(key) for key in KEYS}
+
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == 4 for key in moved)
+    assert len(moved) < len(KEYS) * 0.35
+
+
+def test_only_keys_of_removed_node_are_moved_on_removing_node():
+    ring = ConsistentHashRing(range(4))
+    before = {key: ring.get_node(key) for key in KEYS}
+
+    ring.remove_node(3)
+
+    assert len(ring) == 3
+    for key in KEYS:
+        if before[key] != 3:
+            assert ring.get_node(key) == before[key]
+        else:
+            assert ring.get_node(key) != 3
+
+
+def test_empty_ring():
+    with pytest.raises(LookupError):
+        ConsistentHashRing([]).get_node('wallet')
+
+
+def test_invalid_number_of_replicas():
+    with pytest.raises(ValueError):
+        ConsistentHashRing(range(2), replicas=0)
@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import pytest
+
+from glQiwiApi import QiwiWallet, YooMoneyAPI
+from glQiwiApi.qiwi.clients.wallet.types import History, Source, Transaction, TransactionType
+from glQiwiApi.utils.pagination import iterate_items, iterate_pages
+from glQiwiApi.yoo_money.types import OperationHistory
+
+pytestmark = pytest.mark.asyncio
+
+
+def make_page_fetcher(pages: List[List[int]], calls: List[Optional[int]]):
+    async def fetch_page(cursor: Optional[int]) -> Tuple[List[int], Optional[int]]:
+        calls.append(cursor)
+        index = cursor or 0
+        next_cursor = index + 1 if index + 1 < len(pages) else None
+        return pages[index], next_cursor
+
+    return fetch_page
+
+
+@pytest.mark.parametrize('read_ahead', [0, 1, 3])
+async def test_iterate_items_follows_cursors(read_ahead: int):
+    calls: List[Optional[int]] = []
+    fetch_page = make_page_fetcher([[1, 2], [3, 4], [5]], calls)
+
+    items = [item async for item in iterate_items(fetch_page, read_ahead=read_ahead)]
+
+    assert items == [1, 2, 3, 4, 5]
+    assert calls == [None, 1, 2]
+
+
+async def test_next_page_is_fetched_while_current_one_is_processed():
+    calls: List[Optional[int]] = []
+    fetch_page = make_page_fetcher([[1], [2], [3]], calls)
+
+    pages = iterate_pages(fetch_page, read_ahead=1)
+    try:
+        assert await pages.__anext__() == [1]
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert calls == [None, 1]
+    finally:
+        await pages.aclose()
+
+
+async def test_error_is_propagated_to_consumer():
+    async def fetch_page(cursor: Optional[int]) -> Tuple[List[int], Optional[int]]:
+        if cursor is None:
+            return [1], 1
+        raise ConnectionError()
+
+    items: List[int] = []
+    with pytest.raises(ConnectionError):
+        async for item in iterate_items(fetch_page):
+            items.append(item)
+    assert items == [1]
+
+
+async def test_negative_read_ahead_is_not_allowed():
+    with pytest.raises(ValueError):
+        await iterate_pages(make_page_fetcher([[1]], []), read_ahead=-1).__anext__()
+
+
+class WalletStub(QiwiWallet):
+    def __init__(self, transaction: Transaction) -> None:
+        super().__init__('')
+        self._transaction = transaction
+
+    async def history(
+        self,
+        rows: int = 50,
+        transaction_type: TransactionType = TransactionType.ALL,
+        sources: Optional[List[Source]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        next_txn_date: Optional[datetime] = None,
+        next_txn_id: Optional[int] = None,
+    ) -> History:
+        if next_txn_id is None:
+            return History(
+                data=[self._transaction],
+                nextTxnId=self._transaction.id - 1,
+                nextTxnDate=self._transaction.date - timedelta(minutes=1),
+            )
+        return History(data=[self._transaction.copy(update={'id': next_txn_id})])
+
+
+async def test_iter_history(transaction: Transaction):
+    wallet = WalletStub(transaction)
+    ids = [txn.id async for txn in wallet.iter_history()]
+    assert ids == [transaction.id, transaction.id - 1]
+
+
+async def test_iter_operations():
+    requested_types = []
+
+    class YooMoneyStub(YooMoneyAPI):
+        async def operation_history(  # type: ignore
+            self, start_record: Optional[int] = None, **kwargs
+        ) -> OperationHistory:
+            requested_types.append(kwargs['operation_types'])
+            return OperationHistory(
+                next_record=None if start_record else 1,
+                operations=[
+                    {
+                        'operation_id': str(start_record or 0),
+                        'status': 'success',
+                        'datetime': datetime.now(),
+                        'title': 'title',
+                        'direction': 'in',
+                        'amount': 1,
+                        'type': 'deposition',
+                    }
+                ],
+            )
+
+    operation_types = (t for t in ['deposition', 'payment'])
+    operations = [
+        op.id
+        async for op in YooMoneyStub('token').iter_operations(operation_types=operation_types)
+    ]
+    assert operations == ['0', '1']
+    # generator is read once, so every page is requested with the same types
+    assert requested_types == [('deposition', 'payment')] * 2